@@ -0,0 +1,113 @@
+"""
+Бенчмарк аналитики продаж: отчет по транзакциям и по сводке за день
+
+Создает завершенные сделки за --days дней, пересчитывает сводку
+(backfill_sales_rollups) и строит отчеты по дням и категориям двумя
+способами: агрегацией таблицы транзакций и по строкам DailySalesRollup.
+
+Запуск:
+    python -m benchmarks.analytics --transactions 100000 --days 180
+"""
+
+import argparse
+import random
+from datetime import datetime, time, timedelta
+
+from benchmarks.common import setup_django, test_database, timer
+
+CATEGORIES = ('Оружие', 'Броня', 'Ресурсы', 'Инструменты', 'Еда')
+
+def seed(transactions, days, merchants=50):
+    """Продавцы, товары и завершенные сделки, равномерно по дням"""
+    from django.utils import timezone
+    from bot.models import Item, TelegramUser, Transaction, TransactionStatus, UserRole
+
+    sellers = TelegramUser.objects.bulk_create([
+        TelegramUser(telegram_id=1000 + i, username=f'merchant{i}', role=UserRole.MERCHANT)
+        for i in range(merchants)
+    ])
+    client = TelegramUser.objects.create(telegram_id=1, username='client')
+    items = Item.objects.bulk_create([
+        Item(merchant=sellers[i % merchants], title=f'Товар {i}', description='Описание',
+             price=10 + i % 90, category=CATEGORIES[i % len(CATEGORIES)], is_approved=True)
+        for i in range(merchants * len(CATEGORIES))
+    ])
+
+    rng = random.Random(1)
+    now = timezone.now()
+    batch = []
+    for i in range(transactions):
+        item = items[rng.randrange(len(items))]
+        completed_at = now - timedelta(seconds=rng.randrange(days * 86400))
+        batch.append(Transaction(
+            transaction_id=f'TX{i:08d}', client=client, merchant_id=item.merchant_id, item=item, category=item.category,
+            amount=item.price, fee_amount=item.price * 55 / 1000, merchant_amount=item.price * 945 / 1000,
+            status=TransactionStatus.COMPLETED, completed_at=completed_at,
+        ))
+        if len(batch) == 5000:
+            Transaction.objects.bulk_create(batch)
+            batch = []
+    Transaction.objects.bulk_create(batch)
+
+def report_from_transactions(date_from, date_to):
+    """Отчет агрегацией таблицы транзакций (без сводки)"""
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+    from bot.models import Transaction, TransactionStatus
+
+    completed = Transaction.objects.filter(
+        status=TransactionStatus.COMPLETED,
+        completed_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)),
+        completed_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)),
+    )
+    by_day = list(completed.annotate(
+        day=TruncDate('completed_at', tzinfo=timezone.get_current_timezone())
+    ).values('day').annotate(count=Count('id'), amount=Sum('amount')).order_by('day'))
+    by_category = list(completed.values('category').annotate(
+        count=Count('id'), amount=Sum('amount')
+    ).order_by('-amount'))
+    return by_day, by_category
+
+def report_from_rollups(date_from, date_to):
+    """Отчет по сводке bot/analytics.py"""
+    from bot import analytics
+
+    return (
+        analytics.sales_report(date_from, date_to, 'day'),
+        analytics.sales_report(date_from, date_to, 'category'),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого отчета')
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.getLogger('bot').setLevel(logging.WARNING)
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from bot import analytics
+    from bot.models import DailySalesRollup
+
+    results = {}
+    with test_database():
+        seed(args.transactions, args.days)
+        with timer(results, 'backfill'):
+            analytics.rebuild()
+        print(f"Сделок: {args.transactions}, строк сводки: {DailySalesRollup.objects.count()}, "
+              f"пересчет сводки: {results['backfill']:.2f} с")
+
+        date_from, date_to = analytics.period(args.days)
+        for name, report in (('Транзакции', report_from_transactions), ('Сводка', report_from_rollups)):
+            with CaptureQueriesContext(connection) as queries, timer(results, name):
+                for _ in range(args.repeat):
+                    by_day, by_category = report(date_from, date_to)
+            print(f"{name}: {results[name] / args.repeat * 1000:.1f} мс на отчет, "
+                  f"SQL-запросов: {len(queries) // args.repeat}, дней: {len(by_day)}, категорий: {len(by_category)}")
+
+if __name__ == '__main__':
+    main()
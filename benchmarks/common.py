@@ -0,0 +1,100 @@
+"""
+Общая подготовка окружения для бенчмарков
+
+Бенчмарки работают с отдельной тестовой базой данных, которая создается
+перед запуском и удаляется после него, поэтому их безопасно запускать
+рядом с рабочей базой.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup_django():
+    """Настроить Django для запуска бенчмарка как скрипта"""
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'exchange.settings')
+    # Бенчмарки не ходят в сеть: запросы бота обслуживает bot/fake_api.py
+    os.environ.setdefault('TELEGRAM_FAKE_API', 'True')
+    # Кеш процесса: общий файловый кеш пережил бы тестовую базу прошлого запуска
+    os.environ.setdefault('CACHE_BACKEND', 'locmem')
+
+    import django
+    django.setup()
+
+@contextmanager
+def test_database(sqlite_file=None):
+    """Создать тестовые БД (включая зеркало реплики) на время бенчмарка
+
+    sqlite_file - путь к файлу тестовой БД SQLite вместо общей in-memory базы:
+    нужен, когда к базе одновременно обращаются несколько потоков.
+    """
+    from django.conf import settings
+    from django.test.utils import (
+        setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+    )
+
+    default = settings.DATABASES['default']
+    if sqlite_file and default['ENGINE'] == 'django.db.backends.sqlite3':
+        default.setdefault('TEST', {})['NAME'] = sqlite_file
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+@contextmanager
+def timer(results, name):
+    """Замерить время выполнения блока в секундах"""
+    started = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - started
+
+def percentile(values, percent):
+    """Перцентиль по отсортированному списку (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class QueryCounter:
+    """Счетчик SQL-запросов во всех потоках, включая пул потоков ORM"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        """Подключить счетчик к текущим и всем новым соединениям"""
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+        connection_created.connect(self._on_connection_created, weak=False)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+class RecordingBot:
+    """Заглушка бота: запоминает отправленные сообщения вместо отправки"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
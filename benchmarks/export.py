@@ -0,0 +1,100 @@
+"""
+Бенчмарк выгрузки транзакций: пиковая память и время на разном числе строк
+
+Сравнивается выгрузка списком моделей (select_related, как в истории
+транзакций) и потоковая выгрузка bot/export.py. Пиковая память потоковой
+выгрузки не должна расти с числом строк.
+
+Запуск:
+    python -m benchmarks.export --rows 10000 50000
+"""
+
+import argparse
+import csv
+import tracemalloc
+
+from benchmarks.common import setup_django, test_database, timer
+
+class NullStream:
+    """Текстовый поток, который только считает записанные символы"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+def seed(rows, users=100, items=100):
+    """Создать пользователей, товары и транзакции до rows штук"""
+    from bot.models import TelegramUser, Item, Transaction, UserRole
+
+    existing = Transaction.objects.count()
+    if not existing:
+        TelegramUser.objects.bulk_create([
+            TelegramUser(telegram_id=1000 + i, username=f'user{i}',
+                         role=UserRole.MERCHANT if i % 10 == 0 else UserRole.CLIENT)
+            for i in range(users)
+        ])
+        merchants = list(TelegramUser.objects.filter(role=UserRole.MERCHANT))
+        Item.objects.bulk_create([
+            Item(merchant=merchants[i % len(merchants)], title=f'Товар {i}', description='Описание',
+                 price=100 + i, category='Ресурсы', is_approved=True)
+            for i in range(items)
+        ])
+    clients = list(TelegramUser.objects.values_list('id', flat=True))
+    item_rows = list(Item.objects.values_list('id', 'merchant_id', 'price'))
+    Transaction.objects.bulk_create([
+        Transaction(
+            transaction_id=f'TX{i:08d}', client_id=clients[i % len(clients)],
+            merchant_id=item_rows[i % len(item_rows)][1], item_id=item_rows[i % len(item_rows)][0],
+            amount=item_rows[i % len(item_rows)][2], fee_amount=5, merchant_amount=95,
+        )
+        for i in range(existing, rows)
+    ], batch_size=2000)
+
+def export_as_models(stream):
+    """Прежний подход: все транзакции моделями в памяти"""
+    from bot.models import Transaction
+
+    writer = csv.writer(stream)
+    transactions = list(Transaction.objects.select_related('client', 'merchant', 'item').order_by('created_at'))
+    for t in transactions:
+        writer.writerow([
+            t.transaction_id, t.status, t.amount, t.fee_amount, t.merchant_amount, t.created_at.isoformat(),
+            t.item_id, t.item.title, t.client.telegram_id, t.client.username,
+            t.merchant.telegram_id, t.merchant.username,
+        ])
+    return len(transactions)
+
+def export_streaming(stream):
+    """Потоковая выгрузка bot/export.py"""
+    from bot.export import export_transactions
+
+    return export_transactions(stream, 'csv')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000])
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.getLogger('bot').setLevel(logging.WARNING)
+
+    print(f"{'Строк':>8} {'Способ':<12} {'время, с':>10} {'пик памяти, МБ':>16}")
+    with test_database():
+        for rows in sorted(args.rows):
+            seed(rows)
+            for name, export in (('Модели', export_as_models), ('Поток', export_streaming)):
+                results = {}
+                tracemalloc.start()
+                with timer(results, name):
+                    count = export(NullStream())
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                assert count == rows, (name, count, rows)
+                print(f"{rows:>8} {name:<12} {results[name]:>10.2f} {peak / 1024 / 1024:>16.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк пересчета уровней продавцов: поштучно через save() и одним UPDATE
+
+Создает продавцов со случайным опытом, меняет пороги уровней
+(MERCHANT_LEVEL_THRESHOLDS) и пересчитывает уровни двумя способами:
+level_for() и save() на каждого продавца и
+recompute_levels() одним UPDATE с CASE. Затем проверяет уровни.
+
+Запуск:
+    python -m benchmarks.levels --merchants 50000
+"""
+
+import argparse
+import random
+
+from benchmarks.common import QueryCounter, setup_django, test_database, timer
+
+THRESHOLDS = {'SILVER': 1500, 'GOLD': 4000, 'PLATINUM': 8000}
+
+def seed(merchants):
+    """Продавцы с опытом от 0 до 12000 XP и уровнем по порогам по умолчанию"""
+    from bot.levels import level_for
+    from bot.models import TelegramUser, UserRole
+
+    rng = random.Random(1)
+    batch = []
+    for i in range(merchants):
+        experience_points = rng.randrange(120) * 100
+        batch.append(TelegramUser(telegram_id=1000 + i, username=f'merchant{i}', role=UserRole.MERCHANT,
+                                  experience_points=experience_points, merchant_level=level_for(experience_points)))
+    TelegramUser.objects.bulk_create(batch, batch_size=5000)
+
+def recompute_row_by_row():
+    """Прежний подход: модель и save() на каждого продавца"""
+    from bot.levels import level_for
+    from bot.models import TelegramUser, UserRole
+
+    count = 0
+    for merchant in TelegramUser.objects.filter(role=UserRole.MERCHANT).iterator(chunk_size=2000):
+        merchant.merchant_level = level_for(merchant.experience_points)
+        merchant.save()
+        count += 1
+    return count
+
+def check_levels():
+    """Уровни совпадают с расчетом level_for по текущим порогам"""
+    from bot.levels import level_for
+    from bot.models import TelegramUser, UserRole
+
+    rows = TelegramUser.objects.filter(role=UserRole.MERCHANT).values_list('experience_points', 'merchant_level')
+    return sum(1 for experience_points, level in rows.iterator() if level != level_for(experience_points))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--merchants', type=int, default=50000)
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.getLogger('bot').setLevel(logging.WARNING)
+    from django.conf import settings
+    from bot import levels
+
+    defaults = settings.MERCHANT_LEVEL_THRESHOLDS
+    results = {}
+    with test_database():
+        seed(args.merchants)
+        queries = QueryCounter()
+        queries.install()
+
+        for name, recompute in (('Поштучно', recompute_row_by_row), ('Одним UPDATE', levels.recompute_levels)):
+            settings.MERCHANT_LEVEL_THRESHOLDS = THRESHOLDS
+            queries.count = 0
+            with timer(results, name):
+                changed = recompute()
+            count = queries.count
+            wrong = check_levels()
+            print(f"{name}: {results[name]:.2f} с, SQL-запросов: {count}, "
+                  f"обработано {changed}, неверных уровней: {wrong}")
+            assert not wrong
+            # Вернуть прежние уровни для следующего способа
+            settings.MERCHANT_LEVEL_THRESHOLDS = defaults
+            levels.recompute_levels()
+
+if __name__ == '__main__':
+    main()
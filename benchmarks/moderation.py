@@ -0,0 +1,74 @@
+"""
+Бенчмарк модерации: очередь из 1000 товаров, поштучно и пачкой
+
+Запуск:
+    python -m benchmarks.moderation --items 1000 --merchants 50
+"""
+
+import argparse
+import asyncio
+
+from benchmarks.common import setup_django, test_database, timer, RecordingBot
+
+def seed_queue(items_count, merchants_count):
+    """Создать продавцов и очередь товаров на модерации"""
+    from bot.models import TelegramUser, Item, UserRole
+
+    merchants = TelegramUser.objects.bulk_create([
+        TelegramUser(telegram_id=1000 + i, username=f'merchant{i}', role=UserRole.MERCHANT)
+        for i in range(merchants_count)
+    ])
+    Item.objects.bulk_create([
+        Item(
+            merchant=merchants[i % merchants_count],
+            title=f'Товар {i}',
+            description='Описание',
+            price=100,
+            category='Ресурсы'
+        )
+        for i in range(items_count)
+    ])
+
+def approve_one_by_one(bot):
+    """Старый путь: get + save + уведомление на каждый товар"""
+    from bot.models import Item
+
+    for item_id in list(Item.objects.filter(is_approved=False, is_active=True).values_list('id', flat=True)):
+        item = Item.objects.select_related('merchant').get(id=item_id)
+        item.is_approved = True
+        item.save()
+        asyncio.run(bot.send_message(chat_id=item.merchant.telegram_id, text=f"✅ {item.title}"))
+
+def approve_in_bulk(bot):
+    """Новый путь: один UPDATE и одно сообщение на продавца"""
+    from bot import moderation
+    from bot.models import Item
+
+    grouped = moderation.approve_items(up_to_id=Item.objects.order_by('-id').values_list('id', flat=True).first())
+    asyncio.run(moderation.notify_items_moderated(bot, grouped, approved=True))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--merchants', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from bot.models import TelegramUser, Item
+
+    results = {}
+    with test_database():
+        for name, approve in (('Поштучно', approve_one_by_one), ('Пачкой', approve_in_bulk)):
+            TelegramUser.objects.all().delete()
+            seed_queue(args.items, args.merchants)
+            bot = RecordingBot()
+            with CaptureQueriesContext(connection) as queries, timer(results, name):
+                approve(bot)
+            print(f"{name}: {results[name]:.3f} с, SQL-запросов: {len(queries)}, "
+                  f"сообщений: {len(bot.sent)}, осталось в очереди: "
+                  f"{Item.objects.filter(is_approved=False, is_active=True).count()}")
+
+if __name__ == '__main__':
+    main()
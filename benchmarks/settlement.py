@@ -0,0 +1,133 @@
+"""
+Бенчмарк пересчета комиссий: поштучно через save() и пачками bot/settlement.py
+
+Создает открытые сделки продавцов всех уровней по ставке 5.5%, меняет
+ставки уровней (TRANSACTION_FEE_SCHEDULE) и пересчитывает суммы двумя
+способами: моделью с calculate_amounts() и save() на каждую сделку (на
+первых --baseline сделках) и settle_transactions на всех. Затем проверяет
+суммы и строит выплаты продавцам по сводке продаж одним запросом.
+
+Запуск:
+    python -m benchmarks.settlement --transactions 100000
+"""
+
+import argparse
+import random
+from datetime import timedelta
+
+from benchmarks.common import QueryCounter, setup_django, test_database, timer
+
+SCHEDULE = {'SILVER': '5', 'GOLD': '4.5', 'PLATINUM': '3.5'}
+
+def seed(transactions, merchants=100, completed_share=0.2):
+    """Продавцы всех уровней, товары и сделки: открытые и завершенные"""
+    from django.utils import timezone
+    from bot.models import Item, MerchantLevel, TelegramUser, Transaction, TransactionStatus, UserRole
+
+    levels = MerchantLevel.values
+    sellers = TelegramUser.objects.bulk_create([
+        TelegramUser(telegram_id=1000 + i, username=f'merchant{i}', role=UserRole.MERCHANT,
+                     merchant_level=levels[i % len(levels)])
+        for i in range(merchants)
+    ])
+    client = TelegramUser.objects.create(telegram_id=1, username='client')
+    items = Item.objects.bulk_create([
+        # Цены с копейками: половина копейки комиссии проверяет округление
+        Item(merchant=sellers[i % merchants], title=f'Товар {i}', description='Описание',
+             price=f'{10 + i % 990}.{i % 100:02d}', category='Ресурсы', is_approved=True)
+        for i in range(merchants * 10)
+    ])
+
+    rng = random.Random(1)
+    now = timezone.now()
+    open_statuses = (TransactionStatus.PENDING_PAYMENT, TransactionStatus.PAYMENT_CONFIRMED,
+                     TransactionStatus.ITEM_DELIVERED)
+    batch = []
+    for i in range(transactions):
+        item = items[rng.randrange(len(items))]
+        completed = rng.random() < completed_share
+        transaction = Transaction(
+            transaction_id=f'TX{i:08d}', client=client, merchant=item.merchant, item=item, category=item.category,
+            amount=item.price,
+            status=TransactionStatus.COMPLETED if completed else open_statuses[i % len(open_statuses)],
+            completed_at=now - timedelta(seconds=rng.randrange(30 * 86400)) if completed else None,
+        )
+        transaction.calculate_amounts()
+        batch.append(transaction)
+        if len(batch) == 5000:
+            Transaction.objects.bulk_create(batch)
+            batch = []
+    Transaction.objects.bulk_create(batch)
+
+def settle_row_by_row(limit):
+    """Прежний подход: модель и save() на каждую сделку"""
+    from bot.settlement import open_transactions
+
+    transactions = open_transactions().select_related('merchant').order_by('id')
+    count = 0
+    for transaction in transactions[:limit]:
+        transaction.calculate_amounts()
+        transaction.save(update_fields=['fee_amount', 'merchant_amount'])
+        count += 1
+    return count
+
+def check_amounts():
+    """Суммы открытых сделок совпадают с расчетом по ставке уровня продавца"""
+    from bot.settlement import fee_percent, open_transactions, split_amount
+
+    wrong = 0
+    rows = open_transactions().values_list(
+        'amount', 'fee_amount', 'merchant_amount', 'merchant__merchant_level'
+    )
+    for amount, fee, payout, level in rows.iterator(chunk_size=5000):
+        if (fee, payout) != split_amount(amount, fee_percent(level)) or fee + payout != amount:
+            wrong += 1
+    return wrong
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--baseline', type=int, default=10000, help='Сделок для поштучного пересчета')
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.getLogger('bot').setLevel(logging.WARNING)
+    from django.conf import settings
+    from bot import analytics, settlement
+
+    results = {}
+    with test_database():
+        seed(args.transactions)
+        analytics.rebuild()
+        settings.TRANSACTION_FEE_SCHEDULE = SCHEDULE
+        rates = ', '.join(f'{level} {percent}%' for level, percent in settlement.fee_schedule().items())
+        print(f"Сделок: {args.transactions}, новые ставки: {rates}")
+        queries = QueryCounter()
+        queries.install()
+
+        queries.count = 0
+        with timer(results, 'rows'):
+            count = settle_row_by_row(args.baseline)
+        print(f"Поштучно: {count} сделок за {results['rows']:.2f} с, "
+              f"{count / results['rows']:.0f} сделок/с, SQL-запросов: {queries.count}")
+
+        queries.count = 0
+        with timer(results, 'batch'):
+            checked, changed = settlement.settle_transactions()
+        print(f"Пачками: {checked} сделок (изменено {changed}) за {results['batch']:.2f} с, "
+              f"{checked / results['batch']:.0f} сделок/с, SQL-запросов: {queries.count}")
+
+        wrong = check_amounts()
+        print(f"Сделок с неверными суммами: {wrong}")
+        assert not wrong
+
+        date_from, date_to = analytics.period(30)
+        queries.count = 0
+        with timer(results, 'payouts'):
+            rows = settlement.payout_summary(date_from, date_to)
+        print(f"Выплаты: {len(rows)} продавцов за {results['payouts'] * 1000:.1f} мс, "
+              f"SQL-запросов: {queries.count}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Бенчмарк запуска бота: webhook и polling, с холодного старта процесса
+
+Каждый запуск - отдельный процесс: django.setup(), импорт обработчиков,
+сборка application, initialize() (getMe фейкового Bot API) и обработка
+первого обновления. Выводится медиана по запускам.
+
+Запуск:
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BASE_DIR, setup_django
+
+MODES = ('webhook', 'polling')
+PHASES = ('django_setup', 'import', 'build', 'initialize', 'first_update')
+
+def measure(mode):
+    """Время фаз запуска в текущем процессе, с"""
+    import asyncio
+
+    timings = {}
+    started = time.perf_counter()
+    setup_django()
+    timings['django_setup'] = time.perf_counter() - started
+
+    import logging
+    logging.getLogger('bot').setLevel(logging.WARNING)
+    logging.getLogger('telegram').setLevel(logging.WARNING)
+
+    started = time.perf_counter()
+    from bot.application import create_application
+    from telegram import Update
+    timings['import'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    application = create_application(for_polling=mode == 'polling')
+    timings['build'] = time.perf_counter() - started
+
+    update = {
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'User'},
+            'text': '/help',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 5}],
+        },
+    }
+
+    async def run():
+        begin = time.perf_counter()
+        await application.initialize()
+        timings['initialize'] = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        await application.process_update(Update.de_json(update, application.bot))
+        timings['first_update'] = time.perf_counter() - begin
+        await application.shutdown()
+
+    asyncio.run(run())
+    return timings
+
+def run_child(mode):
+    """Запустить замер в отдельном процессе"""
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child', mode],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Запусков на режим')
+    parser.add_argument('--mode', choices=MODES, action='append', help='Режим, по умолчанию оба')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child)))
+        return
+
+    os.environ['TELEGRAM_FAKE_API'] = 'True'
+    print(f"{'Режим':<10}" + ''.join(f"{phase:>14}" for phase in PHASES) + f"{'всего мс':>12}")
+    for mode in args.mode or MODES:
+        runs = [run_child(mode) for _ in range(args.runs)]
+        medians = {phase: statistics.median(run[phase] for run in runs) * 1000 for phase in PHASES}
+        print(f"{mode:<10}" + ''.join(f"{medians[phase]:>14.1f}" for phase in PHASES)
+              + f"{sum(medians.values()):>12.1f}")
+
+if __name__ == '__main__':
+    main()
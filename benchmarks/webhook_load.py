@@ -0,0 +1,282 @@
+"""
+Нагрузочный тест webhook: синтетические обновления Telegram
+
+Генерирует потоки обновлений (нажатия кнопок меню, просмотр каталога,
+полный цикл покупки buy -> paid -> approve -> received -> complete) для
+множества пользователей, отправляет их POST-запросами на /bot/webhook/
+через Django test client и считает пропускную способность, перцентили
+задержки, количество SQL-запросов и вызовов Bot API по каждому сценарию.
+Запросы к Bot API обслуживает фейковый Bot API (bot/fake_api.py), сеть не
+используется; задержку и ошибки API можно задать параметрами --api-*.
+
+С --profiling каждый сценарий прогоняется --rounds раз, профилировщик
+(BOT_PROFILING=True, доля профилируемых обновлений BOT_PROFILING_SAMPLE_RATE)
+включается через обновление, и печатается разница средней задержки.
+
+Запуск:
+    python -m benchmarks.webhook_load --users 50 --items 20
+    python -m benchmarks.webhook_load --scenario purchase --json results.json
+    python -m benchmarks.webhook_load --api-latency 0.05 --api-retry-after-rate 0.01
+    python -m benchmarks.webhook_load --profiling --rounds 5
+"""
+
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import setup_django, test_database, percentile, QueryCounter
+
+ADMIN_ID = 1
+MERCHANT_BASE_ID = 100
+CLIENT_BASE_ID = 10000
+
+MENU_TAPS = ["/start", "👤 Мой профиль", "🏆 Рейтинг продавцов", "📦 Мои покупки", "ℹ️ Помощь"]
+
+_update_ids = itertools.count(1)
+
+def _user(telegram_id):
+    return {'id': telegram_id, 'is_bot': False, 'first_name': f'User{telegram_id}', 'username': f'user{telegram_id}'}
+
+def text_update(telegram_id, text):
+    """Обновление с текстовым сообщением (или командой)"""
+    message = {
+        'message_id': next(_update_ids),
+        'date': int(time.time()),
+        'chat': {'id': telegram_id, 'type': 'private'},
+        'from': _user(telegram_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': next(_update_ids), 'message': message}
+
+def callback_update(telegram_id, data):
+    """Обновление с нажатием inline-кнопки"""
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'chat_instance': str(telegram_id),
+            'from': _user(telegram_id),
+            'data': data,
+            'message': {
+                'message_id': next(_update_ids),
+                'date': int(time.time()),
+                'chat': {'id': telegram_id, 'type': 'private'},
+                'text': '...',
+            },
+        },
+    }
+
+def seed(users, merchants, items):
+    """Администратор, продавцы с одобренными товарами и покупатели"""
+    from bot.models import TelegramUser, Item, UserRole
+
+    TelegramUser.objects.create(telegram_id=ADMIN_ID, username='admin', role=UserRole.ADMIN)
+    merchant_objs = TelegramUser.objects.bulk_create([
+        TelegramUser(telegram_id=MERCHANT_BASE_ID + i, username=f'merchant{i}', role=UserRole.MERCHANT)
+        for i in range(merchants)
+    ])
+    Item.objects.bulk_create([
+        Item(
+            merchant=merchant_objs[i % merchants],
+            title=f'Алмазный меч #{i}',
+            description='Меч с зачарованиями',
+            price=100 + i,
+            category='Оружие',
+            is_approved=True
+        )
+        for i in range(items)
+    ])
+    TelegramUser.objects.bulk_create([
+        TelegramUser(telegram_id=CLIENT_BASE_ID + i, username=f'user{CLIENT_BASE_ID + i}')
+        for i in range(users)
+    ])
+
+def scenario_menu(users):
+    """Нажатия кнопок меню"""
+    for i in range(users):
+        for text in MENU_TAPS:
+            yield text_update(CLIENT_BASE_ID + i, text)
+
+def scenario_catalog(users):
+    """Просмотр каталога"""
+    for i in range(users):
+        yield text_update(CLIENT_BASE_ID + i, "🛍 Каталог товаров")
+
+def scenario_purchase(users):
+    """Полный цикл покупки для каждого пользователя"""
+    from bot.models import Item, Transaction
+
+    item_ids = list(Item.objects.filter(is_approved=True, is_active=True).values_list('id', flat=True))
+    for i in range(users):
+        client_id = CLIENT_BASE_ID + i
+        yield callback_update(client_id, f"buy_{item_ids[i % len(item_ids)]}")
+
+        transaction_id = Transaction.objects.filter(
+            client__telegram_id=client_id
+        ).order_by('-id').values_list('id', flat=True).first()
+        yield callback_update(client_id, f"paid_{transaction_id}")
+        yield callback_update(ADMIN_ID, f"approve_payment_{transaction_id}")
+        yield callback_update(client_id, f"received_{transaction_id}")
+        yield callback_update(ADMIN_ID, f"complete_{transaction_id}")
+
+SCENARIOS = {
+    'menu': scenario_menu,
+    'catalog': scenario_catalog,
+    'purchase': scenario_purchase,
+}
+
+def run_scenario(client, name, users, queries, api):
+    """Отправить все обновления сценария и собрать статистику"""
+    from django.conf import settings
+    from bot import ratelimit
+
+    # Сценарии независимы: пользователи начинают каждый с полным ведром лимита
+    ratelimit._limiter = None
+    headers = {'X-Telegram-Bot-Api-Secret-Token': settings.TELEGRAM_WEBHOOK_SECRET}
+    latencies = []
+    queries.count = 0
+    api.reset()
+    errors = 0
+
+    started = time.perf_counter()
+    for update in SCENARIOS[name](users):
+        body = json.dumps(update)
+        request_started = time.perf_counter()
+        response = client.post('/bot/webhook/', data=body, content_type='application/json', headers=headers)
+        latencies.append(time.perf_counter() - request_started)
+        if response.status_code != 200:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    count = len(latencies)
+    return {
+        'scenario': name,
+        'updates': count,
+        'errors': errors,
+        'seconds': elapsed,
+        'updates_per_second': count / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'sql_queries': queries.count,
+        'sql_per_update': queries.count / count if count else 0.0,
+        'api_calls': api.count(),
+        'api_calls_per_update': api.count() / count if count else 0.0,
+        'api_calls_by_method': dict(api.counts()),
+    }
+
+def profiling_overhead(client, name, users, rounds):
+    """Задержка обновлений без профилирования и с ним
+
+    Профилирование включается через обновление в одних и тех же прогонах:
+    рост базы и фоновая нагрузка машины одинаково влияют на оба режима.
+    """
+    from django.conf import settings
+    from bot import ratelimit
+
+    headers = {'X-Telegram-Bot-Api-Secret-Token': settings.TELEGRAM_WEBHOOK_SECRET}
+    latencies = {False: [], True: []}
+    enabled = False
+    for _ in range(rounds):
+        ratelimit._limiter = None
+        for update in SCENARIOS[name](users):
+            settings.BOT_PROFILING = enabled
+            body = json.dumps(update)
+            request_started = time.perf_counter()
+            client.post('/bot/webhook/', data=body, content_type='application/json', headers=headers)
+            latencies[enabled].append(time.perf_counter() - request_started)
+            enabled = not enabled
+    settings.BOT_PROFILING = False
+
+    off, on = (sum(latencies[mode]) / len(latencies[mode]) for mode in (False, True))
+    return {
+        'scenario': name,
+        'updates': sum(len(values) for values in latencies.values()),
+        'off_ms': off * 1000,
+        'on_ms': on * 1000,
+        'off_p50_ms': percentile(latencies[False], 50) * 1000,
+        'on_p50_ms': percentile(latencies[True], 50) * 1000,
+        'overhead_percent': (on / off - 1) * 100,
+    }
+
+def print_profiling_report(results, sample_rate):
+    print(f"Профилирование: доля профилируемых обновлений {sample_rate}, средняя задержка обновления")
+    print(f"{'Сценарий':<10} {'Обновл.':>8} {'выкл. мс':>9} {'вкл. мс':>9} {'p50 выкл':>9} "
+          f"{'p50 вкл':>9} {'разница':>8}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['updates']:>8} {r['off_ms']:>9.3f} {r['on_ms']:>9.3f} "
+              f"{r['off_p50_ms']:>9.3f} {r['on_p50_ms']:>9.3f} {r['overhead_percent']:>7.2f}%")
+
+def print_report(results):
+    print(f"{'Сценарий':<10} {'Обновл.':>8} {'Ошибки':>7} {'upd/s':>8} {'p50 мс':>8} "
+          f"{'p95 мс':>8} {'p99 мс':>8} {'SQL/upd':>8} {'API/upd':>8}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['updates']:>8} {r['errors']:>7} {r['updates_per_second']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['sql_per_update']:>8.2f} {r['api_calls_per_update']:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50, help='Количество покупателей')
+    parser.add_argument('--merchants', type=int, default=10, help='Количество продавцов')
+    parser.add_argument('--items', type=int, default=10, help='Количество товаров в каталоге')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help='Сценарий (можно указать несколько раз), по умолчанию все')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='Задержка ответа Bot API, с')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='Доля ответов Bot API с ошибкой 500')
+    parser.add_argument('--api-retry-after-rate', type=float, default=0.0, help='Доля ответов Bot API 429 (RetryAfter)')
+    parser.add_argument('--profiling', action='store_true',
+                        help='Сравнить сценарии без профилирования и с включенным профилировщиком')
+    parser.add_argument('--rounds', type=int, default=3, help='Прогонов каждого сценария для --profiling')
+    parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+    args = parser.parse_args()
+
+    os.environ['TELEGRAM_FAKE_API'] = 'True'
+    os.environ['TELEGRAM_FAKE_API_LATENCY'] = str(args.api_latency)
+    os.environ['TELEGRAM_FAKE_API_ERROR_RATE'] = str(args.api_error_rate)
+    os.environ['TELEGRAM_FAKE_API_RETRY_AFTER_RATE'] = str(args.api_retry_after_rate)
+    setup_django()
+    import logging
+    import warnings
+    logging.getLogger('bot').setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    # STATIC_ROOT появляется только после collectstatic
+    warnings.filterwarnings('ignore', message='No directory at')
+
+    from django.conf import settings
+    from django.test import Client
+    from bot.fake_api import get_fake_api
+    from bot.telegram_webhook import get_application
+
+    scenarios = args.scenario or list(SCENARIOS)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, test_database(os.path.join(tmp, 'load.sqlite3')):
+        settings.BOT_PROFILING_DIR = os.path.join(tmp, 'profiles')
+        seed(args.users, args.merchants, args.items)
+        get_application()
+        api = get_fake_api()
+        queries = QueryCounter()
+        queries.install()
+        client = Client()
+
+        for name in scenarios:
+            if args.profiling:
+                results.append(profiling_overhead(client, name, args.users, args.rounds))
+            else:
+                results.append(run_scenario(client, name, args.users, queries, api))
+
+    if args.profiling:
+        print_profiling_report(results, settings.BOT_PROFILING_SAMPLE_RATE)
+    else:
+        print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
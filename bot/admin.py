@@ -1,35 +1,115 @@
-from django.contrib import admin
-from .models import TelegramUser, Item, Transaction, Review
+from django.contrib import admin, messages
+from exchange.db_router import replica_reads
+from . import moderation
+from .models import TelegramUser, Item, Transaction, ArchivedTransaction, Review, DailySalesRollup
+
+def _notify(request, model_admin, send, *args, **kwargs):
+    """Отправить уведомления о модерации через бота из админ-панели"""
+    from .views import run_async
+    from .telegram_webhook import get_application
+    
+    try:
+        run_async(send(get_application().bot, *args, **kwargs))
+    except Exception as e:
+        model_admin.message_user(request, f"Не удалось отправить уведомления: {e}", level=messages.WARNING)
+
+class ReplicaListMixin:
+    """Списки объектов в админ-панели читаются с реплики"""
+    
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        
+        with replica_reads():
+            response = super().changelist_view(request, extra_context)
+            # Шаблон рендерится лениво - выполняем запросы внутри блока
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 @admin.register(TelegramUser)
-class TelegramUserAdmin(admin.ModelAdmin):
+class TelegramUserAdmin(ReplicaListMixin, admin.ModelAdmin):
     list_display = ['telegram_id', 'username', 'role', 'merchant_level', 'total_sales', 'rating', 'created_at']
     list_filter = ['role', 'merchant_level', 'is_active']
     search_fields = ['telegram_id', 'username', 'first_name', 'last_name']
     readonly_fields = ['created_at']
 
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(ReplicaListMixin, admin.ModelAdmin):
     list_display = ['title', 'merchant', 'price', 'category', 'is_approved', 'is_active', 'created_at']
     list_filter = ['is_approved', 'is_active', 'category']
     search_fields = ['title', 'description']
     readonly_fields = ['created_at', 'updated_at', 'views_count']
-    actions = ['approve_items']
+    actions = ['approve_items', 'reject_items']
     
     def approve_items(self, request, queryset):
-        queryset.update(is_approved=True)
+        # Одобряются только товары на модерации: уже одобренные и снятые
+        # с публикации (is_active=False) пропускаются
+        item_ids = list(queryset.values_list('id', flat=True))
+        grouped = moderation.approve_items(item_ids)
+        _notify(request, self, moderation.notify_items_moderated, grouped, approved=True)
+        approved = sum(len(items) for items in grouped.values())
+        message = f"Одобрено товаров: {approved}"
+        if approved < len(item_ids):
+            message += f" (пропущено уже одобренных или снятых с публикации: {len(item_ids) - approved})"
+        self.message_user(request, message)
     approve_items.short_description = "Одобрить выбранные товары"
+    
+    def reject_items(self, request, queryset):
+        grouped = moderation.reject_items(list(queryset.values_list('id', flat=True)))
+        _notify(request, self, moderation.notify_items_moderated, grouped, approved=False)
+        self.message_user(request, f"Отклонено товаров: {sum(len(items) for items in grouped.values())}")
+    reject_items.short_description = "Отклонить выбранные товары"
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ReplicaListMixin, admin.ModelAdmin):
     list_display = ['transaction_id', 'client', 'merchant', 'amount', 'fee_amount', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['transaction_id', 'client__username', 'merchant__username']
-    readonly_fields = ['transaction_id', 'created_at', 'updated_at', 'fee_amount', 'merchant_amount']
+    readonly_fields = ['transaction_id', 'category', 'created_at', 'updated_at', 'fee_amount', 'merchant_amount']
+    actions = ['approve_payments', 'reject_payments']
+    
+    def approve_payments(self, request, queryset):
+        transactions = moderation.approve_payments(list(queryset.values_list('id', flat=True)))
+        _notify(request, self, moderation.notify_payments_approved, transactions)
+        self.message_user(request, f"Одобрено платежей: {len(transactions)}")
+    approve_payments.short_description = "Одобрить выбранные платежи"
+    
+    def reject_payments(self, request, queryset):
+        grouped = moderation.reject_payments(list(queryset.values_list('id', flat=True)))
+        _notify(request, self, moderation.notify_payments_rejected, grouped)
+        self.message_user(request, f"Отклонено платежей: {sum(len(rows) for rows in grouped.values())}")
+    reject_payments.short_description = "Отклонить выбранные платежи"
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['transaction_id', 'client', 'merchant', 'amount', 'fee_amount', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['transaction_id', 'client__username', 'merchant__username']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(ReplicaListMixin, admin.ModelAdmin):
     list_display = ['merchant', 'client', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['merchant__username', 'client__username']
     readonly_fields = ['created_at']
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(ReplicaListMixin, admin.ModelAdmin):
+    list_display = ['day', 'merchant', 'category', 'transactions_count', 'amount', 'fee_amount', 'merchant_amount']
+    list_filter = ['day', 'category']
+    search_fields = ['merchant__username', 'category']
+    date_hierarchy = 'day'
+    
+    # Строки меняются только завершением сделок и backfill_sales_rollups
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
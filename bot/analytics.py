@@ -0,0 +1,182 @@
+"""
+Аналитика продаж по заранее посчитанным суммам за день
+
+На каждый день, продавца и категорию товара хранится одна строка
+DailySalesRollup: количество завершенных сделок, оборот, комиссия и сумма
+продавцу. Строка обновляется в той же транзакции базы, что и завершение
+сделки (complete_transaction), приращением через F() - без чтения и без
+гонок между воркерами. Отчеты за месяцы читают сотни строк сводки, а не
+таблицу транзакций.
+
+День сделки - дата завершения (completed_at) в часовом поясе TIME_ZONE,
+категория - категория товара на момент покупки (Transaction.category): и
+приращение, и пересчет берут её из сделки, поэтому смена категории товара
+не меняет уже учтенные продажи. Если суммы разошлись с транзакциями (правка
+статуса в админ-панели, сделки до появления сводки), их пересчитывает
+команда manage.py backfill_sales_rollups.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from exchange.db_router import read_from_replica
+
+from .models import ArchivedTransaction, DailySalesRollup, Transaction, TransactionStatus
+
+logger = logging.getLogger(__name__)
+
+SUMMED_FIELDS = ('amount', 'fee_amount', 'merchant_amount')
+
+KOPECK = Decimal('0.01')
+
+# Разрезы отчета: выражение для группировки строк сводки
+GROUPINGS = {
+    'day': F('day'),
+    'month': TruncMonth('day'),
+    'category': F('category'),
+    'merchant': F('merchant__telegram_id'),
+}
+
+# Разрезы по времени сортируются по дате, остальные - по обороту
+TIME_GROUPINGS = ('day', 'month')
+
+# Самый длинный период отчета в боте и в API, дней
+MAX_REPORT_DAYS = 731
+
+def sale_day(completed_at):
+    """День продажи для сводки"""
+    return timezone.localdate(completed_at)
+
+def record_sale(transaction):
+    """Добавить завершенную сделку в сводку за её день
+
+    Вызывается внутри транзакции базы, завершающей сделку.
+    """
+    key = {
+        'day': sale_day(transaction.completed_at),
+        'merchant_id': transaction.merchant_id,
+        'category': transaction.category,
+    }
+    increments = {
+        'transactions_count': F('transactions_count') + 1,
+        **{field: F(field) + getattr(transaction, field) for field in SUMMED_FIELDS},
+        'updated_at': timezone.now(),
+    }
+    if DailySalesRollup.objects.filter(**key).update(**increments):
+        return
+
+    # Первая продажа за день в этом разрезе: пустая строка (ON CONFLICT DO
+    # NOTHING - её мог только что создать другой воркер) и то же приращение
+    DailySalesRollup.objects.bulk_create([DailySalesRollup(**key)], ignore_conflicts=True)
+    DailySalesRollup.objects.filter(**key).update(**increments)
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def _completed_sales(model, date_from, date_to):
+    """Суммы завершенных сделок по дням, продавцам и категориям"""
+    queryset = model.objects.filter(status=TransactionStatus.COMPLETED, completed_at__isnull=False)
+    if date_from is not None:
+        queryset = queryset.filter(completed_at__gte=_day_start(date_from))
+    if date_to is not None:
+        queryset = queryset.filter(completed_at__lt=_day_start(date_to + timedelta(days=1)))
+    return queryset.annotate(
+        day=TruncDate('completed_at', tzinfo=timezone.get_current_timezone()),
+    ).values('day', 'merchant_id', 'category').annotate(
+        transactions_count=Count('id'),
+        **{field: Sum(field) for field in SUMMED_FIELDS},
+    ).order_by()
+
+def _lock_rollups():
+    """Запретить запись в сводку до конца транзакции базы
+
+    В PostgreSQL - блокировка таблицы: record_sale завершающихся сделок ждет
+    пересчета, а чтение отчетов продолжается. В SQLite пишет только одно
+    соединение, и запись блокирует базу с первого DELETE.
+    """
+    connection = connections[router.db_for_write(DailySalesRollup)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {DailySalesRollup._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+
+def rebuild(date_from=None, date_to=None):
+    """Пересчитать сводку за период (включительно) по транзакциям и архиву
+
+    Удаление, агрегация и вставка идут в одной транзакции базы под
+    блокировкой сводки: продажа, завершенная во время пересчета, либо уже
+    видна агрегации, либо добавится record_sale после него. Завершение
+    сделок ждет конца пересчета, поэтому большие периоды лучше пересчитывать
+    частями (--from/--to). Возвращает число строк сводки за период.
+    """
+    rollups = DailySalesRollup.objects.all()
+    if date_from is not None:
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to is not None:
+        rollups = rollups.filter(day__lte=date_to)
+
+    with db_transaction.atomic():
+        _lock_rollups()
+        deleted, _ = rollups.delete()
+
+        sums = defaultdict(lambda: {'transactions_count': 0, **{field: Decimal('0') for field in SUMMED_FIELDS}})
+        for model in (Transaction, ArchivedTransaction):
+            for row in _completed_sales(model, date_from, date_to):
+                entry = sums[(row['day'], row['merchant_id'], row['category'])]
+                entry['transactions_count'] += row['transactions_count']
+                for field in SUMMED_FIELDS:
+                    entry[field] += row[field] or 0
+
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(day=day, merchant_id=merchant_id, category=category, **values)
+            for (day, merchant_id, category), values in sums.items()
+        ], batch_size=1000)
+    logger.info(f"Сводка продаж пересчитана: удалено строк {deleted}, создано {len(sums)}")
+    return len(sums)
+
+@read_from_replica
+def sales_report(date_from, date_to, group_by='day', merchant_id=None, limit=None):
+    """Продажи за период по разрезу group_by (day, month, category или merchant)
+
+    merchant_id - telegram_id продавца, чтобы показать только его продажи.
+    Возвращает список словарей: key, transactions_count, amount, fee_amount, merchant_amount.
+    """
+    rollups = DailySalesRollup.objects.filter(day__gte=date_from, day__lte=date_to)
+    if merchant_id is not None:
+        rollups = rollups.filter(merchant__telegram_id=merchant_id)
+
+    rows = rollups.values(key=GROUPINGS[group_by]).annotate(
+        transactions_count=Sum('transactions_count'),
+        **{name: Sum(name) for name in SUMMED_FIELDS},
+    )
+    if group_by in TIME_GROUPINGS:
+        rows = rows.order_by('key')
+    else:
+        rows = rows.order_by('-amount', 'key')
+    if limit:
+        rows = rows[:limit]
+
+    rows = list(rows)
+    # SQLite суммирует DecimalField с погрешностью float - округляем до копеек
+    for row in rows:
+        for name in SUMMED_FIELDS:
+            row[name] = Decimal(row[name] or 0).quantize(KOPECK)
+    return rows
+
+def totals(rows):
+    """Итог по строкам отчета"""
+    return {
+        'transactions_count': sum(row['transactions_count'] for row in rows),
+        **{field: sum((row[field] for row in rows), Decimal('0')) for field in SUMMED_FIELDS},
+    }
+
+def period(days, today=None):
+    """Период из последних days дней, включая сегодня"""
+    today = today or timezone.localdate()
+    return today - timedelta(days=days - 1), today
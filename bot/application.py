@@ -0,0 +1,85 @@
+"""
+Сборка Telegram application для webhook и polling
+
+Граф обработчиков описан здесь один раз: create_application() собирает
+application с инструментированием и всеми обработчиками, для polling -
+дополнительно с параллельной обработкой обновлений (bot/polling.py).
+Фильтры неизменяемы и создаются при импорте модуля; ConversationHandler
+хранит состояние диалогов, поэтому у каждого application свой.
+"""
+
+import logging
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import (
+    Application, CallbackQueryHandler, CommandHandler, ConversationHandler, MessageHandler,
+    TypeHandler, filters,
+)
+
+from . import instrumentation, polling, ratelimit
+from .telegram_bot import (
+    ADDING_ITEM_CATEGORY, ADDING_ITEM_DESC, ADDING_ITEM_PRICE, ADDING_ITEM_TITLE,
+    add_item_category, add_item_description, add_item_price, add_item_title, cancel, export_command,
+    handle_callback, handle_text, help_command, import_items_document, profile, remember_user, sales_command,
+    start, start_add_item,
+)
+
+logger = logging.getLogger(__name__)
+
+TEXT_FILTER = filters.TEXT & ~filters.COMMAND
+ADD_ITEM_FILTER = filters.Regex('^➕ Добавить товар$')
+
+def build_handlers():
+    """Обработчики бота по группам: {группа: [обработчики]}"""
+    # ConversationHandler для добавления товара
+    add_item_conv = ConversationHandler(
+        entry_points=[MessageHandler(ADD_ITEM_FILTER, start_add_item)],
+        states={
+            ADDING_ITEM_TITLE: [MessageHandler(TEXT_FILTER, add_item_title)],
+            ADDING_ITEM_DESC: [MessageHandler(TEXT_FILTER, add_item_description)],
+            ADDING_ITEM_PRICE: [MessageHandler(TEXT_FILTER, add_item_price)],
+            ADDING_ITEM_CATEGORY: [MessageHandler(TEXT_FILTER, add_item_category)],
+        },
+        fallbacks=[CommandHandler('cancel', cancel)],
+    )
+
+    return {
+        # Лимит запросов пользователя (группа -2 выполняется первой)
+        -2: [TypeHandler(Update, ratelimit.rate_limit)],
+        # Автор обновления (группа -1 выполняется перед остальными)
+        -1: [TypeHandler(Update, remember_user)],
+        0: [
+            # Обработчики команд
+            CommandHandler("start", start),
+            CommandHandler("help", help_command),
+            CommandHandler("profile", profile),
+            CommandHandler("export", export_command),
+            CommandHandler("sales", sales_command),
+            # Диалог добавления товара - раньше общего обработчика текста
+            add_item_conv,
+            CallbackQueryHandler(handle_callback),
+            # Массовая загрузка товаров документом
+            MessageHandler(filters.Document.ALL, import_items_document),
+            MessageHandler(TEXT_FILTER, handle_text),
+        ],
+    }
+
+def setup_handlers(application):
+    """Зарегистрировать обработчики бота и метрики по ним"""
+    for group, handlers in build_handlers().items():
+        application.add_handlers(handlers, group=group)
+
+    # Метрики по каждому обработчику
+    instrumentation.instrument_handlers(application)
+
+def create_application(for_polling=False):
+    """Application с обработчиками бота (для webhook или для polling)"""
+    builder = Application.builder().token(settings.TELEGRAM_BOT_TOKEN)
+    builder = instrumentation.apply_to_builder(builder)
+    if for_polling:
+        builder = polling.configure_builder(builder)
+    application = builder.build()
+    setup_handlers(application)
+    logger.info(f"Обработчики бота настроены для {'polling' if for_polling else 'webhook'}")
+    return application
@@ -0,0 +1,125 @@
+"""
+Архивирование завершённых и отменённых транзакций
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Transaction, ArchivedTransaction, TransactionStatus
+
+logger = logging.getLogger(__name__)
+
+# Статусы, после которых транзакция больше не меняется
+ARCHIVABLE_STATUSES = (TransactionStatus.COMPLETED, TransactionStatus.CANCELLED)
+
+# Начало отсчета ключа страницы истории
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Поля, которые переносятся в архив без изменений
+ARCHIVED_FIELDS = (
+    'transaction_id', 'client_id', 'merchant_id', 'item_id', 'category',
+    'amount', 'fee_amount', 'merchant_amount', 'status',
+    'payment_confirmed_at', 'item_delivered_at', 'completed_at',
+    'client_contact', 'merchant_contact', 'created_at', 'updated_at',
+)
+
+def get_archivable_transactions(older_than_days=None):
+    """Транзакции, которые можно перенести в архив"""
+    if older_than_days is None:
+        older_than_days = settings.TRANSACTION_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    # Транзакции с отзывом остаются в основной таблице:
+    # Review ссылается на Transaction и удалился бы каскадно
+    return Transaction.objects.filter(
+        status__in=ARCHIVABLE_STATUSES,
+        updated_at__lt=cutoff,
+        review__isnull=True
+    )
+
+def archive_batch(queryset, batch_size):
+    """Перенести в архив одну пачку транзакций, вернуть количество"""
+    with db_transaction.atomic():
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        rows = Transaction.objects.filter(id__in=ids).values('id', *ARCHIVED_FIELDS)
+        ArchivedTransaction.objects.bulk_create([
+            ArchivedTransaction(original_id=row.pop('id'), **row)
+            for row in rows
+        ])
+        Transaction.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+def archive_transactions(older_than_days=None, batch_size=None, max_batches=None):
+    """Перенести старые транзакции в архив пачками, вернуть общее количество"""
+    batch_size = batch_size or settings.TRANSACTION_ARCHIVE_BATCH_SIZE
+    queryset = get_archivable_transactions(older_than_days)
+
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        archived = archive_batch(queryset, batch_size)
+        if not archived:
+            break
+        total += archived
+        batches += 1
+        logger.info(f"Архивировано транзакций: {total}")
+
+    return total
+
+def history_key(row):
+    """Ключ строки истории: (created_at, id транзакции)
+
+    Архивная строка хранит id транзакции в original_id, поэтому ключ не
+    меняется при переносе в архив.
+    """
+    if isinstance(row, ArchivedTransaction):
+        return row.created_at, row.original_id
+    return row.created_at, row.id
+
+def history_cursor(row):
+    """Ключ строки для кнопки следующей страницы: <микросекунды>_<id>"""
+    created_at, transaction_id = history_key(row)
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1)}_{transaction_id}"
+
+def parse_history_cursor(value):
+    """Ключ из history_cursor() или None, если значение не разобрать"""
+    try:
+        microseconds, transaction_id = map(int, value.split('_'))
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + timedelta(microseconds=microseconds), transaction_id
+
+def _before(queryset, id_field, cursor):
+    created_at, transaction_id = cursor
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, **{f'{id_field}__lt': transaction_id})
+    )
+
+def paginate_history(hot_queryset, archive_queryset, cursor, limit):
+    """Страница истории из основной таблицы и архива, новые сверху
+
+    Страницы идут по ключу (created_at, id транзакции), а не по смещению:
+    cursor - ключ последней показанной строки (None - первая страница).
+    Если архиватор переносит строки между загрузками страниц, они не
+    пропускаются и не показываются дважды.
+    """
+    hot = hot_queryset.order_by('-created_at', '-id')
+    archive = archive_queryset.order_by('-created_at', '-original_id')
+    if cursor is not None:
+        hot = _before(hot, 'id', cursor)
+        archive = _before(archive, 'original_id', cursor)
+
+    # Основная таблица читается первой: строку, которую перенесли между двумя
+    # запросами, вернет архив (и, возможно, оба запроса - дубль отбрасывается)
+    rows = {}
+    for row in [*hot[:limit], *archive[:limit]]:
+        rows.setdefault(history_key(row), row)
+    return [rows[key] for key in sorted(rows, reverse=True)[:limit]]
@@ -0,0 +1,170 @@
+"""
+Кеш данных бота поверх Django cache (settings.CACHES)
+
+Данные хранятся в пространствах имён (Namespace): ключ catalog:items:0:10
+превращается в bot:catalog:items:0:10 (декоратор cached() собирает ключ
+из имени и аргументов функции). У пространства есть версия; запись
+хранится вместе с версией, при которой была вычислена, и читается одним
+get_many вместе с текущей версией. invalidate() меняет версию, и все записи
+пространства сразу устаревают во всех процессах, без перебора ключей.
+Версия создаётся при первом обращении; если её ключ вытеснят, создаётся
+новая, и записи под старой версией не оживают.
+
+get_or_set() - асинхронный: кешируемая функция - это ORM-вызов
+db_sync_to_async, а cached() оборачивает его снаружи. Значение пересчитывается
+один раз (single-flight) на ключе-блокировке (cache.add); остальные
+обработчики ждут результат через asyncio.sleep не дольше BOT_CACHE_LOCK_WAIT
+секунд, потом вычисляют сами. Пока они ждут, поток ORM и слот пула соединений
+не заняты. Обращения к кешу выполняются в потоках asyncio по умолчанию, как
+в bot/ratelimit.py. cache.add атомарен для db и redis; у файлового кеша
+блокировка между процессами приблизительная.
+
+Обращения учитываются в bot_cache_requests_total{namespace, result}:
+hit, miss (значение вычислено), wait (дождались чужого вычисления) и error
+(кеш недоступен, значение вычислено без него).
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = metrics.counter(
+    'bot_cache_requests_total', 'Обращения к кешу бота по результату', ['namespace', 'result'])
+COMPUTE_SECONDS = metrics.histogram(
+    'bot_cache_compute_seconds', 'Время вычисления значений для кеша', ['namespace'])
+
+KEY_PREFIX = 'bot:'
+
+# Сколько живёт ключ-блокировка, если вычисливший процесс упал, с
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+async def _run(func, *args):
+    """Синхронный вызов кеша вне event loop и вне пула потоков ORM"""
+    return await sync_to_async(func, thread_sensitive=False)(*args)
+
+class Namespace:
+    """Пространство имён кеша с версионной инвалидацией"""
+
+    def __init__(self, name, timeout_setting):
+        self.name = name
+        self.timeout_setting = timeout_setting
+        self._version_key = f'{KEY_PREFIX}{name}:version'
+
+    @property
+    def timeout(self):
+        return getattr(settings, self.timeout_setting)
+
+    def _key(self, key):
+        return f'{KEY_PREFIX}{self.name}:{key}'
+
+    def _version(self):
+        """Текущая версия; при первом обращении (или после вытеснения) создаётся"""
+        version = cache.get(self._version_key)
+        if version is None:
+            cache.add(self._version_key, uuid.uuid4().hex, None)
+            version = cache.get(self._version_key)
+        return version
+
+    def _read(self, key):
+        """(текущая версия, значение или _MISSING)"""
+        values = cache.get_many([self._version_key, self._key(key)])
+        version = values.get(self._version_key)
+        if version is None:
+            # Без версии нельзя отличить свежую запись от устаревшей
+            return self._version(), _MISSING
+        entry = values.get(self._key(key))
+        if entry is not None and entry[0] == version:
+            return version, entry[1]
+        return version, _MISSING
+
+    def get(self, key, default=None):
+        _, value = self._read(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, version=_MISSING):
+        if version is _MISSING:
+            version = self._version()
+        if version is None:
+            # Кеш не хранит версию (dummy) - запись все равно не прочитается
+            return
+        cache.set(self._key(key), (version, value), self.timeout)
+
+    def invalidate(self):
+        """Сделать устаревшими все записи пространства во всех процессах"""
+        # Случайная версия: если ключ версии вытеснят, старые записи не оживут
+        try:
+            cache.set(self._version_key, uuid.uuid4().hex, None)
+        except Exception as e:
+            logger.error(f"Не удалось сбросить кеш {self.name}: {e}")
+
+    async def get_or_set(self, key, compute):
+        """Значение из кеша или await compute(), вычисленное один раз на все воркеры"""
+        try:
+            version, value = await _run(self._read, key)
+        except Exception as e:
+            # Недоступный кеш не должен останавливать бота
+            logger.error(f"Кеш недоступен, {self._key(key)} вычисляется без него: {e}")
+            REQUESTS.inc(namespace=self.name, result='error')
+            return await compute()
+        if value is not _MISSING:
+            REQUESTS.inc(namespace=self.name, result='hit')
+            return value
+
+        lock_key = f'{self._key(key)}:lock'
+        if await _run(cache.add, lock_key, 1, LOCK_TIMEOUT):
+            try:
+                return await self._compute(key, version, compute)
+            finally:
+                await _run(cache.delete, lock_key)
+
+        # Значение вычисляет другой обработчик - ждём его результат
+        deadline = time.monotonic() + settings.BOT_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            version, value = await _run(self._read, key)
+            if value is not _MISSING:
+                REQUESTS.inc(namespace=self.name, result='wait')
+                return value
+        logger.warning(f"Не дождались вычисления {self._key(key)} другим воркером")
+        return await self._compute(key, version, compute)
+
+    def cached(self, name):
+        """Декоратор асинхронной функции: результат кешируется по имени и аргументам"""
+        def decorator(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                parts = [name, *map(str, args), *(f'{k}={v}' for k, v in sorted(kwargs.items()))]
+                return await self.get_or_set(':'.join(parts), lambda: func(*args, **kwargs))
+            return wrapper
+        return decorator
+
+    async def _compute(self, key, version, compute):
+        REQUESTS.inc(namespace=self.name, result='miss')
+        started = time.perf_counter()
+        value = await compute()
+        COMPUTE_SECONDS.observe(time.perf_counter() - started, namespace=self.name)
+        # Версия на момент чтения: если кеш успели сбросить, запись сразу устареет
+        try:
+            await _run(self.set, key, value, version)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить {self._key(key)} в кеш: {e}")
+        return value
+
+# Одобренные активные товары; сбрасывается при изменении товаров
+CATALOG = Namespace('catalog', 'BOT_CACHE_CATALOG_TIMEOUT')
+
+# Статистика и рейтинг продавцов; только истекают по времени
+STATS = Namespace('stats', 'BOT_CACHE_STATS_TIMEOUT')
@@ -0,0 +1,31 @@
+"""
+Проверка настроек бота при запуске (manage.py check, migrate, run_bot)
+
+Ошибки в ставках комиссии и порогах уровней находятся до первой сделки,
+а не исключением ValueError при её создании или завершении.
+"""
+
+from django.core.checks import Error, register
+
+@register()
+def check_fee_schedule(app_configs, **kwargs):
+    """TRANSACTION_FEE_PERCENT и TRANSACTION_FEE_SCHEDULE"""
+    from .settlement import fee_schedule
+
+    try:
+        fee_schedule()
+    except ValueError as e:
+        return [Error(str(e), hint="Проценты от 0 до 100 для уровней BRONZE, SILVER, GOLD, PLATINUM",
+                      id='bot.E001')]
+    return []
+
+@register()
+def check_level_thresholds(app_configs, **kwargs):
+    """MERCHANT_LEVEL_THRESHOLDS"""
+    from .levels import level_thresholds
+
+    try:
+        level_thresholds()
+    except ValueError as e:
+        return [Error(str(e), hint='Например: {"SILVER": 2000, "GOLD": 5000, "PLATINUM": 10000}', id='bot.E002')]
+    return []
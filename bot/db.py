@@ -0,0 +1,288 @@
+"""
+Доступ к базе данных из асинхронных обработчиков бота
+
+Все ORM-функции бота вызываются через db_sync_to_async: вызов выполняется
+в отдельном пуле потоков (независимые запросы идут параллельно, а не по
+очереди в одном потоке thread_sensitive), занимает слот в ограниченном пуле
+соединений и перед запросами проверяет соединение (CONN_HEALTH_CHECKS и
+CONN_MAX_AGE). Время ожидания в очереди, слота и открытия соединения
+попадает в статистику.
+
+BOT_ORM_TIMEOUT ограничивает только ожидание свободного потока: начатый
+вызов поток не прервать, поэтому время самих запросов ограничивает база
+(statement_timeout PostgreSQL из BOT_DB_STATEMENT_TIMEOUT на соединениях
+пула).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import instrumentation, metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_WAIT_SECONDS = metrics.histogram(
+    'bot_db_pool_wait_seconds', 'Ожидание слота пула соединений')
+POOL_TIMEOUTS = metrics.counter(
+    'bot_db_pool_timeouts_total', 'Не дождались слота пула соединений')
+POOL_CONNECTIONS = metrics.gauge(
+    'bot_db_pool_connections', 'Слоты пула соединений по состоянию', ['state'])
+ORM_QUEUE_WAIT_SECONDS = metrics.histogram(
+    'bot_orm_queue_wait_seconds', 'Ожидание свободного потока ORM')
+ORM_TIMEOUTS = metrics.counter(
+    'bot_orm_timeouts_total', 'ORM-вызовы, не дождавшиеся потока за BOT_ORM_TIMEOUT')
+ORM_QUEUE = metrics.gauge(
+    'bot_orm_queue', 'ORM-вызовы в пуле потоков по состоянию', ['state'])
+
+class ConnectionPoolTimeout(Exception):
+    """Не удалось дождаться свободного соединения с базой"""
+
+class ORMTimeout(Exception):
+    """ORM-вызов не дождался свободного потока за BOT_ORM_TIMEOUT"""
+
+class ConnectionPool:
+    """Ограничение числа соединений, одновременно занятых обработчиками бота"""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        self.in_use = 0
+        self.waiting = 0
+        self.acquired_total = 0
+        self.timeouts_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.opened_total = 0
+        self.open_seconds_total = 0.0
+
+    @contextmanager
+    def connection(self, alias='default'):
+        """Занять слот пула и подготовить соединение на время вызова"""
+        started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.perf_counter() - started
+
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timeouts_total += 1
+                POOL_TIMEOUTS.inc()
+            else:
+                self.in_use += 1
+                self.acquired_total += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if acquired:
+            POOL_WAIT_SECONDS.observe(waited)
+
+        if not acquired:
+            raise ConnectionPoolTimeout(f"Нет свободного соединения с БД за {self.timeout} с")
+        if waited > settings.BOT_DB_POOL_WAIT_WARNING:
+            logger.warning(f"Ожидание соединения с БД: {waited:.3f} с (занято {self.in_use}/{self.size})")
+
+        try:
+            self._prepare(connections[alias])
+            yield
+        finally:
+            _close_old_connections()
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def _prepare(self, connection):
+        """Закрыть устаревшее соединение и открыть новое с замером времени"""
+        _close_old_connections()
+        if connection.connection is None:
+            started = time.perf_counter()
+            connection.ensure_connection()
+            _set_statement_timeout(connection)
+            with self._lock:
+                self.opened_total += 1
+                self.open_seconds_total += time.perf_counter() - started
+
+    def snapshot(self):
+        """Текущее состояние пула для метрик"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'acquired_total': self.acquired_total,
+                'timeouts_total': self.timeouts_total,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_max': self.wait_seconds_max,
+                'opened_total': self.opened_total,
+                'open_seconds_total': self.open_seconds_total,
+            }
+
+def _close_old_connections():
+    """close_old_connections, не трогающий соединения внутри atomic-блока"""
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+def _set_statement_timeout(connection):
+    """Ограничить время запросов на новом соединении (только PostgreSQL)"""
+    timeout = settings.BOT_DB_STATEMENT_TIMEOUT
+    if timeout and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT set_config(%s, %s, false)', ['statement_timeout', f'{int(timeout * 1000)}ms'])
+
+class ORMExecutor:
+    """Пул потоков для ORM-вызовов бота с метриками очереди"""
+
+    def __init__(self, workers, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bot-orm')
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.running = 0
+        self.submitted_total = 0
+        self.completed_total = 0
+        self.timeouts_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить синхронную функцию в пуле потоков
+
+        Если за timeout секунд не освободился поток, вызов снимается с
+        очереди (ORMTimeout). Начатый вызов всегда дожидается завершения.
+        """
+        loop = asyncio.get_running_loop()
+        started_event = asyncio.Event()
+        state = {'started': False, 'abandoned': False}
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.submitted_total += 1
+
+        def job():
+            started = time.perf_counter()
+            waited = started - submitted
+            with self._lock:
+                self.queued -= 1
+                if state['abandoned']:
+                    # Вызывающий уже получил ORMTimeout - не выполнять
+                    return None
+                state['started'] = True
+                self.running += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            loop.call_soon_threadsafe(started_event.set)
+            ORM_QUEUE_WAIT_SECONDS.observe(waited)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed_total += 1
+                    self.run_seconds_total += time.perf_counter() - started
+
+        call = asyncio.ensure_future(sync_to_async(job, thread_sensitive=False, executor=self._executor)())
+        if self.timeout:
+            waiter = asyncio.ensure_future(started_event.wait())
+            try:
+                await asyncio.wait({call, waiter}, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            with self._lock:
+                if not state['started']:
+                    state['abandoned'] = True
+                    self.timeouts_total += 1
+            if state['abandoned']:
+                ORM_TIMEOUTS.inc()
+                raise ORMTimeout(
+                    f"{getattr(func, '__name__', func)} ждал свободного потока ORM дольше {self.timeout} с"
+                )
+        return await call
+
+    def snapshot(self):
+        """Текущее состояние пула потоков для метрик"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queued': self.queued,
+                'running': self.running,
+                'submitted_total': self.submitted_total,
+                'completed_total': self.completed_total,
+                'timeouts_total': self.timeouts_total,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_max': self.wait_seconds_max,
+                'run_seconds_total': self.run_seconds_total,
+            }
+
+_pool = None
+_executor = None
+_init_lock = threading.Lock()
+
+def get_pool():
+    """Пул соединений бота (создается при первом обращении)"""
+    global _pool
+    if _pool is None:
+        with _init_lock:
+            if _pool is None:
+                _pool = ConnectionPool(settings.BOT_DB_POOL_SIZE, settings.BOT_DB_POOL_TIMEOUT)
+    return _pool
+
+def get_executor():
+    """Пул потоков для ORM или None, если включен режим одного потока"""
+    global _executor
+    if _executor is None and settings.BOT_ORM_WORKERS:
+        with _init_lock:
+            if _executor is None:
+                _executor = ORMExecutor(settings.BOT_ORM_WORKERS, settings.BOT_ORM_TIMEOUT)
+    return _executor
+
+def _collect_metrics():
+    """Текущее состояние пулов для /metrics"""
+    if _pool is not None:
+        snapshot = _pool.snapshot()
+        POOL_CONNECTIONS.set(snapshot['size'], state='size')
+        POOL_CONNECTIONS.set(snapshot['in_use'], state='in_use')
+        POOL_CONNECTIONS.set(snapshot['waiting'], state='waiting')
+    if _executor is not None:
+        snapshot = _executor.snapshot()
+        ORM_QUEUE.set(snapshot['workers'], state='workers')
+        ORM_QUEUE.set(snapshot['queued'], state='queued')
+        ORM_QUEUE.set(snapshot['running'], state='running')
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+def db_sync_to_async(func):
+    """sync_to_async для ORM-функций бота: пул потоков и пул соединений"""
+    def run_with_connection(*args, **kwargs):
+        with get_pool().connection(), instrumentation.count_queries():
+            return func(*args, **kwargs)
+
+    # BOT_ORM_WORKERS=0 - прежнее поведение, все запросы в одном потоке
+    serial = sync_to_async(run_with_connection)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        executor = get_executor()
+        started = time.perf_counter()
+        try:
+            if executor is None:
+                return await serial(*args, **kwargs)
+            return await executor.run(run_with_connection, *args, **kwargs)
+        finally:
+            instrumentation.record_db_call(func.__name__, time.perf_counter() - started)
+    return wrapper
@@ -0,0 +1,206 @@
+"""
+Отсев повторных обновлений Telegram по update_id
+
+Telegram повторяет доставку, если webhook ответил ошибкой или не успел
+ответить. update_id достается из сырого тела запроса регулярным выражением,
+без разбора JSON, поэтому повтор отбрасывается за микросекунды.
+
+Сначала проверяется окно последних update_id процесса (UpdateRing), затем -
+общее для всех воркеров хранилище (BOT_UPDATE_DEDUP_BACKEND):
+
+- memory - только окно процесса;
+- db - таблица ProcessedUpdate, записи старше BOT_UPDATE_DEDUP_TTL удаляются;
+  стоит один INSERT на каждое обновление;
+- cache - Django cache (cache.add), только Redis или memcached: у них add
+  атомарен между процессами, у файлового и локального кеша - нет.
+
+update_id занимается до process_update и освобождается, если обработка
+упала, чтобы повторная доставка Telegram обработалась.
+"""
+
+import logging
+import re
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DUPLICATES = metrics.counter(
+    'bot_update_duplicates_total', 'Отброшенные повторные обновления по месту обнаружения', ['store'])
+
+# Ключ "update_id" не может встретиться внутри строк: кавычки в них экранированы
+UPDATE_ID_RE = re.compile(rb'"update_id"\s*:\s*(\d+)')
+
+# Удалять устаревшие записи ProcessedUpdate раз в столько занятых update_id
+DB_CLEANUP_EVERY = 1000
+
+CACHE_KEY_PREFIX = 'bot:update:'
+
+# Бэкенды Django cache с атомарным add между процессами
+ATOMIC_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+def extract_update_id(body):
+    """update_id из сырого тела запроса или None"""
+    match = UPDATE_ID_RE.search(body)
+    return int(match.group(1)) if match else None
+
+class UpdateRing:
+    """Последние update_id процесса (ограниченное окно)"""
+
+    name = 'memory'
+
+    def __init__(self, size):
+        self._order = deque(maxlen=size)
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def claim(self, update_id):
+        """Занять update_id; False, если он уже обрабатывался"""
+        with self._lock:
+            if update_id in self._seen:
+                return False
+            if len(self._order) == self._order.maxlen:
+                self._seen.discard(self._order[0])
+            self._order.append(update_id)
+            self._seen.add(update_id)
+            return True
+
+    def release(self, update_id):
+        """Освободить update_id после ошибки, чтобы повтор Telegram обработался"""
+        with self._lock:
+            self._seen.discard(update_id)
+
+class DatabaseStore:
+    """update_id в таблице ProcessedUpdate (первичный ключ не даст занять дважды)"""
+
+    name = 'db'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._claims = 0
+        self._lock = threading.Lock()
+
+    def claim(self, update_id):
+        from .models import ProcessedUpdate
+
+        try:
+            # В autocommit INSERT - один запрос; savepoint нужен только внутри транзакции
+            if transaction.get_connection().in_atomic_block:
+                with transaction.atomic():
+                    ProcessedUpdate.objects.create(update_id=update_id)
+            else:
+                ProcessedUpdate.objects.create(update_id=update_id)
+        except IntegrityError:
+            return False
+
+        with self._lock:
+            self._claims += 1
+            cleanup = self._claims % DB_CLEANUP_EVERY == 0
+        if cleanup:
+            self.cleanup()
+        return True
+
+    def release(self, update_id):
+        from .models import ProcessedUpdate
+
+        ProcessedUpdate.objects.filter(update_id=update_id).delete()
+
+    def cleanup(self):
+        """Удалить записи старше TTL: Telegram не повторяет доставку так долго"""
+        from .models import ProcessedUpdate
+
+        deleted, _ = ProcessedUpdate.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=self.ttl)
+        ).delete()
+        if deleted:
+            logger.info(f"Удалено устаревших записей об обновлениях: {deleted}")
+
+class CacheStore:
+    """update_id в Django cache
+
+    Занятие - cache.add. Он атомарен между процессами только в Redis и
+    memcached (ATOMIC_CACHE_BACKENDS): файловый кеш проверяет и пишет файл
+    без блокировки, и два воркера могут занять один update_id. get_dedup()
+    не включает это хранилище с другими бэкендами.
+    """
+
+    name = 'cache'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def claim(self, update_id):
+        return cache.add(f'{CACHE_KEY_PREFIX}{update_id}', 1, self.ttl)
+
+    def release(self, update_id):
+        cache.delete(f'{CACHE_KEY_PREFIX}{update_id}')
+
+STORES = {
+    'db': DatabaseStore,
+    'cache': CacheStore,
+}
+
+class UpdateDedup:
+    """Окно процесса + общее хранилище"""
+
+    def __init__(self, ring, store=None):
+        self.ring = ring
+        self.store = store
+
+    def claim(self, update_id):
+        """Занять update_id; False - повтор, обрабатывать не нужно"""
+        if not self.ring.claim(update_id):
+            DUPLICATES.inc(store=self.ring.name)
+            return False
+        if self.store is None:
+            return True
+
+        try:
+            claimed = self.store.claim(update_id)
+        except Exception as e:
+            # Недоступное общее хранилище не должно останавливать бота
+            logger.error(f"Не удалось проверить обновление {update_id} в хранилище {self.store.name}: {e}")
+            return True
+        if not claimed:
+            DUPLICATES.inc(store=self.store.name)
+        return claimed
+
+    def release(self, update_id):
+        """Освободить update_id после ошибки обработки"""
+        self.ring.release(update_id)
+        if self.store is not None:
+            try:
+                self.store.release(update_id)
+            except Exception as e:
+                logger.error(f"Не удалось освободить обновление {update_id}: {e}")
+
+_dedup = None
+
+def get_dedup():
+    """Отсев повторов процесса, настроенный из settings"""
+    global _dedup
+    if _dedup is None:
+        backend = settings.BOT_UPDATE_DEDUP_BACKEND
+        store_class = STORES.get(backend)
+        if store_class is None and backend != 'memory':
+            raise ValueError(f"Неизвестный BOT_UPDATE_DEDUP_BACKEND: {backend}")
+        if store_class is CacheStore and settings.CACHES['default']['BACKEND'] not in ATOMIC_CACHE_BACKENDS:
+            raise ValueError(
+                "BOT_UPDATE_DEDUP_BACKEND=cache требует Redis или memcached в CACHES['default'] "
+                "(CACHE_BACKEND=redis): с другими кешами повтор может обработаться дважды"
+            )
+        store = store_class(settings.BOT_UPDATE_DEDUP_TTL) if store_class else None
+        _dedup = UpdateDedup(UpdateRing(settings.BOT_UPDATE_DEDUP_SIZE), store)
+    return _dedup
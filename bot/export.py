@@ -0,0 +1,137 @@
+"""
+Выгрузка транзакций в CSV и JSONL для бухгалтерии
+
+Строки читаются курсором (QuerySet.iterator с BOT_EXPORT_CHUNK_SIZE строк
+за раз; на PostgreSQL - серверный курсор) через values_list с полями
+покупателя, продавца и товара из JOIN, без создания моделей, и сразу
+пишутся в поток. Память не зависит от числа строк. Сначала выгружается
+архив (ArchivedTransaction), затем основная таблица, в каждой - по дате
+создания; у архивных строк archived = true.
+
+Используется командой manage.py export_transactions и командой бота
+/export (для администраторов).
+"""
+
+import csv
+import io
+import json
+import logging
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from exchange.db_router import replica_reads
+
+from .models import ArchivedTransaction, Transaction
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+
+# Предел размера файла, который бот может отправить через Bot API
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+# Колонка выгрузки -> поле для values_list
+COLUMNS = (
+    ('transaction_id', 'transaction_id'),
+    ('status', 'status'),
+    ('amount', 'amount'),
+    ('fee_amount', 'fee_amount'),
+    ('merchant_amount', 'merchant_amount'),
+    ('created_at', 'created_at'),
+    ('payment_confirmed_at', 'payment_confirmed_at'),
+    ('item_delivered_at', 'item_delivered_at'),
+    ('completed_at', 'completed_at'),
+    ('item_id', 'item_id'),
+    ('item_title', 'item__title'),
+    ('item_category', 'item__category'),
+    ('client_telegram_id', 'client__telegram_id'),
+    ('client_username', 'client__username'),
+    ('merchant_telegram_id', 'merchant__telegram_id'),
+    ('merchant_username', 'merchant__username'),
+)
+HEADER = [name for name, _ in COLUMNS] + ['archived']
+
+def parse_date(value):
+    """Дата из строки YYYY-MM-DD"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def filter_transactions(queryset, date_from=None, date_to=None, merchant_id=None):
+    """Фильтры выгрузки: даты создания включительно и продавец (telegram_id)"""
+    # Границы дня - сравнение самой колонки created_at, без приведения к дате в SQL
+    if date_from is not None:
+        queryset = queryset.filter(created_at__gte=_day_start(date_from))
+    if date_to is not None:
+        queryset = queryset.filter(created_at__lt=_day_start(date_to + timedelta(days=1)))
+    if merchant_id is not None:
+        queryset = queryset.filter(merchant__telegram_id=merchant_id)
+    return queryset
+
+def iter_rows(date_from=None, date_to=None, merchant_id=None, chunk_size=None):
+    """Строки выгрузки (кортежи в порядке HEADER)"""
+    chunk_size = chunk_size or settings.BOT_EXPORT_CHUNK_SIZE
+    fields = [field for _, field in COLUMNS]
+    for model, archived in ((ArchivedTransaction, True), (Transaction, False)):
+        queryset = filter_transactions(model.objects.all(), date_from, date_to, merchant_id)
+        rows = queryset.order_by('created_at', 'id').values_list(*fields)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield row + (archived,)
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    # Decimal - строкой, чтобы не терять точность
+    return str(value)
+
+def write_csv(rows, stream):
+    writer = csv.writer(stream)
+    writer.writerow(HEADER)
+    count = 0
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        count += 1
+    return count
+
+def write_jsonl(rows, stream):
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(dict(zip(HEADER, map(_plain, row))), ensure_ascii=False))
+        stream.write('\n')
+        count += 1
+    return count
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+def export_transactions(stream, fmt='csv', date_from=None, date_to=None, merchant_id=None, chunk_size=None):
+    """Выгрузить транзакции в текстовый поток, вернуть число строк"""
+    # Выгрузка только читает и может идти долго - на реплику, если она есть
+    with replica_reads():
+        count = WRITERS[fmt](iter_rows(date_from, date_to, merchant_id, chunk_size), stream)
+    logger.info(f"Выгружено транзакций ({fmt}): {count}")
+    return count
+
+def export_to_file(fmt='csv', date_from=None, date_to=None, merchant_id=None):
+    """Выгрузить транзакции во временный файл на диске
+
+    Возвращает (файл, открытый на чтение с начала, число строк, размер в байтах).
+    """
+    file = tempfile.TemporaryFile()
+    stream = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    try:
+        count = export_transactions(stream, fmt, date_from, date_to, merchant_id)
+        stream.flush()
+    except Exception:
+        stream.close()
+        raise
+    # Файл остается открытым после отсоединения текстовой обертки
+    stream.detach()
+    size = file.tell()
+    file.seek(0)
+    return file, count, size
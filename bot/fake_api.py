@@ -0,0 +1,190 @@
+"""
+Фейковый Telegram Bot API для работы без сети
+
+Включается настройкой TELEGRAM_FAKE_API=True: приложение из
+bot.application.create_application() (webhook, run_bot, шарды и команда
+setup_webhook) отправляет запросы не на api.telegram.org, а в FakeBotAPI
+внутри процесса. Каждый вызов записывается, поэтому бенчмарки и
+тесты могут проверить, сколько запросов к Bot API вызвало действие
+пользователя. Задержка ответа, доля ошибок и доля ответов 429 (RetryAfter)
+задаются настройками TELEGRAM_FAKE_API_*.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from telegram.request import BaseRequest
+
+BOT_USER = {
+    'id': 100000,
+    'is_bot': True,
+    'first_name': 'Minecraft Marketplace',
+    'username': 'fake_marketplace_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False,
+}
+
+# Методы, которые возвращают отправленное сообщение
+MESSAGE_METHODS = ('sendMessage', 'editMessageText', 'sendDocument', 'sendPhoto')
+
+# Методы без внедрения ошибок: иначе не стартует сам бот
+STABLE_METHODS = ('getMe', 'getUpdates')
+
+class FakeBotAPI:
+    """Состояние фейкового Bot API: записанные вызовы, очередь обновлений, отказы"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, retry_after_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+
+        self.calls = []
+        self.webhook_url = ''
+        self.webhook_secret_token = None
+        self.files = {}
+
+        self._updates = deque()
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Очистить записанные вызовы и очередь обновлений"""
+        with self._lock:
+            self.calls.clear()
+            self._updates.clear()
+
+    def count(self, method=None):
+        """Количество вызовов (всех или одного метода)"""
+        with self._lock:
+            if method is None:
+                return len(self.calls)
+            return sum(1 for name, _ in self.calls if name == method)
+
+    def counts(self):
+        """Количество вызовов по методам"""
+        with self._lock:
+            return Counter(name for name, _ in self.calls)
+
+    def push_update(self, update):
+        """Поставить обновление в очередь для getUpdates (режим polling)"""
+        with self._lock:
+            self._updates.append(update)
+
+    def add_file(self, file_id, content):
+        """Зарегистрировать файл для getFile и скачивания"""
+        self.files[file_id] = content
+
+    def handle(self, method, params):
+        """Ответ на вызов метода: (HTTP-статус, JSON-ответ)"""
+        with self._lock:
+            self.calls.append((method, params))
+
+        if method not in STABLE_METHODS:
+            roll = self._random.random()
+            if roll < self.retry_after_rate:
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {self.retry_after}',
+                    'parameters': {'retry_after': self.retry_after},
+                }
+            if roll < self.retry_after_rate + self.error_rate:
+                return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+
+        return 200, {'ok': True, 'result': self._result(method, params)}
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_USER
+        if method in MESSAGE_METHODS:
+            return {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': params.get('chat_id', 0), 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        if method == 'getUpdates':
+            return self._pop_updates(params.get('offset'), params.get('limit') or 100)
+        if method == 'getFile':
+            file_id = params.get('file_id')
+            return {'file_id': file_id, 'file_unique_id': file_id, 'file_path': f'fake/{file_id}'}
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url', '')
+            self.webhook_secret_token = params.get('secret_token')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = ''
+            return True
+        if method == 'getWebhookInfo':
+            return {
+                'url': self.webhook_url,
+                'has_custom_certificate': False,
+                'pending_update_count': len(self._updates),
+            }
+        return True
+
+    def _pop_updates(self, offset, limit):
+        with self._lock:
+            while offset and self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            return [self._updates.popleft() for _ in range(min(limit, len(self._updates)))]
+
+class FakeRequest(BaseRequest):
+    """Транспорт python-telegram-bot, отвечающий из FakeBotAPI"""
+
+    def __init__(self, api):
+        self.api = api
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, **kwargs):
+        if self.api.latency:
+            await asyncio.sleep(self.api.latency)
+
+        # Скачивание файла: .../file/bot<token>/fake/<file_id>
+        if method == 'GET':
+            file_id = url.rsplit('/', 1)[-1]
+            if file_id not in self.api.files:
+                return 404, json.dumps({'ok': False, 'error_code': 404, 'description': 'Not Found'}).encode()
+            return 200, self.api.files[file_id]
+
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        status, payload = self.api.handle(api_method, params)
+
+        # Long polling: пустой ответ getUpdates приходит не сразу
+        if api_method == 'getUpdates' and not payload['result']:
+            await asyncio.sleep(min(params.get('timeout') or 0, 1))
+        return status, json.dumps(payload).encode()
+
+_fake_api = None
+
+def get_fake_api():
+    """Общий экземпляр фейкового Bot API, настроенный из settings"""
+    global _fake_api
+    if _fake_api is None:
+        _fake_api = FakeBotAPI(
+            latency=settings.TELEGRAM_FAKE_API_LATENCY,
+            error_rate=settings.TELEGRAM_FAKE_API_ERROR_RATE,
+            retry_after_rate=settings.TELEGRAM_FAKE_API_RETRY_AFTER_RATE,
+            retry_after=settings.TELEGRAM_FAKE_API_RETRY_AFTER,
+        )
+    return _fake_api
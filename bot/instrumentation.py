@@ -0,0 +1,267 @@
+"""
+Инструментирование обработчиков бота
+
+Для каждого обновления Telegram собирается статистика: общее время, время
+ORM-вызовов (db_sync_to_async), количество SQL-запросов и вызовов Bot API.
+Итоги попадают в гистограммы по типу обновления (bot_update_*), по
+обработчику (bot_handler_*) и по ORM-функции (bot_db_call_seconds), см.
+bot/metrics.py. Обработчики оборачиваются декоратором @instrumented; при
+вложенных вызовах (handle_callback -> payment_confirmed) учитываются оба.
+Медленные запросы, N+1 и бюджеты запросов проверяет bot/querylog.py.
+
+Подключение:
+    builder = instrumentation.apply_to_builder(Application.builder().token(...))
+    ...
+    instrumentation.instrument_handlers(application)  # обработчики без декоратора
+"""
+
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from telegram.constants import UpdateType
+from telegram.ext import Application, ApplicationHandlerStop, ConversationHandler
+from telegram.request import BaseRequest, HTTPXRequest
+
+from . import fake_api, metrics, profiling, querylog
+
+logger = logging.getLogger(__name__)
+
+UPDATE_SECONDS = metrics.histogram(
+    'bot_update_seconds', 'Время обработки обновления', ['update_type'])
+UPDATE_DB_SECONDS = metrics.histogram(
+    'bot_update_db_seconds', 'Время ORM-вызовов за обновление', ['update_type'])
+UPDATE_SQL_QUERIES = metrics.histogram(
+    'bot_update_sql_queries', 'SQL-запросов за обновление', ['update_type'], buckets=metrics.COUNT_BUCKETS)
+UPDATE_API_CALLS = metrics.histogram(
+    'bot_update_api_calls', 'Вызовов Bot API за обновление', ['update_type'], buckets=metrics.COUNT_BUCKETS)
+
+HANDLER_SECONDS = metrics.histogram(
+    'bot_handler_seconds', 'Время выполнения обработчика', ['handler'])
+HANDLER_DB_SECONDS = metrics.histogram(
+    'bot_handler_db_seconds', 'Время ORM-вызовов в обработчике', ['handler'])
+HANDLER_SQL_QUERIES = metrics.histogram(
+    'bot_handler_sql_queries', 'SQL-запросов в обработчике', ['handler'], buckets=metrics.COUNT_BUCKETS)
+HANDLER_API_CALLS = metrics.histogram(
+    'bot_handler_api_calls', 'Вызовов Bot API в обработчике', ['handler'], buckets=metrics.COUNT_BUCKETS)
+HANDLER_ERRORS = metrics.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ['handler'])
+
+DB_CALL_SECONDS = metrics.histogram(
+    'bot_db_call_seconds', 'Время ORM-функции бота, включая ожидание пула', ['function'])
+
+API_REQUESTS = metrics.counter(
+    'bot_api_requests_total', 'Запросы к Bot API по методу и HTTP-статусу', ['method', 'status'])
+
+_current = ContextVar('update_stats', default=None)
+_handler = ContextVar('handler', default=None)
+
+class UpdateStats:
+    """Статистика одного обновления"""
+
+    __slots__ = ('db_seconds', 'db_calls', 'sql_queries', 'api_calls', 'queries', 'violations', '_lock')
+
+    def __init__(self, record_queries=False):
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.sql_queries = 0
+        self.api_calls = 0
+        # Записи (обработчик, SQL, секунды) при BOT_SQL_LOG, см. bot/querylog.py
+        self.queries = [] if record_queries else None
+        self.violations = []
+        # SQL-запросы одного обновления могут идти из нескольких потоков
+        self._lock = threading.Lock()
+
+    def add(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def add_query(self, handler, sql, seconds):
+        with self._lock:
+            self.sql_queries += 1
+            if self.queries is not None:
+                self.queries.append((handler, sql, seconds))
+
+    def copy(self):
+        stats = UpdateStats()
+        stats.db_seconds = self.db_seconds
+        stats.db_calls = self.db_calls
+        stats.sql_queries = self.sql_queries
+        stats.api_calls = self.api_calls
+        return stats
+
+def current_stats():
+    """Статистика обновления, которое обрабатывается сейчас (или None)"""
+    return _current.get()
+
+def record_db_call(name, seconds):
+    """Учесть ORM-вызов (вызывается из db_sync_to_async)"""
+    DB_CALL_SECONDS.observe(seconds, function=name)
+    stats = _current.get()
+    if stats is not None:
+        stats.add('db_seconds', seconds)
+        stats.add('db_calls')
+
+@contextmanager
+def count_queries():
+    """Считать SQL-запросы текущего обновления во всех базах"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            handler = _handler.get()
+            stats.add_query(handler, sql, seconds)
+            if seconds * 1000 > settings.BOT_SQL_SLOW_MS:
+                querylog.record_slow_query(handler, sql, seconds)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+def update_type(update):
+    """Тип обновления для меток метрик"""
+    if update.callback_query:
+        return 'callback_query'
+    if update.message:
+        return 'command' if (update.message.text or '').startswith('/') else 'message'
+    for name in UpdateType:
+        if getattr(update, name.value, None) is not None:
+            return name.value
+    return 'unknown'
+
+def instrumented(callback, name=None):
+    """Обернуть обработчик: время, ORM, SQL и вызовы Bot API по обработчику"""
+    if getattr(callback, '__instrumented__', False):
+        return callback
+    name = name or callback.__name__
+
+    @wraps(callback)
+    async def wrapper(*args, **kwargs):
+        stats = _current.get()
+        before = stats.copy() if stats is not None else None
+        token = _handler.set(name)
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+            _handler.reset(token)
+            if stats is not None:
+                queries = stats.sql_queries - before.sql_queries
+                HANDLER_DB_SECONDS.observe(stats.db_seconds - before.db_seconds, handler=name)
+                HANDLER_SQL_QUERIES.observe(queries, handler=name)
+                HANDLER_API_CALLS.observe(stats.api_calls - before.api_calls, handler=name)
+                violation = querylog.check_budget(name, queries)
+                if violation:
+                    stats.violations.append(violation)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+def _instrument_handler(handler):
+    if isinstance(handler, ConversationHandler):
+        for inner in handler.entry_points + handler.fallbacks:
+            _instrument_handler(inner)
+        for state_handlers in handler.states.values():
+            for inner in state_handlers:
+                _instrument_handler(inner)
+    else:
+        handler.callback = instrumented(handler.callback)
+
+def instrument_handlers(application):
+    """Обернуть все зарегистрированные обработчики, включая ConversationHandler"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+
+class InstrumentedApplication(Application):
+    """Application, собирающий статистику по каждому обновлению"""
+
+    async def process_update(self, update):
+        stats = UpdateStats(record_queries=settings.BOT_SQL_LOG)
+        token = _current.set(stats)
+        kind = update_type(update) if hasattr(update, 'update_id') else 'custom'
+        started = time.perf_counter()
+        try:
+            with profiling.maybe_profile(kind):
+                await super().process_update(update)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+
+            UPDATE_SECONDS.observe(elapsed, update_type=kind)
+            UPDATE_DB_SECONDS.observe(stats.db_seconds, update_type=kind)
+            UPDATE_SQL_QUERIES.observe(stats.sql_queries, update_type=kind)
+            UPDATE_API_CALLS.observe(stats.api_calls, update_type=kind)
+
+            if elapsed > settings.BOT_SLOW_UPDATE_WARNING:
+                logger.warning(
+                    f"Медленное обновление ({kind}): {elapsed:.3f} с, БД {stats.db_seconds:.3f} с "
+                    f"({stats.db_calls} вызовов, {stats.sql_queries} SQL), Bot API: {stats.api_calls}"
+                )
+            metrics.maybe_dump()
+
+        querylog.report(stats, kind)
+
+class CountingRequest(BaseRequest):
+    """Транспорт Bot API, считающий вызовы по методам и статусам ответа"""
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self):
+        await self.request.initialize()
+
+    async def shutdown(self):
+        await self.request.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1] if method == 'POST' else 'file'
+        stats = _current.get()
+        if stats is not None:
+            stats.add('api_calls')
+        try:
+            status, payload = await self.request.do_request(url, method, request_data=request_data, **kwargs)
+        except Exception:
+            API_REQUESTS.inc(method=api_method, status='error')
+            raise
+        API_REQUESTS.inc(method=api_method, status=status)
+        return status, payload
+
+def apply_to_builder(builder):
+    """Подключить инструментирование (и фейковый Bot API, если включен) к ApplicationBuilder"""
+    if settings.TELEGRAM_FAKE_API:
+        api = fake_api.get_fake_api()
+        request, get_updates_request = fake_api.FakeRequest(api), fake_api.FakeRequest(api)
+    else:
+        # Размеры пулов соединений как у ApplicationBuilder по умолчанию
+        request, get_updates_request = HTTPXRequest(connection_pool_size=256), HTTPXRequest()
+
+    return (
+        builder
+        .application_class(InstrumentedApplication)
+        .request(CountingRequest(request))
+        .get_updates_request(CountingRequest(get_updates_request))
+    )
@@ -0,0 +1,198 @@
+"""
+Массовая загрузка товаров продавца из CSV или JSON
+
+Продавец отправляет боту документ: CSV с колонками title, description,
+price, category (первая строка - заголовок), JSON Lines (по объекту на
+строку) или JSON-массив объектов с теми же полями. Строки проверяются по
+одной по мере чтения, корректные вставляются bulk_create пачками по
+BOT_IMPORT_BATCH_SIZE. Действует тот же лимит активных товаров
+(approved_items_count), что и при добавлении по одному: строки сверх лимита
+не загружаются. Товары уходят на модерацию, администраторы получают одно
+сгруппированное уведомление на загрузку.
+"""
+
+import csv
+import io
+import json
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from .models import Item, TelegramUser, UserRole
+from .moderation import send_grouped, split_message
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('title', 'description', 'price', 'category')
+
+FORMATS = ('csv', 'json', 'jsonl')
+
+# Ошибок в ответе продавцу, остальные только подсчитываются
+MAX_REPORTED_ERRORS = 10
+
+# Ограничения полей модели Item
+TITLE_MAX_LENGTH = Item._meta.get_field('title').max_length
+CATEGORY_MAX_LENGTH = Item._meta.get_field('category').max_length
+PRICE_MAX = Decimal(10) ** (Item._meta.get_field('price').max_digits - Item._meta.get_field('price').decimal_places)
+
+class ItemImportError(Exception):
+    """Документ нельзя загрузить целиком"""
+
+class ImportResult:
+    """Итог загрузки: созданные товары, ошибки строк, строки сверх лимита"""
+
+    def __init__(self):
+        self.created = []
+        self.errors = []
+        self.invalid = 0
+        self.over_limit = 0
+
+    def add_error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Строка {line}: {message}")
+
+def format_for(file_name):
+    """Формат по расширению файла или None"""
+    extension = (file_name or '').rsplit('.', 1)[-1].lower()
+    return extension if extension in FORMATS else None
+
+def iter_records(stream, fmt):
+    """(номер строки, запись) из бинарного потока документа"""
+    # utf-8-sig: Excel сохраняет CSV с BOM
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = set(FIELDS) - set(reader.fieldnames or ())
+        if missing:
+            raise ItemImportError(f"В заголовке CSV нет колонок: {', '.join(sorted(missing))}")
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    if first == '[':
+        # JSON-массив читается целиком: размер документа ограничен BOT_IMPORT_MAX_FILE_SIZE
+        try:
+            records = json.loads(first + text.read())
+        except ValueError as e:
+            raise ItemImportError(f"Некорректный JSON: {e}")
+        for number, record in enumerate(records, 1):
+            yield number, record
+        return
+
+    # JSON Lines: по объекту на строку
+    for number, line in enumerate(text, 1):
+        if number == 1:
+            line = first + line
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+def validate(record):
+    """Поля товара из записи или текст ошибки"""
+    if not isinstance(record, dict):
+        return None, "не объект с полями товара"
+
+    fields = {field: str(record.get(field) or '').strip() for field in FIELDS}
+    empty = [field for field in FIELDS if not fields[field]]
+    if empty:
+        return None, f"пустые поля: {', '.join(empty)}"
+    if len(fields['title']) > TITLE_MAX_LENGTH:
+        return None, f"название длиннее {TITLE_MAX_LENGTH} символов"
+    if len(fields['category']) > CATEGORY_MAX_LENGTH:
+        return None, f"категория длиннее {CATEGORY_MAX_LENGTH} символов"
+
+    try:
+        price = Decimal(fields['price'].replace(',', '.'))
+    except InvalidOperation:
+        return None, f"неверная цена {fields['price']!r}"
+    if not price.is_finite() or price <= 0 or price >= PRICE_MAX:
+        return None, f"цена должна быть больше 0 и меньше {PRICE_MAX}"
+    fields['price'] = price.quantize(Decimal('0.01'))
+    return fields, None
+
+def import_items(telegram_id, stream, fmt, batch_size=None):
+    """Загрузить товары продавца из документа, вернуть ImportResult"""
+    batch_size = batch_size or settings.BOT_IMPORT_BATCH_SIZE
+    result = ImportResult()
+
+    with db_transaction.atomic():
+        # Блокировка продавца: две загрузки одновременно не превысят лимит
+        try:
+            merchant = TelegramUser.objects.select_for_update().get(
+                telegram_id=telegram_id, role=UserRole.MERCHANT
+            )
+        except TelegramUser.DoesNotExist:
+            raise ItemImportError("Продавец не найден")
+        remaining = merchant.approved_items_count - Item.objects.filter(merchant=merchant, is_active=True).count()
+
+        batch = []
+
+        def flush():
+            # Непроверенные товары не попадают в каталог - сбрасывать его кеш не нужно
+            created = Item.objects.bulk_create(batch)
+            result.created.extend({'id': item.id, 'title': item.title, 'price': item.price} for item in created)
+            batch.clear()
+
+        try:
+            for line, record in iter_records(stream, fmt):
+                fields, error = validate(record)
+                if error:
+                    result.add_error(line, error)
+                    continue
+                if remaining <= 0:
+                    result.over_limit += 1
+                    continue
+                batch.append(Item(merchant=merchant, **fields))
+                remaining -= 1
+                if len(batch) >= batch_size:
+                    flush()
+        except UnicodeDecodeError:
+            raise ItemImportError("Документ должен быть в кодировке UTF-8")
+        except csv.Error as e:
+            raise ItemImportError(f"Некорректный CSV: {e}")
+        if batch:
+            flush()
+
+    logger.info(
+        f"Загрузка товаров продавца {telegram_id}: создано {len(result.created)}, "
+        f"с ошибками {result.invalid}, сверх лимита {result.over_limit}"
+    )
+    return result
+
+def format_import_report(result, limit):
+    """Ответ продавцу об итогах загрузки"""
+    text = f"✅ Загружено товаров: {len(result.created)}. Они отправлены на модерацию."
+    if result.over_limit:
+        text += f"\n\n⚠️ Не загружено сверх лимита активных товаров ({limit} шт.): {result.over_limit}"
+    if result.invalid:
+        text += f"\n\n❌ Строк с ошибками: {result.invalid}\n" + "\n".join(result.errors)
+        if result.invalid > len(result.errors):
+            text += f"\n... и еще {result.invalid - len(result.errors)}"
+    return text
+
+def format_admin_notification(items, username):
+    """Одно уведомление администратору о загруженных товарах"""
+    header = (
+        f"🔔 **Новые товары на модерацию: {len(items)}**\n"
+        f"👤 Продавец: @{username or 'Анонимный'}\n"
+        "Одобрить или отклонить: меню \"✅ Одобрить товары\"\n\n"
+    )
+    return split_message(header, [f"📦 {item['title']} - {item['price']} руб. (ID {item['id']})" for item in items])
+
+async def notify_admins(bot, admin_ids, items, username):
+    """Уведомить администраторов о загрузке одним сообщением на каждого"""
+    if not items:
+        return 0
+    return await send_grouped(
+        bot, {admin_id: items for admin_id in admin_ids},
+        lambda rows: format_admin_notification(rows, username)
+    )
@@ -0,0 +1,92 @@
+"""
+Уровни продавцов по опыту
+
+Порог опыта для каждого уровня выше бронзы задает
+MERCHANT_LEVEL_THRESHOLDS. Уровень считает сама база выражением CASE по
+experience_points:
+
+- при завершении сделки - в том же UPDATE, что начисляет опыт и
+  статистику продавца (record_sale): одна запись строки продавца,
+  уровень меняется, только когда опыт переходит порог;
+- после смены порогов - одним UPDATE по всем продавцам командой
+  manage.py recompute_merchant_levels.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+
+from .models import MerchantLevel, TelegramUser, UserRole
+
+logger = logging.getLogger(__name__)
+
+# Опыт за каждую завершенную продажу
+SALE_XP = 100
+
+def level_thresholds():
+    """[(порог опыта, уровень)] от старшего уровня к бронзе"""
+    thresholds = {MerchantLevel.BRONZE: 0}
+    for level, xp in settings.MERCHANT_LEVEL_THRESHOLDS.items():
+        if level not in MerchantLevel.values or level == MerchantLevel.BRONZE:
+            raise ValueError(f"Неизвестный уровень продавца в MERCHANT_LEVEL_THRESHOLDS: {level}")
+        if not isinstance(xp, int) or xp <= 0:
+            raise ValueError(f"Порог опыта в MERCHANT_LEVEL_THRESHOLDS должен быть целым больше 0: {level}={xp!r}")
+        thresholds[level] = xp
+
+    # Уровни идут в порядке MerchantLevel, пороги должны расти вместе с ними
+    ordered = [(thresholds[level], level) for level in MerchantLevel.values if level in thresholds]
+    if ordered != sorted(ordered):
+        raise ValueError(f"Пороги MERCHANT_LEVEL_THRESHOLDS должны расти с уровнем: {settings.MERCHANT_LEVEL_THRESHOLDS}")
+    return ordered[::-1]
+
+def level_for(experience_points):
+    """Уровень продавца для опыта"""
+    for threshold, level in level_thresholds():
+        if experience_points >= threshold:
+            return level
+    return MerchantLevel.BRONZE
+
+def level_expression(experience_points=None):
+    """Уровень продавца как SQL-выражение CASE по опыту (по умолчанию - текущему)"""
+    if experience_points is None:
+        experience_points = F('experience_points')
+    return Case(
+        # Уровень есть только у продавцов, у остальных не меняется
+        When(~Q(role=UserRole.MERCHANT), then=F('merchant_level')),
+        *(When(GreaterThanOrEqual(experience_points, threshold), then=Value(level))
+          for threshold, level in level_thresholds()),
+        default=Value(MerchantLevel.BRONZE),
+    )
+
+def record_sale(merchant_id, amount):
+    """Начислить продавцу продажу, опыт и новый уровень одним UPDATE
+
+    Вызывается внутри транзакции базы, завершающей сделку. В SET все
+    выражения видят значения строки до обновления, поэтому уровень считается
+    от опыта с учетом этой продажи.
+    """
+    experience_points = F('experience_points') + SALE_XP
+    TelegramUser.objects.filter(id=merchant_id).update(
+        total_sales=F('total_sales') + amount,
+        total_transactions=F('total_transactions') + 1,
+        experience_points=experience_points,
+        merchant_level=level_expression(experience_points),
+    )
+
+def recompute_levels(dry_run=False):
+    """Пересчитать уровни всех продавцов по текущим порогам одним UPDATE
+
+    Возвращает число продавцов, у которых уровень изменился.
+    """
+    stale = TelegramUser.objects.filter(role=UserRole.MERCHANT).annotate(
+        new_level=level_expression(),
+    ).filter(
+        Q(merchant_level__isnull=True) | ~Q(merchant_level=F('new_level'))
+    )
+    if dry_run:
+        return stale.count()
+    changed = stale.update(merchant_level=level_expression())
+    logger.info(f"Уровни продавцов пересчитаны: изменено {changed}")
+    return changed
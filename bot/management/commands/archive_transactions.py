@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from bot.archive import get_archivable_transactions, archive_transactions
+
+class Command(BaseCommand):
+    help = 'Перенести завершённые и отменённые транзакции в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TRANSACTION_ARCHIVE_AFTER_DAYS,
+            help='Архивировать транзакции старше указанного количества дней',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.TRANSACTION_ARCHIVE_BATCH_SIZE,
+            help='Количество транзакций в одной пачке',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Максимальное количество пачек за один запуск',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество транзакций для архивации',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = get_archivable_transactions(options['days']).count()
+            self.stdout.write(f'Транзакций для архивации: {count}')
+            return
+        
+        self.stdout.write(f"Архивация транзакций старше {options['days']} дн...")
+        total = archive_transactions(
+            older_than_days=options['days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches']
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ Архивировано транзакций: {total}'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from bot.analytics import rebuild
+from bot.export import parse_date
+
+class Command(BaseCommand):
+    help = 'Пересчитать сводку продаж по дням из транзакций и архива'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=parse_date,
+            help='Первый день пересчета (ГГГГ-ММ-ДД), по умолчанию с начала',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=parse_date,
+            help='Последний день пересчета (ГГГГ-ММ-ДД), по умолчанию по сегодня',
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError('Дата --from позже даты --to')
+
+        self.stdout.write(f"Пересчет сводки продаж за период {date_from or 'начало'} - {date_to or 'сегодня'}...")
+        rows = rebuild(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f'✅ Строк сводки: {rows}'))
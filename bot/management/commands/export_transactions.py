@@ -0,0 +1,71 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from bot.export import FORMATS, export_transactions, parse_date
+
+def date_argument(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Дата в формате ГГГГ-ММ-ДД, получено: {value}')
+
+class Command(BaseCommand):
+    help = 'Выгрузить транзакции (вместе с архивом) в CSV или JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default='csv',
+            help='Формат выгрузки',
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=date_argument,
+            help='Транзакции, созданные с этой даты (ГГГГ-ММ-ДД, включительно)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=date_argument,
+            help='Транзакции, созданные по эту дату (ГГГГ-ММ-ДД, включительно)',
+        )
+        parser.add_argument(
+            '--merchant',
+            type=int,
+            help='Только продажи продавца с этим Telegram ID',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.BOT_EXPORT_CHUNK_SIZE,
+            help='Строк, читаемых из базы за раз',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Файл выгрузки (по умолчанию stdout)',
+        )
+
+    def handle(self, *args, **options):
+        if options['date_from'] and options['date_to'] and options['date_from'] > options['date_to']:
+            raise CommandError('Дата --from позже даты --to')
+
+        export_options = {
+            'fmt': options['format'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+            'merchant_id': options['merchant'],
+            'chunk_size': options['chunk_size'],
+        }
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                count = export_transactions(f, **export_options)
+            self.stderr.write(self.style.SUCCESS(f"✅ Выгружено транзакций: {count} в {options['output']}"))
+        else:
+            # Строки выгрузки пишутся как есть, без добавления перевода строки
+            self.stdout.ending = ''
+            count = export_transactions(self.stdout, **export_options)
+            self.stderr.write(f'Выгружено транзакций: {count}')
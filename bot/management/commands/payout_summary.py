@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from bot.analytics import period, totals
+from bot.export import parse_date
+from bot.settlement import payout_summary
+
+class Command(BaseCommand):
+    help = 'Выплаты продавцам за завершенные сделки периода'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=parse_date,
+            help='Первый день (ГГГГ-ММ-ДД), по умолчанию 30 дней назад',
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=parse_date,
+            help='Последний день (ГГГГ-ММ-ДД), по умолчанию сегодня',
+        )
+
+    def handle(self, *args, **options):
+        default_from, default_to = period(30)
+        date_from = options['date_from'] or default_from
+        date_to = options['date_to'] or default_to
+        if date_from > date_to:
+            raise CommandError('Дата --from позже даты --to')
+
+        rows = payout_summary(date_from, date_to)
+        self.stdout.write(f'Выплаты продавцам за {date_from} - {date_to}')
+        self.stdout.write(f"{'Telegram ID':>12} {'Продавец':<20} {'Уровень':<9} {'Сделок':>7} "
+                          f"{'Оборот':>12} {'Комиссия':>11} {'Выплата':>12}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['telegram_id']:>12} {(row['username'] or '-')[:20]:<20} {row['merchant_level']:<9} "
+                f"{row['transactions_count']:>7} {row['amount']:>12} {row['fee_amount']:>11} {row['merchant_amount']:>12}"
+            )
+        total = totals(rows)
+        self.stdout.write(self.style.SUCCESS(
+            f"Итого: продавцов {len(rows)}, сделок {total['transactions_count']}, оборот {total['amount']}, "
+            f"комиссия {total['fee_amount']}, к выплате {total['merchant_amount']}"
+        ))
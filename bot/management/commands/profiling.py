@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from bot import profiling
+
+class Command(BaseCommand):
+    help = 'Управление выборочным профилировщиком обновлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['on', 'off', 'status', 'dump', 'clear'],
+            help='on/off - включить/выключить во всех воркерах, dump - вывести стеки, clear - удалить профили',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Файл для dump (по умолчанию stdout)',
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+
+        if action in ('on', 'off'):
+            profiling.set_enabled(action == 'on')
+            self.stdout.write(self.style.SUCCESS(f"✅ Профилирование {'включено' if action == 'on' else 'выключено'}"))
+        elif action == 'clear':
+            profiling.clear_profiles()
+            self.stdout.write(self.style.SUCCESS('✅ Профили удалены'))
+        elif action == 'dump':
+            folded = profiling.merged_profile()
+            if options['output']:
+                with open(options['output'], 'w') as f:
+                    f.write(folded)
+                self.stdout.write(self.style.SUCCESS(f"✅ Стеки сохранены в {options['output']}"))
+            else:
+                self.stdout.write(folded, ending='')
+        else:
+            self.stdout.write(f"Включено: {'да' if profiling.is_enabled() else 'нет'}")
+            self.stdout.write(f'Доля обновлений: {settings.BOT_PROFILING_SAMPLE_RATE}')
+            self.stdout.write(f'Интервал сэмплирования: {settings.BOT_PROFILING_INTERVAL} с')
+            self.stdout.write(f'Каталог: {settings.BOT_PROFILING_DIR}')
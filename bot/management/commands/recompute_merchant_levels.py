@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from bot.levels import level_thresholds, recompute_levels
+
+class Command(BaseCommand):
+    help = 'Пересчитать уровни всех продавцов по порогам опыта MERCHANT_LEVEL_THRESHOLDS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, у скольких продавцов изменится уровень',
+        )
+
+    def handle(self, *args, **options):
+        thresholds = ', '.join(f'{level} от {xp} XP' for xp, level in reversed(level_thresholds()))
+        self.stdout.write(f'Пороги уровней: {thresholds}')
+
+        changed = recompute_levels(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f'Уровень изменится у продавцов: {changed}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Уровень изменен у продавцов: {changed}'))
@@ -1,9 +1,10 @@
 from django.core.management.base import BaseCommand
-from bot.telegram_bot import main
+from bot import polling
+from bot.application import create_application
 
 class Command(BaseCommand):
     help = 'Запуск Telegram бота'
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Запуск Telegram бота...'))
-        main()
+        polling.run(create_application(for_polling=True))
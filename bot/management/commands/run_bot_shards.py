@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from bot import sharding
+
+class Command(BaseCommand):
+    help = 'Запуск процессов-шардов, обрабатывающих обновления webhook (BOT_SHARDS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=settings.BOT_SHARDS,
+            help='Количество шардов (по умолчанию BOT_SHARDS)',
+        )
+        parser.add_argument(
+            '--shard',
+            type=int,
+            help='Запустить только один шард с этим номером',
+        )
+
+    def handle(self, *args, **options):
+        if options['shard'] is not None:
+            sharding.serve(options['shard'])
+            return
+
+        shards = options['shards']
+        if shards < 1:
+            self.stdout.write(self.style.ERROR('❌ Укажите --shards или BOT_SHARDS больше 0'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Запуск шардов: {shards}, сокеты в {settings.BOT_SHARD_SOCKET_DIR}'))
+        sharding.supervise(shards)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from bot.settlement import fee_schedule, open_transactions, settle_transactions
+
+class Command(BaseCommand):
+    help = 'Пересчитать комиссию и выплату открытых сделок по текущим ставкам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--merchant',
+            type=int,
+            help='Только сделки продавца с этим Telegram ID',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.TRANSACTION_SETTLEMENT_BATCH_SIZE,
+            help='Сделок в одном UPDATE',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько сделок изменится',
+        )
+
+    def handle(self, *args, **options):
+        schedule = fee_schedule()
+        self.stdout.write('Ставки комиссии: ' + ', '.join(f'{level} {percent}%' for level, percent in schedule.items()))
+
+        queryset = open_transactions()
+        if options['merchant']:
+            queryset = queryset.filter(merchant__telegram_id=options['merchant'])
+
+        checked, changed = settle_transactions(queryset, options['batch_size'], options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f'Проверено сделок: {checked}, изменится: {changed}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Проверено сделок: {checked}, пересчитано: {changed}'))
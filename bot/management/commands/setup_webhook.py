@@ -3,6 +3,10 @@ from django.conf import settings
 import asyncio
 from telegram import Bot
 
+from bot.application import create_application
+from bot.fake_api import FakeRequest, get_fake_api
+from bot.polling import allowed_updates
+
 class Command(BaseCommand):
     help = 'Установить webhook для Telegram бота'
 
@@ -24,7 +28,11 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        if settings.TELEGRAM_FAKE_API:
+            api = get_fake_api()
+            bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, request=FakeRequest(api), get_updates_request=FakeRequest(api))
+        else:
+            bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
         
         if options['delete']:
             self.stdout.write('Удаление webhook...')
@@ -52,7 +60,14 @@ class Command(BaseCommand):
             return
         
         self.stdout.write(f'Установка webhook: {webhook_url}')
-        asyncio.run(bot.set_webhook(webhook_url))
+        asyncio.run(bot.set_webhook(
+            webhook_url,
+            secret_token=settings.TELEGRAM_WEBHOOK_SECRET or None,
+            # Telegram не присылает типы обновлений, на которые нет обработчиков
+            allowed_updates=allowed_updates(create_application()),
+        ))
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            self.stdout.write(self.style.WARNING('⚠️ TELEGRAM_WEBHOOK_SECRET не задан: webhook принимает запросы без проверки'))
         
         # Проверяем
         info = asyncio.run(bot.get_webhook_info())
@@ -0,0 +1,269 @@
+"""
+Метрики бота в памяти процесса
+
+Счетчики, gauge и гистограммы с метками в стиле Prometheus. Обновление
+метрики - это блокировка и пара операций со словарем, поэтому их можно
+вызывать на каждое обновление Telegram и на каждый запрос к базе.
+
+Несколько процессов gunicorn: если задан METRICS_MULTIPROCESS_DIR, каждый
+процесс не чаще раза в METRICS_DUMP_INTERVAL секунд сохраняет свои значения
+в файл metrics-<pid>.json, а /metrics суммирует файлы всех процессов
+(gauge - только живых процессов).
+"""
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+# Границы корзин гистограмм для времени (секунды) и для количеств
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Metric:
+    """Базовая метрика: значения по наборам меток"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self):
+        """Копия значений: {кортеж меток: значение}"""
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Текущее значение (размер очереди, занятые соединения)"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    """Распределение значений по корзинам; значение - (корзины, сумма, количество)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def values(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом или метками")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector):
+        """Функция, обновляющая gauge перед выгрузкой (размеры очередей, пулов)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def metrics(self):
+        """Все зарегистрированные метрики в порядке имени"""
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def collect(self):
+        """Состояние метрик процесса: {имя: описание и значения}"""
+        for collector in list(self._collectors):
+            collector()
+        families = {}
+        for metric in self.metrics():
+            families[metric.name] = {
+                'kind': metric.kind,
+                'documentation': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'values': [[list(key), value] for key, value in metric.values().items()],
+            }
+        return families
+
+    def reset(self):
+        """Обнулить значения (для бенчмарков)"""
+        for metric in self.metrics():
+            metric.reset()
+
+REGISTRY = Registry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+_last_dump = 0.0
+
+def _dump_path(pid=None):
+    return os.path.join(settings.METRICS_MULTIPROCESS_DIR, f'metrics-{pid or os.getpid()}.json')
+
+def dump():
+    """Сохранить метрики процесса в общий каталог"""
+    global _last_dump
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(REGISTRY.collect(), f)
+    os.replace(tmp_path, _dump_path())
+    _last_dump = time.monotonic()
+
+def maybe_dump():
+    """dump() не чаще раза в METRICS_DUMP_INTERVAL секунд"""
+    if settings.METRICS_MULTIPROCESS_DIR and time.monotonic() - _last_dump >= settings.METRICS_DUMP_INTERVAL:
+        dump()
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge(target, family, with_gauges):
+    merged = target.setdefault(family['name'], {**family, 'values': {}})
+    if family['kind'] == 'gauge' and not with_gauges:
+        return
+    values = merged['values']
+    for key, value in family['values']:
+        key = tuple(key)
+        if family['kind'] == 'histogram':
+            counts, total, count = values.get(key, ([0] * len(family['buckets']), 0.0, 0))
+            values[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2])
+        else:
+            values[key] = values.get(key, 0) + value
+
+def collect_all():
+    """Метрики всех процессов (или только текущего без общего каталога)"""
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if not directory:
+        sources = [(REGISTRY.collect(), True)]
+    else:
+        dump()
+        sources = []
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+            try:
+                with open(path) as f:
+                    sources.append((json.load(f), _pid_alive(pid)))
+            except (OSError, ValueError):
+                continue
+
+    merged = {}
+    for families, alive in sources:
+        for name, family in families.items():
+            _merge(merged, {**family, 'name': name}, alive)
+    return [merged[name] for name in sorted(merged)]
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+def render(families):
+    """Текстовый формат экспозиции Prometheus"""
+    lines = []
+    for family in families:
+        name, labelnames = family['name'], family['labelnames']
+        lines.append(f"# HELP {name} {family['documentation']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        for key, value in sorted(family['values'].items()):
+            if family['kind'] != 'histogram':
+                lines.append(f"{name}{_labels(labelnames, key)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(family['buckets'], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labelnames, key, ('le', _number(float(bound))))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labelnames, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{_labels(labelnames, key)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labelnames, key)} {count}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='ID в основной таблице')),
+                ('transaction_id', models.CharField(max_length=50, unique=True, verbose_name='ID транзакции')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма')),
+                ('fee_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Комиссия')),
+                ('merchant_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма продавцу')),
+                ('status', models.CharField(choices=[('PENDING_PAYMENT', 'Ожидает оплаты'), ('PAYMENT_CONFIRMED', 'Оплата подтверждена'), ('ITEM_DELIVERED', 'Товар доставлен'), ('COMPLETED', 'Завершена'), ('CANCELLED', 'Отменена')], max_length=30, verbose_name='Статус')),
+                ('payment_confirmed_at', models.DateTimeField(blank=True, null=True, verbose_name='Оплата подтверждена')),
+                ('item_delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='Товар доставлен')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('client_contact', models.CharField(blank=True, max_length=255, null=True, verbose_name='Контакт клиента')),
+                ('merchant_contact', models.CharField(blank=True, max_length=255, null=True, verbose_name='Контакт продавца')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')),
+            ],
+            options={
+                'verbose_name': 'Архивная транзакция',
+                'verbose_name_plural': 'Архив транзакций',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'updated_at'], name='bot_tx_status_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_purchases', to='bot.telegramuser', verbose_name='Покупатель'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='bot.item', verbose_name='Товар'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='merchant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sales', to='bot.telegramuser', verbose_name='Продавец'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['client', '-created_at'], name='bot_archtx_client_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['merchant', '-created_at'], name='bot_archtx_merchant_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0002_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedUpdate',
+            fields=[
+                ('update_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID обновления')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата обработки')),
+            ],
+            options={
+                'verbose_name': 'Обработанное обновление',
+                'verbose_name_plural': 'Обработанные обновления',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0003_processedupdate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('category', models.CharField(max_length=100, verbose_name='Категория')),
+                ('transactions_count', models.IntegerField(default=0, verbose_name='Количество сделок')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма')),
+                ('fee_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Комиссия')),
+                ('merchant_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма продавцу')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('merchant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='bot.telegramuser', verbose_name='Продавец')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['merchant', 'day'], name='bot_rollup_merchant_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'merchant', 'category'), name='bot_rollup_day_merchant_category_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:47
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_category(apps, schema_editor):
+    """Категория прежних сделок - текущая категория товара (другой не сохранилось)"""
+    Item = apps.get_model('bot', 'Item')
+    for name in ('Transaction', 'ArchivedTransaction'):
+        apps.get_model('bot', name).objects.update(
+            category=Subquery(Item.objects.filter(id=OuterRef('item_id')).values('category')[:1])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0004_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='category',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='category',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Категория'),
+        ),
+        migrations.RunPython(fill_category, migrations.RunPython.noop),
+    ]
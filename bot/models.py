@@ -48,19 +48,6 @@ class TelegramUser(models.Model):
         
     def __str__(self):
         return f"{self.username or self.telegram_id} ({self.get_role_display()})"
-    
-    def update_merchant_level(self):
-        """Обновление уровня продавца на основе опыта"""
-        if self.role == UserRole.MERCHANT:
-            if self.experience_points >= 10000:
-                self.merchant_level = MerchantLevel.PLATINUM
-            elif self.experience_points >= 5000:
-                self.merchant_level = MerchantLevel.GOLD
-            elif self.experience_points >= 2000:
-                self.merchant_level = MerchantLevel.SILVER
-            else:
-                self.merchant_level = MerchantLevel.BRONZE
-            self.save()
 
 # Товары Minecraft
 class Item(models.Model):
@@ -90,6 +77,9 @@ class Transaction(models.Model):
     merchant = models.ForeignKey(TelegramUser, on_delete=models.CASCADE, related_name='sales', verbose_name='Продавец')
     item = models.ForeignKey(Item, on_delete=models.CASCADE, verbose_name='Товар')
     
+    # Категория товара на момент покупки: по ней сделка попадает в сводку продаж
+    category = models.CharField(max_length=100, blank=True, default='', verbose_name='Категория')
+    
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма')
     fee_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Комиссия')
     merchant_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма продавцу')
@@ -110,20 +100,64 @@ class Transaction(models.Model):
         verbose_name = 'Транзакция'
         verbose_name_plural = 'Транзакции'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='bot_tx_status_updated_idx'),
+        ]
         
     def __str__(self):
         return f"Транзакция {self.transaction_id} - {self.amount} руб."
     
     def calculate_amounts(self):
-        """Расчет комиссии и суммы продавцу"""
-        self.fee_amount = self.amount * Decimal(str(5.5)) / Decimal('100')
-        self.merchant_amount = self.amount - self.fee_amount
+        """Расчет комиссии и суммы продавцу по ставке уровня продавца"""
+        from .settlement import fee_percent, split_amount
+        self.fee_amount, self.merchant_amount = split_amount(self.amount, fee_percent(self.merchant.merchant_level))
         
     def save(self, *args, **kwargs):
-        if not self.fee_amount or not self.merchant_amount:
+        if not self.category and self.item_id is not None:
+            self.category = self.item.category
+        # Нулевая комиссия (ставка 0%) - тоже посчитанная сумма
+        if self.fee_amount is None or self.merchant_amount is None:
             self.calculate_amounts()
         super().save(*args, **kwargs)
 
+# Архив завершённых и отменённых транзакций
+class ArchivedTransaction(models.Model):
+    original_id = models.BigIntegerField(unique=True, verbose_name='ID в основной таблице')
+    transaction_id = models.CharField(max_length=50, unique=True, verbose_name='ID транзакции')
+    client = models.ForeignKey(TelegramUser, on_delete=models.CASCADE, related_name='archived_purchases', verbose_name='Покупатель')
+    merchant = models.ForeignKey(TelegramUser, on_delete=models.CASCADE, related_name='archived_sales', verbose_name='Продавец')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='archived_transactions', verbose_name='Товар')
+    category = models.CharField(max_length=100, blank=True, default='', verbose_name='Категория')
+    
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма')
+    fee_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Комиссия')
+    merchant_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма продавцу')
+    
+    status = models.CharField(max_length=30, choices=TransactionStatus.choices, verbose_name='Статус')
+    
+    payment_confirmed_at = models.DateTimeField(blank=True, null=True, verbose_name='Оплата подтверждена')
+    item_delivered_at = models.DateTimeField(blank=True, null=True, verbose_name='Товар доставлен')
+    completed_at = models.DateTimeField(blank=True, null=True, verbose_name='Завершена')
+    
+    client_contact = models.CharField(max_length=255, blank=True, null=True, verbose_name='Контакт клиента')
+    merchant_contact = models.CharField(max_length=255, blank=True, null=True, verbose_name='Контакт продавца')
+    
+    created_at = models.DateTimeField(verbose_name='Дата создания')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата архивации')
+    
+    class Meta:
+        verbose_name = 'Архивная транзакция'
+        verbose_name_plural = 'Архив транзакций'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['client', '-created_at'], name='bot_archtx_client_idx'),
+            models.Index(fields=['merchant', '-created_at'], name='bot_archtx_merchant_idx'),
+        ]
+        
+    def __str__(self):
+        return f"Архивная транзакция {self.transaction_id} - {self.amount} руб."
+
 # Отзывы
 class Review(models.Model):
     transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, verbose_name='Транзакция')
@@ -139,3 +173,42 @@ class Review(models.Model):
         
     def __str__(self):
         return f"Отзыв на {self.merchant.username} - {self.rating}/5"
+
+# Обработанные обновления Telegram (общий для воркеров отсев повторов)
+class ProcessedUpdate(models.Model):
+    update_id = models.BigIntegerField(primary_key=True, verbose_name='ID обновления')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата обработки')
+    
+    class Meta:
+        verbose_name = 'Обработанное обновление'
+        verbose_name_plural = 'Обработанные обновления'
+        
+    def __str__(self):
+        return f"Обновление {self.update_id}"
+
+# Продажи по дням: заранее посчитанные суммы для аналитики
+class DailySalesRollup(models.Model):
+    day = models.DateField(verbose_name='День')
+    merchant = models.ForeignKey(TelegramUser, on_delete=models.CASCADE, related_name='sales_rollups', verbose_name='Продавец')
+    category = models.CharField(max_length=100, verbose_name='Категория')
+    
+    transactions_count = models.IntegerField(default=0, verbose_name='Количество сделок')
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Сумма')
+    fee_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Комиссия')
+    merchant_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Сумма продавцу')
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    
+    class Meta:
+        verbose_name = 'Продажи за день'
+        verbose_name_plural = 'Продажи по дням'
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'merchant', 'category'], name='bot_rollup_day_merchant_category_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['merchant', 'day'], name='bot_rollup_merchant_day_idx'),
+        ]
+        
+    def __str__(self):
+        return f"Продажи {self.day} - {self.category}: {self.amount} руб."
@@ -0,0 +1,191 @@
+"""
+Пакетная модерация товаров и платежей
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+from .cache import CATALOG
+from .models import Item, Transaction, TransactionStatus
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину одного сообщения
+MESSAGE_LIMIT = 4096
+
+# Максимум кнопок "Я получил товар" в одном сообщении покупателю
+RECEIVED_BUTTONS_PER_MESSAGE = 20
+
+def _group_by_recipient(rows, recipient_field):
+    """Сгруппировать строки по получателю уведомления"""
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[recipient_field]].append(row)
+    return dict(grouped)
+
+def pending_items(item_ids=None, up_to_id=None):
+    """Товары на модерации: по списку ID или все до указанного ID"""
+    items = Item.objects.filter(is_approved=False, is_active=True)
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+    if up_to_id is not None:
+        items = items.filter(id__lte=up_to_id)
+    return items
+
+def _moderate_items(item_ids, up_to_id, **changes):
+    """Одним UPDATE изменить товары на модерации, вернуть их по продавцам"""
+    with db_transaction.atomic():
+        items = pending_items(item_ids, up_to_id).select_for_update()
+        rows = list(items.values('id', 'title', 'price', 'merchant__telegram_id'))
+        if rows:
+            Item.objects.filter(id__in=[row['id'] for row in rows]).update(
+                updated_at=timezone.now(), **changes
+            )
+            # update() не шлёт post_save - сбрасываем каталог сами
+            db_transaction.on_commit(CATALOG.invalidate)
+    return _group_by_recipient(rows, 'merchant__telegram_id')
+
+def approve_items(item_ids=None, up_to_id=None):
+    """Одобрить товары, вернуть {telegram_id продавца: [товары]}"""
+    return _moderate_items(item_ids, up_to_id, is_approved=True)
+
+def reject_items(item_ids=None, up_to_id=None):
+    """Отклонить товары (снять с публикации), вернуть их по продавцам"""
+    return _moderate_items(item_ids, up_to_id, is_active=False)
+
+def _user_contact(username, telegram_id):
+    """Контакт пользователя для передачи второй стороне сделки"""
+    return f"@{username}" if username else f"ID: {telegram_id}"
+
+def pending_payments(transaction_ids=None, up_to_id=None):
+    """Оплаченные покупателем транзакции, которые ещё не проверил администратор"""
+    transactions = Transaction.objects.filter(
+        status=TransactionStatus.PAYMENT_CONFIRMED,
+        merchant_contact__isnull=True
+    )
+    if transaction_ids is not None:
+        transactions = transactions.filter(id__in=transaction_ids)
+    if up_to_id is not None:
+        transactions = transactions.filter(id__lte=up_to_id)
+    return transactions
+
+def approve_payments(transaction_ids=None, up_to_id=None):
+    """Одобрить платежи, вернуть одобренные транзакции"""
+    with db_transaction.atomic():
+        transactions = list(pending_payments(transaction_ids, up_to_id).select_related(
+            'client', 'merchant', 'item'
+        ).select_for_update(of=('self',)))
+
+        for t in transactions:
+            t.client_contact = _user_contact(t.client.username, t.client.telegram_id)
+            t.merchant_contact = _user_contact(t.merchant.username, t.merchant.telegram_id)
+            t.updated_at = timezone.now()
+
+        # bulk_update строит один UPDATE ... CASE на всю пачку
+        Transaction.objects.bulk_update(
+            transactions, ['client_contact', 'merchant_contact', 'updated_at']
+        )
+    return transactions
+
+def reject_payments(transaction_ids=None, up_to_id=None):
+    """Отклонить платежи, вернуть {telegram_id покупателя: [транзакции]}"""
+    with db_transaction.atomic():
+        transactions = pending_payments(transaction_ids, up_to_id).select_for_update()
+        rows = list(transactions.values('id', 'transaction_id', 'amount', 'item__title', 'client__telegram_id'))
+        if rows:
+            Transaction.objects.filter(id__in=[row['id'] for row in rows]).update(
+                status=TransactionStatus.CANCELLED,
+                updated_at=timezone.now()
+            )
+    return _group_by_recipient(rows, 'client__telegram_id')
+
+def split_message(header, lines, limit=MESSAGE_LIMIT):
+    """Разбить список строк на сообщения не длиннее лимита Telegram"""
+    messages = []
+    current = header
+    for line in lines:
+        if len(current) + len(line) + 1 > limit:
+            messages.append(current)
+            current = header
+        current += line + "\n"
+    messages.append(current)
+    return messages
+
+def format_items_notification(items, approved):
+    """Сгруппированное уведомление продавцу о модерации его товаров"""
+    if approved:
+        header = f"✅ **Одобрено товаров: {len(items)}**\n\nТовары теперь доступны в каталоге:\n\n"
+    else:
+        header = f"❌ **Отклонено товаров: {len(items)}**\n\nТовары не прошли модерацию:\n\n"
+    return split_message(header, [f"📦 {item['title']} - {item['price']} руб." for item in items])
+
+def format_rejected_payments_notification(transactions):
+    """Сгруппированное уведомление покупателю об отклонённых платежах"""
+    header = (
+        f"❌ **Платежи отклонены администратором ({len(transactions)})**\n\n"
+        "Оплата не найдена. Если вы уверены, что оплатили, обратитесь в поддержку: @atauq\n\n"
+    )
+    return split_message(header, [
+        f"📦 {t['item__title']} - {t['amount']} руб. | 🆔 `{t['transaction_id']}`"
+        for t in transactions
+    ])
+
+async def send_grouped(bot, grouped, formatter):
+    """Отправить по одному сообщению (или пачке частей) каждому получателю"""
+    sent = 0
+    for chat_id, rows in grouped.items():
+        for text in formatter(rows):
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown')
+                sent += 1
+            except Exception as e:
+                logger.error(f"Не удалось отправить уведомление о модерации {chat_id}: {e}")
+    return sent
+
+async def notify_items_moderated(bot, grouped, approved=True):
+    """Уведомить продавцов о пакетной модерации товаров"""
+    return await send_grouped(bot, grouped, lambda items: format_items_notification(items, approved))
+
+async def notify_payments_approved(bot, transactions):
+    """Уведомить покупателей и продавцов об одобренных платежах одним сообщением на каждого"""
+    by_merchant = defaultdict(list)
+    by_client = defaultdict(list)
+    for t in transactions:
+        by_merchant[t.merchant.telegram_id].append(t)
+        by_client[t.client.telegram_id].append(t)
+
+    sent = await send_grouped(bot, by_merchant, lambda group: split_message(
+        f"✅ **Платежи одобрены администратором ({len(group)})**\n\n"
+        "Свяжитесь с покупателями и передайте товары:\n\n",
+        [f"📦 {t.item.title} | 🆔 `{t.transaction_id}` | 👤 {t.client_contact}" for t in group]
+    ))
+
+    # Покупателю нужна отдельная кнопка подтверждения на каждую транзакцию
+    for chat_id, group in by_client.items():
+        for start in range(0, len(group), RECEIVED_BUTTONS_PER_MESSAGE):
+            chunk = group[start:start + RECEIVED_BUTTONS_PER_MESSAGE]
+            text = f"✅ **Платежи одобрены администратором ({len(chunk)})**\n\n"
+            text += "".join(
+                f"📦 {t.item.title} | 🆔 `{t.transaction_id}`\n**Контакт продавца:** {t.merchant_contact}\n\n"
+                for t in chunk
+            )
+            text += "После получения товара нажмите кнопку ниже."
+            keyboard = InlineKeyboardMarkup([
+                [InlineKeyboardButton(f"✅ Я получил: {t.item.title}"[:64], callback_data=f"received_{t.id}")]
+                for t in chunk
+            ])
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown', reply_markup=keyboard)
+                sent += 1
+            except Exception as e:
+                logger.error(f"Не удалось отправить контакты покупателю {chat_id}: {e}")
+    return sent
+
+async def notify_payments_rejected(bot, grouped):
+    """Уведомить покупателей об отклонённых платежах"""
+    return await send_grouped(bot, grouped, format_rejected_payments_notification)
@@ -0,0 +1,197 @@
+"""
+Запуск бота в режиме polling (manage.py run_bot)
+
+По сравнению с application.run_polling() по умолчанию:
+
+- обновления разных чатов обрабатываются параллельно (до
+  BOT_POLLING_CONCURRENCY одновременно), обновления одного чата - по порядку,
+  как того требует ConversationHandler;
+- подписка только на типы обновлений, которые есть у зарегистрированных
+  обработчиков (allowed_updates), а не на все;
+- long-poll getUpdates длится BOT_POLLING_TIMEOUT секунд;
+- по SIGTERM/SIGINT бот перестает забирать обновления и дожидается
+  обработки уже полученных (не дольше BOT_POLLING_DRAIN_TIMEOUT секунд).
+"""
+
+import asyncio
+import logging
+import signal
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import (
+    BaseUpdateProcessor, CallbackQueryHandler, ChatJoinRequestHandler, ChatMemberHandler,
+    ChosenInlineResultHandler, CommandHandler, ConversationHandler, InlineQueryHandler,
+    MessageHandler, PollAnswerHandler, PollHandler, PreCheckoutQueryHandler,
+    ShippingQueryHandler, TypeHandler,
+)
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT = metrics.gauge('bot_polling_updates_in_flight', 'Обновления в обработке (polling)')
+ABANDONED = metrics.counter(
+    'bot_polling_abandoned_updates_total', 'Обновления, не обработанные до остановки бота')
+
+# Обновления, ожидающие своей очереди (в том числе за другими обновлениями чата)
+MAX_PENDING_UPDATES = 1000
+
+# Типы обновлений, которые принимает каждый вид обработчика. Правки сообщений
+# (edited_message) не подписываются: бот реагирует на кнопки меню, а повторная
+# обработка отредактированного текста повторила бы действие.
+HANDLER_UPDATE_TYPES = (
+    (CommandHandler, [Update.MESSAGE]),
+    (MessageHandler, [Update.MESSAGE]),
+    (CallbackQueryHandler, [Update.CALLBACK_QUERY]),
+    (InlineQueryHandler, [Update.INLINE_QUERY]),
+    (ChosenInlineResultHandler, [Update.CHOSEN_INLINE_RESULT]),
+    (PreCheckoutQueryHandler, [Update.PRE_CHECKOUT_QUERY]),
+    (ShippingQueryHandler, [Update.SHIPPING_QUERY]),
+    (PollHandler, [Update.POLL]),
+    (PollAnswerHandler, [Update.POLL_ANSWER]),
+    (ChatMemberHandler, [Update.MY_CHAT_MEMBER, Update.CHAT_MEMBER]),
+    (ChatJoinRequestHandler, [Update.CHAT_JOIN_REQUEST]),
+)
+
+def _iter_handlers(handlers):
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            yield from _iter_handlers(handler.entry_points + handler.fallbacks)
+            for state_handlers in handler.states.values():
+                yield from _iter_handlers(state_handlers)
+        else:
+            yield handler
+
+def allowed_updates(application):
+    """Типы обновлений, которые могут обработать зарегистрированные обработчики"""
+    types = set()
+    for handlers in application.handlers.values():
+        for handler in _iter_handlers(handlers):
+            # Служебные обработчики всех обновлений (лимит, автор) сами ничего не требуют
+            if isinstance(handler, TypeHandler):
+                continue
+            for handler_class, update_types in HANDLER_UPDATE_TYPES:
+                if isinstance(handler, handler_class):
+                    types.update(update_types)
+                    break
+            else:
+                logger.warning(f"Неизвестный тип обработчика {type(handler).__name__}, подписка на все обновления")
+                return Update.ALL_TYPES
+    return sorted(types)
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обновления разных чатов - параллельно, одного чата - по порядку"""
+
+    def __init__(self, max_concurrent_updates):
+        # Семафор базового класса ограничивает ожидающие обновления,
+        # собственный - обрабатываемые одновременно
+        super().__init__(MAX_PENDING_UPDATES)
+        self.concurrency = max_concurrent_updates
+        self.in_flight = 0
+        self._workers = None
+        self._chats = {}
+        self._idle = None
+
+    async def initialize(self):
+        self._workers = asyncio.Semaphore(self.concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def shutdown(self):
+        pass
+
+    @staticmethod
+    def _chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        self.in_flight += 1
+        IN_FLIGHT.set(self.in_flight)
+        self._idle.clear()
+        key = self._chat_key(update)
+        try:
+            if key is None:
+                async with self._workers:
+                    await coroutine
+                return
+
+            # [блокировка, число обновлений чата в очереди]; все в одном event loop
+            entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    async with self._workers:
+                        await coroutine
+            finally:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._chats[key]
+        finally:
+            self.in_flight -= 1
+            IN_FLIGHT.set(self.in_flight)
+            if not self.in_flight:
+                self._idle.set()
+
+    async def wait_idle(self):
+        """Дождаться обработки всех полученных обновлений"""
+        await self._idle.wait()
+
+def configure_builder(builder):
+    """Параллельная обработка обновлений для ApplicationBuilder"""
+    return builder.concurrent_updates(ChatOrderedUpdateProcessor(settings.BOT_POLLING_CONCURRENCY))
+
+async def _run(application):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка по KeyboardInterrupt
+            pass
+
+    updates = allowed_updates(application)
+    logger.info(f"Подписка на обновления: {', '.join(updates)}")
+
+    async with application:
+        await application.start()
+        await application.updater.start_polling(
+            poll_interval=settings.BOT_POLLING_INTERVAL,
+            timeout=settings.BOT_POLLING_TIMEOUT,
+            bootstrap_retries=-1,
+            allowed_updates=updates,
+            drop_pending_updates=settings.BOT_POLLING_DROP_PENDING,
+        )
+        logger.info("Бот запущен!")
+        try:
+            await stop.wait()
+        finally:
+            await _drain(application)
+
+async def _drain(application):
+    """Перестать забирать обновления и дождаться обработки полученных"""
+    processor = application.update_processor
+    logger.info(f"Остановка бота, в обработке обновлений: {processor.in_flight}")
+    await application.updater.stop()
+
+    timeout = settings.BOT_POLLING_DRAIN_TIMEOUT
+    try:
+        await asyncio.wait_for(processor.wait_idle(), timeout)
+    except asyncio.TimeoutError:
+        ABANDONED.inc(processor.in_flight)
+        logger.error(f"За {timeout} с не обработаны обновления: {processor.in_flight}")
+    try:
+        await asyncio.wait_for(application.stop(), timeout)
+    except asyncio.TimeoutError:
+        logger.error("Application не остановился вовремя")
+    metrics.dump()
+
+def run(application):
+    """Запустить polling до SIGTERM/SIGINT"""
+    asyncio.run(_run(application))
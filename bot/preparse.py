@@ -0,0 +1,105 @@
+"""
+Предварительный разбор обновления до построения telegram.Update
+
+Update.de_json строит полный граф объектов python-telegram-bot, а многие
+обновления отбрасываются сразу: типы, на которые нет обработчиков, и запросы
+пользователей сверх лимита (bot/ratelimit.py). Поэтому тело запроса
+разбирается в словарь (orjson, если установлен, иначе json - оба читают
+bytes без декодирования), из него берутся тип обновления, пользователь, чат,
+текст и данные кнопки, и только если обновление дойдет до обработчиков,
+из того же словаря строится Update. Тело неожиданной формы (поле не того
+типа) разбирается полностью, как без предварительного разбора: лимит такого
+обновления проверяет обработчик rate_limit.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from telegram import Update
+
+from . import metrics, ratelimit
+from .polling import allowed_updates
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+SKIPPED = metrics.counter(
+    'bot_updates_skipped_total', 'Обновления, отброшенные до построения Update, по причине', ['reason'])
+
+def loads(body):
+    """JSON из сырого тела запроса (bytes)"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+class UpdateInfo:
+    """Поля обновления, нужные до построения Update"""
+
+    __slots__ = ('update_id', 'type', 'user_id', 'chat_id', 'text', 'callback_data', 'callback_query_id')
+
+    def __init__(self, data):
+        self.update_id = data.get('update_id')
+        self.type = next((key for key in data if key != 'update_id'), None)
+        payload = data.get(self.type) if self.type else None
+        if not isinstance(payload, dict):
+            payload = {}
+
+        self.user_id = (payload.get('from') or payload.get('user') or {}).get('id')
+        message = payload.get('message') if self.type == Update.CALLBACK_QUERY else payload
+        self.chat_id = ((message or {}).get('chat') or payload.get('chat') or {}).get('id')
+        self.text = payload.get('text')
+        self.callback_data = payload.get('data')
+        self.callback_query_id = payload.get('id') if self.type == Update.CALLBACK_QUERY else None
+
+    def action(self):
+        """Действие для лимита запросов"""
+        return ratelimit.classify(
+            callback_data=self.callback_data,
+            text=self.text,
+            is_callback=self.type == Update.CALLBACK_QUERY,
+        )
+
+_subscribed = {}
+
+def _subscribed_types(application):
+    # Обработчики регистрируются один раз при сборке application
+    key = id(application)
+    if key not in _subscribed:
+        _subscribed[key] = frozenset(allowed_updates(application))
+    return _subscribed[key]
+
+async def dispatch(application, body):
+    """Разобрать тело обновления и обработать его, если оно дойдет до обработчиков
+
+    Возвращает 'processed' или причину, по которой Update не строился.
+    """
+    data = loads(body)
+    try:
+        info = UpdateInfo(data)
+        action = info.action()
+    except (AttributeError, TypeError) as e:
+        logger.warning(f"Обновление не разобрано предварительно ({e}), полный разбор")
+        await application.process_update(Update.de_json(data, application.bot))
+        return 'processed'
+
+    if info.type not in _subscribed_types(application):
+        SKIPPED.inc(reason='unsubscribed')
+        return 'unsubscribed'
+
+    if settings.BOT_RATELIMIT_ENABLED and info.user_id is not None:
+        ratelimit.mark_checked(info.update_id)
+        allowed = await ratelimit.check(
+            application.bot, info.user_id, action,
+            chat_id=info.chat_id, callback_query_id=info.callback_query_id,
+        )
+        if not allowed:
+            SKIPPED.inc(reason='rate_limited')
+            return 'rate_limited'
+
+    await application.process_update(Update.de_json(data, application.bot))
+    return 'processed'
@@ -0,0 +1,203 @@
+"""
+Выборочный профилировщик обработки обновлений
+
+Для доли обновлений (BOT_PROFILING_SAMPLE_RATE) фоновый поток каждые
+BOT_PROFILING_INTERVAL секунд снимает стеки потока, обрабатывающего
+обновление, и потоков ORM (bot-orm). Стеки агрегируются и раз в
+BOT_PROFILING_FLUSH_INTERVAL секунд записываются в
+BOT_PROFILING_DIR/profile-<pid>.folded в формате flamegraph.pl / speedscope:
+
+    callback_query;bot.telegram_bot:handle_callback;... 42
+
+Профилирование включается переменной BOT_PROFILING=True или файлом-флагом
+BOT_PROFILING_DIR/enabled, который переключает staff-страница /bot/profiling/
+(флаг видят все воркеры gunicorn). Пока профилируемых обновлений нет, поток
+сэмплера спит, поэтому при небольшой доле обновлений накладные расходы
+остаются в пределах процента.
+"""
+
+import glob
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 64
+ORM_THREAD_PREFIX = 'bot-orm'
+IDLE_WORKER_FRAME = 'concurrent.futures.thread:_worker'
+
+# Как часто перепроверять файл-флаг, с
+FLAG_CHECK_INTERVAL = 1.0
+
+def _flag_path():
+    return os.path.join(settings.BOT_PROFILING_DIR, 'enabled')
+
+_flag_state = (0.0, False)
+
+def is_enabled():
+    """Включено ли профилирование (переменная окружения или файл-флаг)"""
+    global _flag_state
+    if settings.BOT_PROFILING:
+        return True
+    checked, enabled = _flag_state
+    now = time.monotonic()
+    if now - checked > FLAG_CHECK_INTERVAL:
+        enabled = os.path.exists(_flag_path())
+        _flag_state = (now, enabled)
+    return enabled
+
+def set_enabled(enabled):
+    """Включить/выключить профилирование во всех воркерах через файл-флаг"""
+    global _flag_state
+    os.makedirs(settings.BOT_PROFILING_DIR, exist_ok=True)
+    if enabled:
+        open(_flag_path(), 'w').close()
+    elif os.path.exists(_flag_path()):
+        os.remove(_flag_path())
+    _flag_state = (time.monotonic(), enabled)
+
+def _frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+def _fold(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class Sampler:
+    """Фоновый поток, снимающий стеки профилируемых обновлений"""
+
+    def __init__(self, interval, flush_interval):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.stacks = Counter()
+        self.samples_total = 0
+        self.updates_total = 0
+
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._last_flush = time.monotonic()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='bot-profiler', daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def profile(self, label):
+        """Снимать стеки текущего потока, пока выполняется блок"""
+        thread_id = threading.get_ident()
+        with self._lock:
+            # Один поток event loop может обрабатывать несколько обновлений сразу
+            self._targets.setdefault(thread_id, []).append(label)
+            self.updates_total += 1
+            self._active.set()
+        self._ensure_thread()
+        try:
+            yield
+        finally:
+            with self._lock:
+                labels = self._targets[thread_id]
+                labels.remove(label)
+                if not labels:
+                    del self._targets[thread_id]
+                if not self._targets:
+                    self._active.clear()
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                targets = {thread_id: labels[-1] for thread_id, labels in self._targets.items()}
+            if not targets:
+                continue
+
+            orm_threads = {t.ident for t in threading.enumerate() if t.name.startswith(ORM_THREAD_PREFIX)}
+            label = next(iter(targets.values()))
+            sampled = Counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id in targets:
+                    sampled[f"{targets[thread_id]};{_fold(frame)}"] += 1
+                elif thread_id in orm_threads:
+                    stack = _fold(frame)
+                    # Свободный поток ORM ждет задачу в очереди - это не работа
+                    if not stack.endswith(IDLE_WORKER_FRAME):
+                        sampled[f"{label};{ORM_THREAD_PREFIX};{stack}"] += 1
+
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples_total += 1
+
+    def flush(self):
+        """Записать накопленные стеки процесса в BOT_PROFILING_DIR"""
+        with self._lock:
+            stacks = Counter(self.stacks)
+            self._last_flush = time.monotonic()
+        if not stacks:
+            return
+
+        directory = settings.BOT_PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.profile-')
+        with os.fdopen(fd, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp_path, os.path.join(directory, f'profile-{os.getpid()}.folded'))
+
+_sampler = None
+
+def get_sampler():
+    """Сэмплер процесса (создается при первом профилируемом обновлении)"""
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler(settings.BOT_PROFILING_INTERVAL, settings.BOT_PROFILING_FLUSH_INTERVAL)
+    return _sampler
+
+@contextmanager
+def maybe_profile(label):
+    """Профилировать блок с вероятностью BOT_PROFILING_SAMPLE_RATE"""
+    if not is_enabled() or random.random() >= settings.BOT_PROFILING_SAMPLE_RATE:
+        yield
+        return
+    with get_sampler().profile(label):
+        yield
+
+def merged_profile():
+    """Стеки всех воркеров из BOT_PROFILING_DIR в одном folded-файле"""
+    if _sampler is not None:
+        _sampler.flush()
+    stacks = Counter()
+    for path in glob.glob(os.path.join(settings.BOT_PROFILING_DIR, 'profile-*.folded')):
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+def clear_profiles():
+    """Удалить накопленные профили (новое измерение)"""
+    if _sampler is not None:
+        with _sampler._lock:
+            _sampler.stacks.clear()
+    for path in glob.glob(os.path.join(settings.BOT_PROFILING_DIR, 'profile-*.folded')):
+        os.remove(path)
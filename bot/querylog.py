@@ -0,0 +1,140 @@
+"""
+Журнал SQL-запросов и поиск N+1 в обработчиках бота
+
+Запросы каждого обновления считаются всегда (bot/instrumentation.py), а
+при BOT_SQL_LOG=True ещё и записываются с текстом, временем и именем
+обработчика. По итогам обновления:
+
+- медленные запросы (дольше BOT_SQL_SLOW_MS) попадают в лог всегда;
+- одинаковые по форме запросы, повторённые BOT_SQL_REPEAT_THRESHOLD раз и
+  больше, считаются N+1 (нужна запись запросов, BOT_SQL_LOG);
+- обработчик, выполнивший больше запросов, чем его бюджет в QUERY_BUDGETS
+  (или BOT_SQL_QUERY_BUDGETS), нарушает бюджет.
+
+Нарушения всегда только логируются и считаются в метриках. Строгий режим -
+блок `with strict():` в тестах - поднимает QueryBudgetExceeded из
+process_update. В рабочем процессе исключение не поднимается: обновление к
+этому моменту уже обработано и сохранено, а ошибка вебхука вернула бы его
+Telegram на повторную доставку.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = metrics.counter(
+    'bot_sql_slow_queries_total', 'SQL-запросы дольше BOT_SQL_SLOW_MS', ['handler'])
+REPEATED_QUERIES = metrics.counter(
+    'bot_sql_repeated_queries_total', 'Найденные N+1 (повторяющиеся формы запросов)', ['handler'])
+BUDGET_EXCEEDED = metrics.counter(
+    'bot_sql_budget_exceeded_total', 'Превышения бюджета SQL-запросов', ['handler'])
+
+# Максимум SQL-запросов за один вызов обработчика. Обработчики без бюджета
+# не проверяются; значения переопределяются через BOT_SQL_QUERY_BUDGETS.
+QUERY_BUDGETS = {
+    'remember_user': 0,
+    'start': 2,
+    'help_command': 0,
+    'profile': 1,
+    'show_catalog': 1,
+    'show_leaderboard': 1,
+    'show_my_items': 1,
+    'show_my_purchases': 2,
+    'show_my_sales': 2,
+    'show_pending_items': 3,
+    'show_transactions': 2,
+    'show_users': 1,
+    'show_statistics': 3,
+    'buy_item': 3,
+    'payment_confirmed': 3,
+    'admin_approve_payment': 2,
+    'item_received': 3,
+    # Первая за день продажа продавца в категории создает строку сводки (+2)
+    'admin_complete_transaction': 7,
+}
+
+_strict = ContextVar('sql_strict', default=False)
+
+class QueryBudgetExceeded(Exception):
+    """Обработчик превысил бюджет SQL-запросов или выполнил N+1"""
+
+    def __init__(self, violations):
+        self.violations = violations
+        super().__init__('; '.join(violations))
+
+@contextmanager
+def strict():
+    """Поднимать QueryBudgetExceeded внутри блока (для тестов)"""
+    token = _strict.set(True)
+    try:
+        yield
+    finally:
+        _strict.reset(token)
+
+def is_strict():
+    return _strict.get()
+
+def get_budget(handler):
+    """Бюджет запросов обработчика или None"""
+    budgets = {**QUERY_BUDGETS, **settings.BOT_SQL_QUERY_BUDGETS}
+    return budgets.get(handler)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACES = re.compile(r'\s+')
+
+def normalize(sql):
+    """Форма запроса: без литералов и с IN (...) вместо списка параметров"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+def check_budget(handler, queries):
+    """Сообщение о нарушении бюджета или None"""
+    budget = get_budget(handler)
+    if budget is None or queries <= budget:
+        return None
+    BUDGET_EXCEEDED.inc(handler=handler)
+    return f"{handler}: {queries} SQL-запросов при бюджете {budget}"
+
+def record_slow_query(handler, sql, seconds):
+    """Залогировать медленный запрос"""
+    SLOW_QUERIES.inc(handler=handler or 'unknown')
+    logger.warning(f"Медленный SQL ({seconds * 1000:.0f} мс) в {handler or 'unknown'}: {sql[:500]}")
+
+def find_repeated(queries):
+    """N+1: формы запросов, повторённые в обработчике не меньше порога
+
+    queries - записи (handler, sql, seconds) одного обновления.
+    """
+    shapes = Counter((handler, normalize(sql)) for handler, sql, _ in queries)
+    violations = []
+    for (handler, shape), count in shapes.items():
+        if count >= settings.BOT_SQL_REPEAT_THRESHOLD:
+            REPEATED_QUERIES.inc(handler=handler or 'unknown')
+            violations.append(f"{handler or 'unknown'}: {count} одинаковых запросов (N+1): {shape[:300]}")
+    return violations
+
+def report(stats, update_type):
+    """Итоги обновления: лог нарушений, в строгом режиме - исключение"""
+    violations = list(stats.violations)
+    if stats.queries:
+        violations.extend(find_repeated(stats.queries))
+    if not violations:
+        return
+
+    for violation in violations:
+        logger.warning(f"SQL ({update_type}) {violation}")
+    if is_strict():
+        raise QueryBudgetExceeded(violations)
@@ -0,0 +1,295 @@
+"""
+Ограничение частоты запросов пользователей (token bucket)
+
+У каждого пользователя (telegram_id) есть ведро на BOT_RATELIMIT_BURST
+токенов, которое пополняется со скоростью BOT_RATELIMIT_RATE токенов в
+секунду. Каждое обновление списывает стоимость действия (ACTION_COSTS,
+переопределяется BOT_RATELIMIT_COSTS): каталог отправляет до десятка
+сообщений и стоит дороже обычной кнопки. Если токенов не хватает,
+обработчик в группе -2 останавливает обработку обновления до handle_text /
+handle_callback, а пользователь один раз получает предупреждение. На webhook
+лимит проверяется еще раньше, до построения Update (bot/preparse.py), и
+обработчик тогда токены повторно не списывает.
+
+Администраторов лимит не ограничивает: они подтверждают оплаты и товары
+подряд. Их telegram_id процесс перечитывает из базы не чаще раза в
+BOT_RATELIMIT_ADMINS_REFRESH секунд, поэтому новый администратор перестает
+ограничиваться не сразу.
+
+Хранилище ведер (BOT_RATELIMIT_BACKEND):
+
+- memory - в памяти процесса;
+- cache - Django cache, общий для воркеров при общем бэкенде кеша. Чтение и
+  запись ведра не атомарны, поэтому при одновременных запросах одного
+  пользователя в разные воркеры лимит соблюдается приблизительно.
+"""
+
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from . import metrics
+from .db import db_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+CHECKS = metrics.counter(
+    'bot_ratelimit_checks_total', 'Проверки лимита запросов по действиям', ['action'])
+THROTTLED = metrics.counter(
+    'bot_ratelimit_throttled_total', 'Отклонённые лимитом запросы по действиям', ['action'])
+
+# Стоимость действий в токенах; переопределяется через BOT_RATELIMIT_COSTS
+ACTION_COSTS = {
+    'catalog': 5,
+    'history': 2,
+    'leaderboard': 2,
+    'buy': 2,
+    # Полная выгрузка транзакций - самый тяжелый запрос к базе
+    'export': 10,
+    'command': 1,
+    'message': 1,
+    'callback': 1,
+    'other': 1,
+}
+
+# Кнопки меню, которые дороже обычного сообщения
+TEXT_ACTIONS = {
+    "🛍 Каталог товаров": 'catalog',
+    "📦 Мои покупки": 'history',
+    "💰 Мои продажи": 'history',
+    "🏆 Рейтинг продавцов": 'leaderboard',
+}
+
+COMMAND_ACTIONS = {
+    '/export': 'export',
+}
+
+CALLBACK_ACTIONS = {
+    'buy_': 'buy',
+    'page_': 'history',
+}
+
+CACHE_KEY_PREFIX = 'bot:ratelimit:'
+
+# update_id, лимит которого уже проверен по сырому телу запроса
+_checked_update = ContextVar('ratelimit_checked_update', default=None)
+
+# Ведра в памяти процесса, после которых удаляются полные (неактивные)
+MEMORY_MAX_BUCKETS = 10000
+
+# telegram_id администраторов и когда они прочитаны (time.monotonic)
+_admin_ids = frozenset()
+_admin_ids_loaded = None
+
+def classify(callback_data=None, text=None, is_callback=False):
+    """Действие по данным кнопки или тексту сообщения"""
+    if is_callback:
+        data = callback_data or ''
+        for prefix, action in CALLBACK_ACTIONS.items():
+            if data.startswith(prefix):
+                return action
+        return 'callback'
+    if text:
+        if text.startswith('/'):
+            return COMMAND_ACTIONS.get(text.split(maxsplit=1)[0], 'command')
+        return TEXT_ACTIONS.get(text, 'message')
+    return 'other'
+
+def action_for(update):
+    """Действие обновления для выбора стоимости"""
+    if update.callback_query is not None:
+        return classify(callback_data=update.callback_query.data, is_callback=True)
+    return classify(text=update.message.text if update.message is not None else None)
+
+def get_cost(action):
+    costs = {**ACTION_COSTS, **settings.BOT_RATELIMIT_COSTS}
+    return costs.get(action, costs['other'])
+
+def refill(tokens, updated, now, rate, burst):
+    """Токены ведра к моменту now"""
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+def take(tokens, cost, rate):
+    """Списать cost: (разрешено, остаток токенов, через сколько секунд повторить)"""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+class MemoryBuckets:
+    """Ведра в памяти процесса"""
+
+    name = 'memory'
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost):
+        """Списать cost токенов: (разрешено, через сколько секунд повторить)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = refill(tokens, updated, now, self.rate, self.burst)
+            allowed, tokens, retry_after = take(tokens, cost, self.rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MEMORY_MAX_BUCKETS:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        # Полное ведро ничем не отличается от отсутствующего
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if refill(tokens, updated, now, self.rate, self.burst) < self.burst
+        }
+
+class CacheBuckets:
+    """Ведра в Django cache, общие для воркеров"""
+
+    name = 'cache'
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        # Через столько секунд пустое ведро снова полное - дольше хранить незачем
+        self.timeout = max(1, int(burst / rate) + 1)
+
+    def consume(self, key, cost):
+        now = time.time()
+        cache_key = f'{CACHE_KEY_PREFIX}{key}'
+        tokens, updated = cache.get(cache_key) or (self.burst, now)
+        tokens = refill(tokens, updated, now, self.rate, self.burst)
+        allowed, tokens, retry_after = take(tokens, cost, self.rate)
+        cache.set(cache_key, (tokens, now), self.timeout)
+        return allowed, retry_after
+
+BACKENDS = {
+    'memory': MemoryBuckets,
+    'cache': CacheBuckets,
+}
+
+class RateLimiter:
+    """Лимит запросов пользователей и учёт отправленных предупреждений"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._notified_until = {}
+        self._lock = threading.Lock()
+
+    def check(self, user_id, action):
+        """(разрешено, через сколько секунд повторить)"""
+        CHECKS.inc(action=action)
+        try:
+            allowed, retry_after = self.buckets.consume(user_id, get_cost(action))
+        except Exception as e:
+            # Недоступное хранилище лимитов не должно останавливать бота
+            logger.error(f"Не удалось проверить лимит запросов {user_id} в {self.buckets.name}: {e}")
+            return True, 0.0
+        if not allowed:
+            THROTTLED.inc(action=action)
+        return allowed, retry_after
+
+    def should_notify(self, user_id, retry_after):
+        """Предупреждать один раз, пока пользователь остаётся ограниченным"""
+        now = time.monotonic()
+        with self._lock:
+            if self._notified_until.get(user_id, 0) > now:
+                return False
+            if len(self._notified_until) > MEMORY_MAX_BUCKETS:
+                self._notified_until = {
+                    key: until for key, until in self._notified_until.items() if until > now
+                }
+            self._notified_until[user_id] = now + max(retry_after, 1.0)
+            return True
+
+@db_sync_to_async
+def load_admin_ids():
+    """telegram_id активных администраторов"""
+    from .models import TelegramUser, UserRole
+
+    return frozenset(
+        TelegramUser.objects.filter(role=UserRole.ADMIN, is_active=True).values_list('telegram_id', flat=True)
+    )
+
+async def is_exempt(user_id):
+    """Не ограничивать ли пользователя: администраторы без лимита"""
+    global _admin_ids, _admin_ids_loaded
+    now = time.monotonic()
+    if _admin_ids_loaded is None or now - _admin_ids_loaded >= settings.BOT_RATELIMIT_ADMINS_REFRESH:
+        # Пока список перечитывается, остальные проверки видят прежний
+        _admin_ids_loaded = now
+        try:
+            _admin_ids = await load_admin_ids()
+        except Exception as e:
+            logger.error(f"Не удалось прочитать список администраторов для лимита запросов: {e}")
+    return user_id in _admin_ids
+
+_limiter = None
+
+def get_limiter():
+    """Лимит запросов процесса, настроенный из settings"""
+    global _limiter
+    if _limiter is None:
+        backend = settings.BOT_RATELIMIT_BACKEND
+        buckets_class = BACKENDS.get(backend)
+        if buckets_class is None:
+            raise ValueError(f"Неизвестный BOT_RATELIMIT_BACKEND: {backend}")
+        _limiter = RateLimiter(buckets_class(settings.BOT_RATELIMIT_RATE, settings.BOT_RATELIMIT_BURST))
+    return _limiter
+
+async def check(bot, user_id, action, chat_id=None, callback_query_id=None):
+    """Списать стоимость действия; при превышении лимита один раз предупредить
+
+    Возвращает True, если обновление можно обрабатывать.
+    """
+    if await is_exempt(user_id):
+        return True
+    limiter = get_limiter()
+    if limiter.buckets.name == 'memory':
+        allowed, retry_after = limiter.check(user_id, action)
+    else:
+        # Общий кеш может ходить в сеть или базу - не блокируем event loop
+        allowed, retry_after = await sync_to_async(limiter.check, thread_sensitive=False)(user_id, action)
+    if allowed:
+        return True
+
+    if limiter.should_notify(user_id, retry_after):
+        text = f"⏳ Слишком много запросов. Повторите через {max(1, round(retry_after))} с."
+        try:
+            if callback_query_id is not None:
+                await bot.answer_callback_query(callback_query_id, text)
+            elif chat_id is not None:
+                await bot.send_message(chat_id, text)
+        except Exception as e:
+            logger.warning(f"Не удалось предупредить пользователя {user_id} о лимите: {e}")
+    return False
+
+def mark_checked(update_id):
+    """Лимит обновления уже проверен до разбора (bot/preparse.py)"""
+    _checked_update.set(update_id)
+
+async def rate_limit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Остановить обработку обновления, если пользователь превысил лимит"""
+    if not settings.BOT_RATELIMIT_ENABLED or update.effective_user is None:
+        return
+    if _checked_update.get() == update.update_id:
+        return
+
+    allowed = await check(
+        context.bot,
+        update.effective_user.id,
+        action_for(update),
+        chat_id=update.effective_chat.id if update.effective_chat else None,
+        callback_query_id=update.callback_query.id if update.callback_query else None,
+    )
+    if not allowed:
+        raise ApplicationHandlerStop
@@ -0,0 +1,177 @@
+"""
+Расчет комиссии сервиса и выплат продавцам
+
+Ставка комиссии зависит от уровня продавца: TRANSACTION_FEE_SCHEDULE задает
+процент для уровня, остальные уровни платят TRANSACTION_FEE_PERCENT.
+Комиссия считается в Decimal и округляется до копейки половиной вверх
+(ROUND_HALF_UP), продавцу идет остаток - комиссия и выплата в сумме всегда
+ровно равны сумме сделки.
+
+Новая сделка получает суммы при создании (Transaction.calculate_amounts).
+После смены ставок открытые сделки пересчитываются пачками командой
+manage.py settle_transactions: суммы считает сама база одним UPDATE с CASE
+по уровню продавца на диапазон id, в целых копейках - без чтения строк в
+Python и с тем же округлением. Завершенные сделки не пересчитываются: они уже
+выплачены и учтены в сводке продаж.
+"""
+
+import logging
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db.models import (
+    BigIntegerField, Case, Count, DecimalField, ExpressionWrapper, F, Max, Min, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Round
+
+from exchange.db_router import read_from_replica
+
+from .models import DailySalesRollup, MerchantLevel, TelegramUser, Transaction, TransactionStatus
+
+logger = logging.getLogger(__name__)
+
+KOPECK = Decimal('0.01')
+
+HUNDRED = Decimal('100')
+
+# Сделки в этих статусах уже не пересчитываются: выплачены или отменены
+SETTLED_STATUSES = (TransactionStatus.COMPLETED, TransactionStatus.CANCELLED)
+
+PAYOUT_FIELDS = ('amount', 'fee_amount', 'merchant_amount')
+
+AMOUNT_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+def _percent(value, name):
+    try:
+        percent = Decimal(str(value))
+    except ArithmeticError:
+        raise ValueError(f"Неверный процент комиссии в {name}: {value!r}")
+    if not percent.is_finite() or not 0 <= percent <= 100:
+        raise ValueError(f"Процент комиссии в {name} должен быть от 0 до 100: {value!r}")
+    return percent
+
+def fee_schedule():
+    """Процент комиссии для каждого уровня продавца
+
+    Ошибки настроек - ValueError; при запуске их находит проверка bot.E001
+    (bot/checks.py).
+    """
+    base = _percent(settings.TRANSACTION_FEE_PERCENT, 'TRANSACTION_FEE_PERCENT')
+    schedule = {level: base for level in MerchantLevel.values}
+    for level, value in settings.TRANSACTION_FEE_SCHEDULE.items():
+        if level not in schedule:
+            raise ValueError(f"Неизвестный уровень продавца в TRANSACTION_FEE_SCHEDULE: {level}")
+        schedule[level] = _percent(value, 'TRANSACTION_FEE_SCHEDULE')
+    return schedule
+
+def fee_percent(level, schedule=None):
+    """Процент комиссии для уровня продавца"""
+    schedule = schedule or fee_schedule()
+    return schedule.get(level, schedule[MerchantLevel.BRONZE])
+
+def split_amount(amount, percent):
+    """(комиссия, сумма продавцу) для суммы сделки"""
+    amount = Decimal(str(amount))
+    fee = (amount * percent / HUNDRED).quantize(KOPECK, rounding=ROUND_HALF_UP)
+    return fee, amount - fee
+
+def open_transactions():
+    """Сделки, по которым продавцу еще не заплатили"""
+    # NOT IN, а не IN по открытым статусам: с IN SQLite выбирает индекс по
+    # статусу вместо диапазона id и читает все открытые сделки на каждой пачке
+    return Transaction.objects.exclude(status__in=SETTLED_STATUSES)
+
+def _kopecks(field):
+    """Сумма поля в копейках, целым числом
+
+    bigint: произведение копеек на числитель ставки не помещается в 32 бита
+    integer PostgreSQL уже для сумм в тысячи рублей.
+    """
+    return Cast(Round(F(field) * 100), BigIntegerField())
+
+def fee_kopecks(schedule):
+    """Комиссия сделки в копейках как SQL-выражение, с тем же округлением, что split_amount
+
+    Проценты уровней приводятся к общему знаменателю d: процент = n / d, n
+    выбирает CASE по уровню продавца. Дальше целочисленная арифметика,
+    одинаково точная в SQLite и PostgreSQL:
+    round_half_up(сумма * n / (100 d)) = (2 n * сумма + 100 d) // (200 d).
+    """
+    denominator = math.lcm(*(percent.as_integer_ratio()[1] for percent in schedule.values()))
+    numerators = {level: int(percent * denominator) for level, percent in schedule.items()}
+    # Уровень читается по первичному ключу продавца, без JOIN во всем UPDATE
+    numerator = Subquery(
+        TelegramUser.objects.filter(id=OuterRef('merchant_id')).annotate(
+            fee_numerator=Case(
+                *(When(merchant_level=level, then=Value(n)) for level, n in numerators.items()),
+                default=Value(numerators[MerchantLevel.BRONZE]),
+                output_field=BigIntegerField(),
+            )
+        ).values('fee_numerator')
+    )
+    return ExpressionWrapper(
+        (_kopecks('amount') * numerator * 2 + 100 * denominator) / (200 * denominator),
+        output_field=BigIntegerField(),
+    )
+
+def settle_transactions(queryset=None, batch_size=None, dry_run=False):
+    """Пересчитать комиссию и выплату сделок по текущим ставкам
+
+    По умолчанию - все открытые сделки. Суммы считает база: один UPDATE на
+    диапазон из batch_size id, только для строк, где суммы расходятся.
+    Возвращает (проверено, изменено).
+    """
+    batch_size = batch_size or settings.TRANSACTION_SETTLEMENT_BATCH_SIZE
+    if queryset is None:
+        queryset = open_transactions()
+    new_fee = fee_kopecks(fee_schedule())
+    stale = queryset.annotate(
+        new_fee_kopecks=new_fee,
+        fee_kopecks=_kopecks('fee_amount'),
+        payout_kopecks=_kopecks('merchant_amount'),
+        amount_kopecks=_kopecks('amount'),
+    ).exclude(
+        fee_kopecks=F('new_fee_kopecks'),
+        payout_kopecks=F('amount_kopecks') - F('new_fee_kopecks'),
+    )
+    fee = ExpressionWrapper(new_fee * KOPECK, output_field=AMOUNT_FIELD)
+
+    bounds = queryset.aggregate(first=Min('id'), last=Max('id'), count=Count('id'))
+    if not bounds['count']:
+        return 0, 0
+
+    changed = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        batch = stale.filter(id__gte=start, id__lt=start + batch_size)
+        if dry_run:
+            changed += batch.count()
+        else:
+            changed += batch.update(fee_amount=fee, merchant_amount=F('amount') - fee)
+
+    logger.info(f"Пересчет комиссий: проверено сделок {bounds['count']}, изменено {changed}")
+    return bounds['count'], changed
+
+@read_from_replica
+def payout_summary(date_from, date_to):
+    """Выплаты продавцам за завершенные сделки периода (включительно)
+
+    Один сгруппированный запрос по сводке продаж, включая архив. Возвращает
+    список словарей: telegram_id, username, merchant_level, transactions_count,
+    amount, fee_amount, merchant_amount - по убыванию выплаты.
+    """
+    rows = list(
+        DailySalesRollup.objects.filter(day__gte=date_from, day__lte=date_to).values(
+            telegram_id=F('merchant__telegram_id'),
+            username=F('merchant__username'),
+            merchant_level=F('merchant__merchant_level'),
+        ).annotate(
+            transactions_count=Sum('transactions_count'),
+            **{field: Sum(field) for field in PAYOUT_FIELDS},
+        ).order_by('-merchant_amount', 'telegram_id')
+    )
+    # SQLite суммирует DecimalField с погрешностью float - округляем до копеек
+    for row in rows:
+        for field in PAYOUT_FIELDS:
+            row[field] = Decimal(row[field] or 0).quantize(KOPECK)
+    return rows
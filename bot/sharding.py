@@ -0,0 +1,310 @@
+"""
+Шардирование webhook по чатам между процессами бота
+
+С BOT_SHARDS=N воркеры gunicorn работают как входной слой: проверяют секрет,
+достают из сырого тела update_id и чат, отсеивают повторы и пересылают тело
+обновления процессу-шарду, выбранному консистентным хешированием по чату
+(manage.py run_bot_shards). Все обновления чата попадают в один процесс,
+поэтому user_data, состояние диалогов (ConversationHandler) и кеши процесса
+остаются горячими, а обработка масштабируется по ядрам числом шардов. При
+изменении числа шардов переезжает только около 1/N чатов.
+
+Шарды слушают Unix-сокеты BOT_SHARD_SOCKET_DIR/shard-<i>.sock. Кадр запроса -
+4 байта длины (big-endian) и тело обновления, ответ - 1 байт: 0 - обработано,
+1 - ошибка (Telegram повторит доставку). Кадр нулевой длины - проверка связи.
+Каждое соединение обслуживается своей задачей, а входной слой шлет обновления
+одного чата из разных потоков, поэтому шард обрабатывает обновления чата по
+одному в порядке поступления, как polling.ChatOrderedUpdateProcessor.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import re
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+FORWARDED = metrics.counter(
+    'bot_shard_forwarded_total', 'Обновления, переданные шардам, по результату', ['shard', 'status'])
+SHARD_RESTARTS = metrics.counter(
+    'bot_shard_restarts_total', 'Перезапуски упавших процессов-шардов', ['shard'])
+
+# Ключи "chat" и "from" не встречаются внутри строк: кавычки в них экранированы.
+# У объектов Chat и User поле id идет первым.
+CHAT_ID_RE = re.compile(rb'"chat"\s*:\s*\{\s*"id"\s*:\s*(-?\d+)')
+USER_ID_RE = re.compile(rb'"from"\s*:\s*\{\s*"id"\s*:\s*(\d+)')
+
+# Точек на окружности на один шард: чем больше, тем ровнее распределение
+VIRTUAL_NODES = 128
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+STATUS_OK = b'\x00'
+STATUS_ERROR = b'\x01'
+
+class ShardError(Exception):
+    """Шард не обработал обновление"""
+
+def extract_chat_key(body):
+    """Чат обновления из сырого тела (или пользователь, если чата нет)"""
+    match = CHAT_ID_RE.search(body) or USER_ID_RE.search(body)
+    return int(match.group(1)) if match else None
+
+class HashRing:
+    """Консистентное хеширование ключей по узлам"""
+
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        points = sorted(
+            (self._hash(f'{node}:{replica}'), node)
+            for node in nodes for replica in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+def socket_path(shard):
+    return os.path.join(settings.BOT_SHARD_SOCKET_DIR, f'shard-{shard}.sock')
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('шард закрыл соединение')
+        data += chunk
+    return data
+
+class ShardClient:
+    """Передача обновлений шардам; у каждого потока свои соединения"""
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.ring = HashRing(range(shards))
+        self._local = threading.local()
+
+    def shard_for(self, body, update_id):
+        key = extract_chat_key(body)
+        return self.ring.node_for(update_id if key is None else key)
+
+    def _connections(self):
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+    def _connect(self, shard):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(settings.BOT_SHARD_TIMEOUT)
+        try:
+            sock.connect(socket_path(shard))
+        except OSError:
+            sock.close()
+            raise
+        self._connections()[shard] = sock
+        return sock
+
+    def _close(self, shard):
+        sock = self._connections().pop(shard, None)
+        if sock is not None:
+            sock.close()
+
+    def _request(self, shard, body):
+        frame = FRAME_HEADER.pack(len(body)) + body
+        sock = self._connections().get(shard)
+        try:
+            if sock is None:
+                sock = self._connect(shard)
+            try:
+                sock.sendall(frame)
+            except OSError:
+                # Шард перезапускался: старое соединение закрыто, обновление он не получил
+                self._close(shard)
+                sock = self._connect(shard)
+                sock.sendall(frame)
+            return _recv_exact(sock, 1)
+        except Exception:
+            # Ответ мог прийти позже и сбить кадры - соединение больше не используем
+            self._close(shard)
+            raise
+
+    def forward(self, body, update_id):
+        """Передать обновление шарду его чата и дождаться обработки"""
+        shard = self.shard_for(body, update_id)
+        try:
+            status = self._request(shard, body)
+        except OSError as e:
+            FORWARDED.inc(shard=shard, status='unavailable')
+            raise ShardError(f"шард {shard} недоступен: {e}") from e
+        if status != STATUS_OK:
+            FORWARDED.inc(shard=shard, status='error')
+            raise ShardError(f"шард {shard} не обработал обновление {update_id}")
+        FORWARDED.inc(shard=shard, status='ok')
+
+    def ping(self, shard):
+        """Проверить, что шард принимает соединения"""
+        return self._request(shard, b'') == STATUS_OK
+
+_client = None
+
+def get_client():
+    """Клиент шардов процесса, настроенный из settings"""
+    global _client
+    if _client is None:
+        _client = ShardClient(settings.BOT_SHARDS)
+    return _client
+
+# Процесс-шард
+
+class ShardServer:
+    """Обработка обновлений, пришедших от входного слоя"""
+
+    def __init__(self, application):
+        self.application = application
+        self.in_flight = 0
+        self._chats = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+                if length > MAX_FRAME_SIZE:
+                    logger.error(f"Слишком большой кадр: {length} байт")
+                    break
+                body = await reader.readexactly(length)
+                status = await self.process(body) if length else STATUS_OK
+                writer.write(status)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def process(self, body):
+        """Обработать обновление после предыдущих обновлений его чата"""
+        self.in_flight += 1
+        self._idle.clear()
+        key = extract_chat_key(body)
+        try:
+            if key is None:
+                return await self._dispatch(body)
+
+            # [блокировка, число обновлений чата в очереди]; все в одном event loop
+            entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    return await self._dispatch(body)
+            finally:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._chats[key]
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def _dispatch(self, body):
+        from . import preparse
+
+        try:
+            await preparse.dispatch(self.application, body)
+            return STATUS_OK
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления в шарде: {e}", exc_info=True)
+            return STATUS_ERROR
+
+    async def wait_idle(self):
+        await self._idle.wait()
+
+async def _serve(shard):
+    from .application import create_application
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    path = socket_path(shard)
+    os.makedirs(settings.BOT_SHARD_SOCKET_DIR, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    application = create_application()
+    shard_server = ShardServer(application)
+    async with application:
+        server = await asyncio.start_unix_server(shard_server.handle_connection, path)
+        logger.info(f"Шард {shard} слушает {path}")
+        await stop.wait()
+
+        # Новые обновления не принимаем, начатые дорабатываем
+        server.close()
+        try:
+            await asyncio.wait_for(shard_server.wait_idle(), settings.BOT_SHARD_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Шард {shard} остановлен с необработанными обновлениями: {shard_server.in_flight}")
+    metrics.dump()
+
+def serve(shard):
+    """Запустить процесс-шард до SIGTERM/SIGINT"""
+    asyncio.run(_serve(shard))
+
+def shard_command(shard):
+    """Команда запуска одного шарда через manage.py"""
+    return [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'run_bot_shards', '--shard', str(shard)]
+
+def supervise(shards):
+    """Запустить шарды дочерними процессами и перезапускать упавшие"""
+    processes = {}
+    stopping = False
+
+    def start(shard):
+        processes[shard] = subprocess.Popen(shard_command(shard))
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for shard in range(shards):
+        start(shard)
+
+    while not stopping:
+        time.sleep(1)
+        for shard, process in list(processes.items()):
+            if process.poll() is not None and not stopping:
+                logger.error(f"Шард {shard} завершился с кодом {process.returncode}, перезапуск")
+                SHARD_RESTARTS.inc(shard=shard)
+                start(shard)
+        metrics.maybe_dump()
+
+    for process in processes.values():
+        process.wait()
@@ -0,0 +1,19 @@
+"""
+Сброс кеша бота при изменении данных
+
+Изменения через save()/delete() (бот, админ-панель) ловятся сигналами;
+массовые update() сбрасывают кеш сами (bot/moderation.py). Сброс выполняется
+после фиксации транзакции, чтобы пересчёт не прочитал старые данные.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import CATALOG
+from .models import Item
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(CATALOG.invalidate)
@@ -1,14 +1,23 @@
 import os
+import io
+import asyncio
 import logging
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters, ConversationHandler
+from telegram.ext import ContextTypes, ConversationHandler
 from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import connections, transaction as db_transaction
 from django.utils import timezone
+from exchange.db_router import read_from_replica, set_current_user
 from decimal import Decimal
 import uuid
 
-from .models import TelegramUser, Item, Transaction, Review, UserRole, TransactionStatus, MerchantLevel
+from .models import TelegramUser, Item, Transaction, ArchivedTransaction, Review, UserRole, TransactionStatus, MerchantLevel
+from .archive import history_cursor, paginate_history, parse_history_cursor
+from .db import db_sync_to_async, get_pool
+from .instrumentation import instrumented
+from . import analytics, export, item_import, levels, moderation
+from .cache import CATALOG, STATS
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,38 +30,61 @@ logger = logging.getLogger(__name__)
 (CHOOSING_ROLE, ADDING_ITEM_TITLE, ADDING_ITEM_DESC, ADDING_ITEM_PRICE, ADDING_ITEM_CATEGORY,
  CONFIRM_PAYMENT, CONFIRM_DELIVERY, LEAVE_REVIEW_RATING, LEAVE_REVIEW_COMMENT) = range(9)
 
-# Клавиатуры
+# Размер страницы истории транзакций
+HISTORY_PAGE_SIZE = 10
+
+LEVEL_EMOJI = {
+    MerchantLevel.BRONZE: '🥉',
+    MerchantLevel.SILVER: '🥈',
+    MerchantLevel.GOLD: '🥇',
+    MerchantLevel.PLATINUM: '💎'
+}
+
+# Клавиатуры: разметка неизменяема, поэтому собирается один раз и переиспользуется
+MAIN_KEYBOARDS = {
+    UserRole.CLIENT: ReplyKeyboardMarkup([
+        [KeyboardButton("🛍 Каталог товаров"), KeyboardButton("👤 Мой профиль")],
+        [KeyboardButton("📦 Мои покупки"), KeyboardButton("🏆 Рейтинг продавцов")],
+        [KeyboardButton("💼 Стать продавцом"), KeyboardButton("ℹ️ Помощь")]
+    ], resize_keyboard=True),
+    UserRole.MERCHANT: ReplyKeyboardMarkup([
+        [KeyboardButton("➕ Добавить товар"), KeyboardButton("📋 Мои товары")],
+        [KeyboardButton("💰 Мои продажи"), KeyboardButton("👤 Мой профиль")],
+        [KeyboardButton("🏆 Рейтинг продавцов"), KeyboardButton("ℹ️ Помощь")]
+    ], resize_keyboard=True),
+    UserRole.ADMIN: ReplyKeyboardMarkup([
+        [KeyboardButton("✅ Одобрить товары"), KeyboardButton("📊 Транзакции")],
+        [KeyboardButton("👥 Пользователи"), KeyboardButton("📈 Статистика")],
+        [KeyboardButton("ℹ️ Помощь")]
+    ], resize_keyboard=True),
+}
+START_KEYBOARD = ReplyKeyboardMarkup([[KeyboardButton("🔄 Начать")]], resize_keyboard=True)
+BACK_KEYBOARD = ReplyKeyboardMarkup([[KeyboardButton("◀️ Назад")]], resize_keyboard=True)
+
 def get_main_keyboard(role):
     """Главная клавиатура в зависимости от роли"""
-    if role == UserRole.CLIENT:
-        keyboard = [
-            [KeyboardButton("🛍 Каталог товаров"), KeyboardButton("👤 Мой профиль")],
-            [KeyboardButton("📦 Мои покупки"), KeyboardButton("🏆 Рейтинг продавцов")],
-            [KeyboardButton("💼 Стать продавцом"), KeyboardButton("ℹ️ Помощь")]
-        ]
-    elif role == UserRole.MERCHANT:
-        keyboard = [
-            [KeyboardButton("➕ Добавить товар"), KeyboardButton("📋 Мои товары")],
-            [KeyboardButton("💰 Мои продажи"), KeyboardButton("👤 Мой профиль")],
-            [KeyboardButton("🏆 Рейтинг продавцов"), KeyboardButton("ℹ️ Помощь")]
-        ]
-    elif role == UserRole.ADMIN:
-        keyboard = [
-            [KeyboardButton("✅ Одобрить товары"), KeyboardButton("📊 Транзакции")],
-            [KeyboardButton("👥 Пользователи"), KeyboardButton("📈 Статистика")],
-            [KeyboardButton("ℹ️ Помощь")]
-        ]
-    else:
-        keyboard = [[KeyboardButton("🔄 Начать")]]
-    
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return MAIN_KEYBOARDS.get(role, START_KEYBOARD)
 
 def get_back_keyboard():
     """Клавиатура с кнопкой назад"""
-    return ReplyKeyboardMarkup([[KeyboardButton("◀️ Назад")]], resize_keyboard=True)
+    return BACK_KEYBOARD
+
+def get_next_page_keyboard(kind, rows):
+    """Кнопка следующей страницы истории, если страница заполнена"""
+    if len(rows) < HISTORY_PAGE_SIZE:
+        return None
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("➡️ Далее", callback_data=f"page_{kind}_{history_cursor(rows[-1])}")]
+    ])
+
+# Пользователь текущего обновления
+@instrumented
+async def remember_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запомнить автора обновления для маршрутизации чтения с реплики"""
+    set_current_user(update.effective_user.id if update.effective_user else None)
 
 # Получение или создание пользователя
-@sync_to_async
+@db_sync_to_async
 def get_or_create_user(telegram_user):
     """Получить или создать пользователя"""
     user, created = TelegramUser.objects.get_or_create(
@@ -72,6 +104,7 @@ def get_or_create_user(telegram_user):
     return user, created
 
 # Команда /start
+@instrumented
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user, created = await get_or_create_user(update.effective_user)
@@ -117,10 +150,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_main_keyboard(user.role)
     )
 
+def format_levels_help():
+    """Уровни продавцов для справки по текущим порогам MERCHANT_LEVEL_THRESHOLDS"""
+    thresholds = levels.level_thresholds()[::-1]
+    lines = []
+    for (threshold, level), (next_threshold, _) in zip(thresholds, thresholds[1:] + [(None, None)]):
+        xp = f"{threshold}+" if next_threshold is None else f"{threshold}-{next_threshold - 1}"
+        lines.append(f"{LEVEL_EMOJI[level]} {MerchantLevel(level).label}: {xp} XP")
+    return "\n".join(lines)
+
 # Помощь
+@instrumented
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Справка по боту"""
-    help_text = """
+    help_text = f"""
 📚 **Справка по использованию бота**
 
 **Основные команды:**
@@ -137,21 +180,19 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Добавить товар - разместить новый товар
 • Мои товары - управление товарами
 • Мои продажи - история продаж
+• Файл CSV/JSON - загрузить много товаров сразу
 
 **Система уровней продавцов:**
-🥉 Бронза: 0-1999 XP
-🥈 Серебро: 2000-4999 XP
-🥇 Золото: 5000-9999 XP
-💎 Платина: 10000+ XP
+{format_levels_help()}
 
-За каждую продажу: +100 XP
+За каждую продажу: +{levels.SALE_XP} XP
 
 **Поддержка:** @atauq
 """
     await update.message.reply_text(help_text, parse_mode='Markdown')
 
 # Профиль пользователя
-@sync_to_async
+@db_sync_to_async
 def get_user_profile_text(telegram_id):
     """Получить текст профиля пользователя"""
     try:
@@ -167,16 +208,9 @@ def get_user_profile_text(telegram_id):
 """
         
         if user.role == UserRole.MERCHANT:
-            level_emoji = {
-                MerchantLevel.BRONZE: '🥉',
-                MerchantLevel.SILVER: '🥈',
-                MerchantLevel.GOLD: '🥇',
-                MerchantLevel.PLATINUM: '💎'
-            }
-            
             profile_text += f"""
 **Статистика продавца:**
-{level_emoji.get(user.merchant_level, '🥉')} Уровень: {user.get_merchant_level_display()}
+{LEVEL_EMOJI.get(user.merchant_level, '🥉')} Уровень: {user.get_merchant_level_display()}
 ⭐️ Рейтинг: {user.rating}/5.00
 💰 Всего продаж: {user.total_sales} руб.
 📦 Количество сделок: {user.total_transactions}
@@ -188,18 +222,22 @@ def get_user_profile_text(telegram_id):
     except TelegramUser.DoesNotExist:
         return "❌ Профиль не найден. Используйте /start"
 
+@instrumented
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать профиль"""
     profile_text = await get_user_profile_text(update.effective_user.id)
     await update.message.reply_text(profile_text, parse_mode='Markdown')
 
 # Каталог товаров
-@sync_to_async
+@CATALOG.cached('items')
+@db_sync_to_async
+@read_from_replica
 def get_items_list(offset=0, limit=10):
     """Получить список товаров"""
     items = Item.objects.filter(is_approved=True, is_active=True).select_related('merchant')[offset:offset+limit]
     return list(items)
 
+@instrumented
 async def show_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать каталог товаров"""
     items = await get_items_list()
@@ -234,7 +272,7 @@ async def show_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 # Покупка товара
-@sync_to_async
+@db_sync_to_async
 def create_transaction(item_id, client_telegram_id):
     """Создать транзакцию"""
     try:
@@ -251,6 +289,7 @@ def create_transaction(item_id, client_telegram_id):
             client=client,
             merchant=item.merchant,
             item=item,
+            category=item.category,
             amount=item.price
         )
         
@@ -260,6 +299,7 @@ def create_transaction(item_id, client_telegram_id):
     except TelegramUser.DoesNotExist:
         return None, "Пользователь не найден"
 
+@instrumented
 async def buy_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка покупки товара"""
     query = update.callback_query
@@ -303,7 +343,7 @@ async def buy_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 # Подтверждение оплаты
-@sync_to_async
+@db_sync_to_async
 def confirm_payment(transaction_id, user_telegram_id):
     """Подтвердить оплату"""
     try:
@@ -321,12 +361,13 @@ def confirm_payment(transaction_id, user_telegram_id):
     except Transaction.DoesNotExist:
         return None, "Транзакция не найдена"
 
-@sync_to_async
+@db_sync_to_async
 def get_admin_ids():
     """Получить ID всех администраторов"""
     admins = TelegramUser.objects.filter(role=UserRole.ADMIN, is_active=True)
     return [admin.telegram_id for admin in admins]
 
+@instrumented
 async def payment_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка подтверждения оплаты"""
     query = update.callback_query
@@ -404,7 +445,7 @@ async def payment_confirmed(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.error(f"Не удалось отправить уведомление администратору {admin_id}: {e}")
 
 # Одобрение платежа администратором
-@sync_to_async
+@db_sync_to_async
 def approve_payment_by_admin(transaction_id):
     """Одобрить платеж администратором"""
     try:
@@ -422,6 +463,7 @@ def approve_payment_by_admin(transaction_id):
     except Transaction.DoesNotExist:
         return None, "Транзакция не найдена"
 
+@instrumented
 async def admin_approve_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Администратор одобряет платеж"""
     query = update.callback_query
@@ -488,7 +530,7 @@ async def admin_approve_payment(update: Update, context: ContextTypes.DEFAULT_TY
         logger.error(f"Не удалось отправить контакт продавцу: {e}")
 
 # Подтверждение получения товара
-@sync_to_async
+@db_sync_to_async
 def confirm_item_received(transaction_id, user_telegram_id):
     """Подтвердить получение товара"""
     try:
@@ -506,6 +548,7 @@ def confirm_item_received(transaction_id, user_telegram_id):
     except Transaction.DoesNotExist:
         return None, "Транзакция не найдена"
 
+@instrumented
 async def item_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка подтверждения получения товара"""
     query = update.callback_query
@@ -561,31 +604,34 @@ async def item_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.error(f"Не удалось отправить уведомление администратору: {e}")
 
 # Завершение транзакции
-@sync_to_async
+@db_sync_to_async
 def complete_transaction(transaction_id):
     """Завершить транзакцию"""
     try:
-        transaction = Transaction.objects.select_related('client', 'merchant', 'item').get(
-            id=transaction_id,
-            status=TransactionStatus.ITEM_DELIVERED
-        )
-        
-        transaction.status = TransactionStatus.COMPLETED
-        transaction.completed_at = timezone.now()
-        transaction.save()
-        
-        # Обновление статистики продавца
-        merchant = transaction.merchant
-        merchant.total_sales += transaction.amount
-        merchant.total_transactions += 1
-        merchant.experience_points += 100
-        merchant.update_merchant_level()
-        merchant.save()
+        # Сделка, статистика продавца и сводка продаж меняются вместе;
+        # блокировка строки не даст завершить сделку дважды
+        with db_transaction.atomic():
+            transaction = Transaction.objects.select_related('client', 'merchant', 'item').select_for_update(
+                of=('self',)
+            ).get(
+                id=transaction_id,
+                status=TransactionStatus.ITEM_DELIVERED
+            )
+            
+            transaction.status = TransactionStatus.COMPLETED
+            transaction.completed_at = timezone.now()
+            transaction.save()
+            
+            # Статистика, опыт и уровень продавца - одним UPDATE без чтения
+            levels.record_sale(transaction.merchant_id, transaction.amount)
+            
+            analytics.record_sale(transaction)
         
         return transaction, None
     except Transaction.DoesNotExist:
         return None, "Транзакция не найдена"
 
+@instrumented
 async def admin_complete_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Администратор завершает транзакцию"""
     query = update.callback_query
@@ -611,7 +657,7 @@ async def admin_complete_transaction(update: Update, context: ContextTypes.DEFAU
 
 📦 Товар: {transaction.item.title}
 💸 Вы получили: {transaction.merchant_amount} руб.
-🎯 +100 XP
+🎯 +{levels.SALE_XP} XP
 
 Спасибо за работу!
 """
@@ -626,6 +672,7 @@ async def admin_complete_transaction(update: Update, context: ContextTypes.DEFAU
         logger.error(f"Не удалось отправить уведомление продавцу: {e}")
 
 # Добавление товара
+@instrumented
 async def start_add_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начать добавление товара"""
     user, _ = await get_or_create_user(update.effective_user)
@@ -638,7 +685,7 @@ async def start_add_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     # Проверка лимита товаров
-    active_items_count = await sync_to_async(
+    active_items_count = await db_sync_to_async(
         lambda: Item.objects.filter(merchant__telegram_id=update.effective_user.id, is_active=True).count()
     )()
     
@@ -656,18 +703,21 @@ async def start_add_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ADDING_ITEM_TITLE
 
+@instrumented
 async def add_item_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Сохранить название товара"""
     context.user_data['item_title'] = update.message.text
     await update.message.reply_text("📝 Введите описание товара:")
     return ADDING_ITEM_DESC
 
+@instrumented
 async def add_item_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Сохранить описание товара"""
     context.user_data['item_description'] = update.message.text
     await update.message.reply_text("💰 Введите цену товара (в рублях):")
     return ADDING_ITEM_PRICE
 
+@instrumented
 async def add_item_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Сохранить цену товара"""
     try:
@@ -681,7 +731,7 @@ async def add_item_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Неверная цена. Введите число больше 0:")
         return ADDING_ITEM_PRICE
 
-@sync_to_async
+@db_sync_to_async
 def create_item(telegram_id, title, description, price, category):
     """Создать товар"""
     try:
@@ -697,6 +747,7 @@ def create_item(telegram_id, title, description, price, category):
     except TelegramUser.DoesNotExist:
         return None, "Продавец не найден"
 
+@instrumented
 async def add_item_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Сохранить категорию и создать товар"""
     category = update.message.text
@@ -754,8 +805,59 @@ async def add_item_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     return ConversationHandler.END
 
+# Массовая загрузка товаров
+@db_sync_to_async
+def import_items_from_document(telegram_id, content, fmt):
+    """Загрузить товары из документа, вернуть (итог, ошибка)"""
+    try:
+        return item_import.import_items(telegram_id, io.BytesIO(content), fmt), None
+    except item_import.ItemImportError as e:
+        return None, str(e)
+
+@instrumented
+async def import_items_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Загрузить товары из присланного продавцом документа (CSV, JSON, JSON Lines)"""
+    user, _ = await get_or_create_user(update.effective_user)
+    
+    if user.role != UserRole.MERCHANT:
+        await update.message.reply_text(
+            "❌ Только продавцы могут загружать товары. Станьте продавцом через меню!",
+            reply_markup=get_main_keyboard(user.role)
+        )
+        return
+    
+    document = update.message.document
+    fmt = item_import.format_for(document.file_name)
+    if fmt is None:
+        await update.message.reply_text(
+            "❌ Отправьте файл .csv, .json или .jsonl с полями title, description, price, category."
+        )
+        return
+    if document.file_size and document.file_size > settings.BOT_IMPORT_MAX_FILE_SIZE:
+        await update.message.reply_text(
+            f"❌ Файл больше {settings.BOT_IMPORT_MAX_FILE_SIZE // 1024} КБ. Разделите его на несколько."
+        )
+        return
+    
+    file = await document.get_file()
+    content = bytes(await file.download_as_bytearray())
+    result, error = await import_items_from_document(update.effective_user.id, content, fmt)
+    
+    if error:
+        await update.message.reply_text(f"❌ {error}\n\nТовары из файла не загружены.")
+        return
+    
+    await update.message.reply_text(
+        item_import.format_import_report(result, user.approved_items_count),
+        reply_markup=get_main_keyboard(user.role)
+    )
+    
+    # Одно уведомление администраторам на всю загрузку
+    admin_ids = await get_admin_ids()
+    await item_import.notify_admins(context.bot, admin_ids, result.created, user.username)
+
 # Одобрение товара администратором
-@sync_to_async
+@db_sync_to_async
 def approve_item(item_id):
     """Одобрить товар"""
     try:
@@ -766,6 +868,7 @@ def approve_item(item_id):
     except Item.DoesNotExist:
         return None, "Товар не найден"
 
+@instrumented
 async def admin_approve_item(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Администратор одобряет товар"""
     query = update.callback_query
@@ -802,8 +905,65 @@ async def admin_approve_item(update: Update, context: ContextTypes.DEFAULT_TYPE)
     except Exception as e:
         logger.error(f"Не удалось отправить уведомление продавцу: {e}")
 
+# Пакетная модерация
+@instrumented
+async def admin_bulk_moderate_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Администратор одобряет или отклоняет товары пачкой"""
+    query = update.callback_query
+    await query.answer()
+    
+    if not await is_admin(update.effective_user.id):
+        await query.message.reply_text("❌ Недостаточно прав")
+        return
+    
+    approve = query.data.startswith('approve_')
+    if query.data.startswith('reject_item_'):
+        item_ids, up_to_id = [int(query.data.split('_')[2])], None
+    else:
+        item_ids, up_to_id = None, int(query.data.split('_')[3])
+    
+    if approve:
+        grouped = await db_sync_to_async(moderation.approve_items)(item_ids, up_to_id)
+    else:
+        grouped = await db_sync_to_async(moderation.reject_items)(item_ids, up_to_id)
+    
+    count = sum(len(items) for items in grouped.values())
+    action = "Одобрено" if approve else "Отклонено"
+    await query.message.edit_text(
+        f"{'✅' if approve else '❌'} {action} товаров: {count}. Уведомлено продавцов: {len(grouped)}."
+    )
+    
+    await moderation.notify_items_moderated(context.bot, grouped, approved=approve)
+
+@instrumented
+async def admin_bulk_moderate_payments(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Администратор одобряет или отклоняет платежи пачкой"""
+    query = update.callback_query
+    await query.answer()
+    
+    if not await is_admin(update.effective_user.id):
+        await query.message.reply_text("❌ Недостаточно прав")
+        return
+    
+    if query.data.startswith('reject_payment_'):
+        transaction_ids, up_to_id = [int(query.data.split('_')[2])], None
+    else:
+        transaction_ids, up_to_id = None, int(query.data.split('_')[3])
+    
+    if query.data.startswith('approve_'):
+        transactions = await db_sync_to_async(moderation.approve_payments)(transaction_ids, up_to_id)
+        await query.message.edit_text(
+            f"✅ Одобрено платежей: {len(transactions)}. Контакты отправлены покупателям и продавцам."
+        )
+        await moderation.notify_payments_approved(context.bot, transactions)
+    else:
+        grouped = await db_sync_to_async(moderation.reject_payments)(transaction_ids, up_to_id)
+        count = sum(len(rows) for rows in grouped.values())
+        await query.message.edit_text(f"❌ Отклонено платежей: {count}.")
+        await moderation.notify_payments_rejected(context.bot, grouped)
+
 # Стать продавцом
-@sync_to_async
+@db_sync_to_async
 def become_merchant(telegram_id):
     """Стать продавцом"""
     try:
@@ -817,6 +977,7 @@ def become_merchant(telegram_id):
     except TelegramUser.DoesNotExist:
         return None, "Пользователь не найден"
 
+@instrumented
 async def become_merchant_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик становления продавцом"""
     user, error = await become_merchant(update.effective_user.id)
@@ -833,7 +994,9 @@ async def become_merchant_handler(update: Update, context: ContextTypes.DEFAULT_
     )
 
 # Рейтинг продавцов
-@sync_to_async
+@STATS.cached('top_merchants')
+@db_sync_to_async
+@read_from_replica
 def get_top_merchants(limit=10):
     """Получить топ продавцов"""
     merchants = TelegramUser.objects.filter(
@@ -842,6 +1005,7 @@ def get_top_merchants(limit=10):
     ).order_by('-total_sales', '-rating')[:limit]
     return list(merchants)
 
+@instrumented
 async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать рейтинг продавцов"""
     merchants = await get_top_merchants()
@@ -853,16 +1017,10 @@ async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     leaderboard_text = "🏆 **Топ-10 продавцов**\n\n"
     
     medals = ['🥇', '🥈', '🥉']
-    level_emoji = {
-        MerchantLevel.BRONZE: '🥉',
-        MerchantLevel.SILVER: '🥈',
-        MerchantLevel.GOLD: '🥇',
-        MerchantLevel.PLATINUM: '💎'
-    }
     
     for i, merchant in enumerate(merchants, 1):
         medal = medals[i-1] if i <= 3 else f"{i}."
-        level = level_emoji.get(merchant.merchant_level, '🥉')
+        level = LEVEL_EMOJI.get(merchant.merchant_level, '🥉')
         
         leaderboard_text += f"{medal} {level} @{merchant.username or 'Анонимный'}\n"
         leaderboard_text += f"   💰 {merchant.total_sales} руб. | ⭐️ {merchant.rating}/5 | 📦 {merchant.total_transactions} сделок\n\n"
@@ -870,20 +1028,27 @@ async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(leaderboard_text, parse_mode='Markdown')
 
 # Мои покупки
-@sync_to_async
-def get_user_purchases(telegram_id):
+@db_sync_to_async
+@read_from_replica
+def get_user_purchases(telegram_id, cursor=None, limit=HISTORY_PAGE_SIZE):
     """Получить покупки пользователя"""
-    transactions = Transaction.objects.filter(
-        client__telegram_id=telegram_id
-    ).select_related('item', 'merchant').order_by('-created_at')[:10]
-    return list(transactions)
+    return paginate_history(
+        Transaction.objects.filter(
+            client__telegram_id=telegram_id
+        ).select_related('item', 'merchant').order_by('-created_at'),
+        ArchivedTransaction.objects.filter(
+            client__telegram_id=telegram_id
+        ).select_related('item', 'merchant').order_by('-created_at'),
+        cursor, limit
+    )
 
-async def show_my_purchases(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@instrumented
+async def show_my_purchases(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     """Показать мои покупки"""
-    transactions = await get_user_purchases(update.effective_user.id)
+    transactions = await get_user_purchases(update.effective_user.id, cursor)
     
     if not transactions:
-        await update.message.reply_text("📭 У вас пока нет покупок.")
+        await update.effective_message.reply_text("📭 У вас пока нет покупок." if cursor is None else "📭 Больше покупок нет.")
         return
     
     purchases_text = "📦 **Мои покупки**\n\n"
@@ -902,23 +1067,34 @@ async def show_my_purchases(update: Update, context: ContextTypes.DEFAULT_TYPE):
         purchases_text += f"   💰 {t.amount} руб. | 🆔 `{t.transaction_id}`\n"
         purchases_text += f"   Статус: {t.get_status_display()}\n\n"
     
-    await update.message.reply_text(purchases_text, parse_mode='Markdown')
+    await update.effective_message.reply_text(
+        purchases_text,
+        parse_mode='Markdown',
+        reply_markup=get_next_page_keyboard('purchases', transactions)
+    )
 
 # Мои продажи
-@sync_to_async
-def get_merchant_sales(telegram_id):
+@db_sync_to_async
+@read_from_replica
+def get_merchant_sales(telegram_id, cursor=None, limit=HISTORY_PAGE_SIZE):
     """Получить продажи продавца"""
-    transactions = Transaction.objects.filter(
-        merchant__telegram_id=telegram_id
-    ).select_related('item', 'client').order_by('-created_at')[:10]
-    return list(transactions)
+    return paginate_history(
+        Transaction.objects.filter(
+            merchant__telegram_id=telegram_id
+        ).select_related('item', 'client').order_by('-created_at'),
+        ArchivedTransaction.objects.filter(
+            merchant__telegram_id=telegram_id
+        ).select_related('item', 'client').order_by('-created_at'),
+        cursor, limit
+    )
 
-async def show_my_sales(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@instrumented
+async def show_my_sales(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     """Показать мои продажи"""
-    transactions = await get_merchant_sales(update.effective_user.id)
+    transactions = await get_merchant_sales(update.effective_user.id, cursor)
     
     if not transactions:
-        await update.message.reply_text("📭 У вас пока нет продаж.")
+        await update.effective_message.reply_text("📭 У вас пока нет продаж." if cursor is None else "📭 Больше продаж нет.")
         return
     
     sales_text = "💰 **Мои продажи**\n\n"
@@ -937,10 +1113,15 @@ async def show_my_sales(update: Update, context: ContextTypes.DEFAULT_TYPE):
         sales_text += f"   💰 {t.merchant_amount} руб. | 🆔 `{t.transaction_id}`\n"
         sales_text += f"   Статус: {t.get_status_display()}\n\n"
     
-    await update.message.reply_text(sales_text, parse_mode='Markdown')
+    await update.effective_message.reply_text(
+        sales_text,
+        parse_mode='Markdown',
+        reply_markup=get_next_page_keyboard('sales', transactions)
+    )
 
 # Мои товары
-@sync_to_async
+@db_sync_to_async
+@read_from_replica
 def get_merchant_items(telegram_id):
     """Получить товары продавца"""
     items = Item.objects.filter(
@@ -949,6 +1130,7 @@ def get_merchant_items(telegram_id):
     ).order_by('-created_at')
     return list(items)
 
+@instrumented
 async def show_my_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать мои товары"""
     items = await get_merchant_items(update.effective_user.id)
@@ -971,21 +1153,63 @@ async def show_my_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(item_text, parse_mode='Markdown')
 
 # Админские функции
-@sync_to_async
+@db_sync_to_async
+def is_admin(telegram_id):
+    """Проверить, является ли пользователь администратором"""
+    return TelegramUser.objects.filter(telegram_id=telegram_id, role=UserRole.ADMIN, is_active=True).exists()
+
+@db_sync_to_async
 def get_pending_items():
     """Получить товары на модерации"""
     items = Item.objects.filter(is_approved=False, is_active=True).select_related('merchant')[:20]
     return list(items)
 
+@db_sync_to_async
+def get_moderation_queue():
+    """Размер очередей модерации и последние ID в них"""
+    from django.db.models import Count, Max
+    
+    items = moderation.pending_items().aggregate(count=Count('id'), last_id=Max('id'))
+    payments = moderation.pending_payments().aggregate(count=Count('id'), last_id=Max('id'))
+    return items, payments
+
+@instrumented
 async def show_pending_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать товары на модерации (для админов)"""
-    items = await get_pending_items()
+    # Независимые запросы выполняются параллельно в пуле потоков ORM
+    items, (queued_items, queued_payments) = await asyncio.gather(
+        get_pending_items(),
+        get_moderation_queue()
+    )
+    
+    if queued_payments['count']:
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"✅ Одобрить все платежи ({queued_payments['count']})",
+                                  callback_data=f"approve_payments_upto_{queued_payments['last_id']}")],
+            [InlineKeyboardButton(f"❌ Отклонить все платежи ({queued_payments['count']})",
+                                  callback_data=f"reject_payments_upto_{queued_payments['last_id']}")]
+        ])
+        await update.message.reply_text(
+            f"💳 **Платежи на проверке: {queued_payments['count']}**",
+            parse_mode='Markdown',
+            reply_markup=keyboard
+        )
     
     if not items:
         await update.message.reply_text("✅ Нет товаров на модерации!")
         return
     
-    await update.message.reply_text(f"📋 **Товары на модерации ({len(items)}):**\n", parse_mode='Markdown')
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"✅ Одобрить все ({queued_items['count']})",
+                              callback_data=f"approve_items_upto_{queued_items['last_id']}")],
+        [InlineKeyboardButton(f"❌ Отклонить все ({queued_items['count']})",
+                              callback_data=f"reject_items_upto_{queued_items['last_id']}")]
+    ])
+    await update.message.reply_text(
+        f"📋 **Товары на модерации ({queued_items['count']}):**\n",
+        parse_mode='Markdown',
+        reply_markup=keyboard
+    )
     
     for item in items:
         item_text = f"""
@@ -1005,18 +1229,23 @@ async def show_pending_items(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         await update.message.reply_text(item_text, parse_mode='Markdown', reply_markup=keyboard)
 
-@sync_to_async
-def get_recent_transactions(limit=10):
+@db_sync_to_async
+@read_from_replica
+def get_recent_transactions(limit=HISTORY_PAGE_SIZE, cursor=None):
     """Получить последние транзакции"""
-    transactions = Transaction.objects.select_related('client', 'merchant', 'item').order_by('-created_at')[:limit]
-    return list(transactions)
+    return paginate_history(
+        Transaction.objects.select_related('client', 'merchant', 'item').order_by('-created_at'),
+        ArchivedTransaction.objects.select_related('client', 'merchant', 'item').order_by('-created_at'),
+        cursor, limit
+    )
 
-async def show_transactions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@instrumented
+async def show_transactions(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     """Показать транзакции (для админов)"""
-    transactions = await get_recent_transactions()
+    transactions = await get_recent_transactions(cursor=cursor)
     
     if not transactions:
-        await update.message.reply_text("📭 Нет транзакций.")
+        await update.effective_message.reply_text("📭 Нет транзакций." if cursor is None else "📭 Больше транзакций нет.")
         return
     
     trans_text = "📊 **Последние транзакции:**\n\n"
@@ -1036,25 +1265,171 @@ async def show_transactions(update: Update, context: ContextTypes.DEFAULT_TYPE):
         trans_text += f"   👤 {t.client.username or 'Клиент'} → {t.merchant.username or 'Продавец'}\n"
         trans_text += f"   📅 {t.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
     
-    await update.message.reply_text(trans_text, parse_mode='Markdown')
+    await update.effective_message.reply_text(
+        trans_text,
+        parse_mode='Markdown',
+        reply_markup=get_next_page_keyboard('transactions', transactions)
+    )
 
-@sync_to_async
-def get_users_stats():
-    """Получить статистику пользователей"""
-    from django.db.models import Count
+# Выгрузка транзакций
+def export_document(fmt, date_from, date_to):
+    """Выгрузка для /export в отдельном потоке со слотом пула соединений"""
+    try:
+        with get_pool().connection():
+            return export.export_to_file(fmt, date_from, date_to)
+    finally:
+        # Поток не из пула ORM - соединение не оставляем открытым
+        connections.close_all()
+
+@instrumented
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузить транзакции документом (для админов): /export [csv|jsonl] [с ГГГГ-ММ-ДД] [по ГГГГ-ММ-ДД]"""
+    if not await is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ Недостаточно прав")
+        return
     
-    total_users = TelegramUser.objects.count()
-    clients = TelegramUser.objects.filter(role=UserRole.CLIENT).count()
-    merchants = TelegramUser.objects.filter(role=UserRole.MERCHANT).count()
-    admins = TelegramUser.objects.filter(role=UserRole.ADMIN).count()
+    args = list(context.args or [])
+    fmt = args.pop(0) if args and args[0] in export.FORMATS else 'csv'
+    try:
+        if len(args) > 2:
+            raise ValueError
+        date_from, date_to = (list(map(export.parse_date, args)) + [None, None])[:2]
+    except ValueError:
+        await update.message.reply_text(
+            "Использование: /export [csv|jsonl] [с ГГГГ-ММ-ДД] [по ГГГГ-ММ-ДД]\n"
+            "Например: /export csv 2024-01-01 2024-01-31"
+        )
+        return
+    if date_from and date_to and date_from > date_to:
+        await update.message.reply_text("❌ Дата --from позже даты --to")
+        return
+    
+    await update.message.reply_text("⏳ Готовлю выгрузку...")
+    # Выгрузка может идти дольше BOT_DB_STATEMENT_TIMEOUT, поэтому не в пуле потоков ORM
+    document, count, size = await sync_to_async(export_document, thread_sensitive=False)(fmt, date_from, date_to)
+    with document:
+        if size > export.MAX_DOCUMENT_SIZE:
+            await update.message.reply_text(
+                f"❌ Выгрузка ({size // (1024 * 1024)} МБ) больше лимита Telegram на файлы. "
+                f"Сузьте период или используйте manage.py export_transactions."
+            )
+            return
+        
+        name = '_'.join(['transactions'] + [str(day) for day in (date_from, date_to) if day])
+        await update.message.reply_document(
+            document=document,
+            filename=f"{name}.{fmt}",
+            caption=f"📊 Транзакций: {count}",
+        )
+
+# Аналитика продаж
+@db_sync_to_async
+def get_sales_dashboard(telegram_id, days, for_admin):
+    """Продажи за последние дни: по времени, категориям и (для админов) продавцам"""
+    date_from, date_to = analytics.period(days)
+    merchant_id = None if for_admin else telegram_id
+    by_time = analytics.sales_report(date_from, date_to, 'day' if days <= 31 else 'month', merchant_id)
+    by_category = analytics.sales_report(date_from, date_to, 'category', merchant_id, limit=5)
+    
+    top_merchants = []
+    if for_admin:
+        top_merchants = analytics.sales_report(date_from, date_to, 'merchant', limit=5)
+        usernames = dict(TelegramUser.objects.filter(
+            telegram_id__in=[row['key'] for row in top_merchants]
+        ).values_list('telegram_id', 'username'))
+        for row in top_merchants:
+            row['username'] = usernames.get(row['key'])
     
     return {
-        'total': total_users,
-        'clients': clients,
-        'merchants': merchants,
-        'admins': admins
+        'date_from': date_from,
+        'date_to': date_to,
+        'by_time': by_time,
+        'by_category': by_category,
+        'top_merchants': top_merchants,
+        'total': analytics.totals(by_time),
     }
 
+@instrumented
+async def sales_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Продажи за период (админам - все, продавцам - свои): /sales [дней]"""
+    user, _ = await get_or_create_user(update.effective_user)
+    
+    if user.role not in (UserRole.ADMIN, UserRole.MERCHANT):
+        await update.message.reply_text("❌ Статистика продаж доступна продавцам и администраторам.")
+        return
+    
+    try:
+        days = int(context.args[0]) if context.args else 30
+        if not 1 <= days <= analytics.MAX_REPORT_DAYS:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(f"Использование: /sales [дней от 1 до {analytics.MAX_REPORT_DAYS}]")
+        return
+    
+    for_admin = user.role == UserRole.ADMIN
+    report = await get_sales_dashboard(update.effective_user.id, days, for_admin)
+    total = report['total']
+    
+    text = f"📈 **Продажи с {report['date_from']:%d.%m.%Y} по {report['date_to']:%d.%m.%Y}**\n\n"
+    text += f"🧾 Сделок: {total['transactions_count']}\n"
+    text += f"💰 Оборот: {total['amount']:.2f} руб.\n"
+    if for_admin:
+        text += f"💵 Комиссии: {total['fee_amount']:.2f} руб.\n"
+    else:
+        text += f"💵 Вам: {total['merchant_amount']:.2f} руб.\n"
+    
+    if report['by_time']:
+        period_format = '%d.%m' if days <= 31 else '%m.%Y'
+        text += f"\n**По {'дням' if days <= 31 else 'месяцам'}:**\n"
+        for row in report['by_time']:
+            text += f"{row['key']:{period_format}} - {row['transactions_count']} шт., {row['amount']:.2f} руб.\n"
+    
+    if report['by_category']:
+        text += "\n**Категории:**\n"
+        for row in report['by_category']:
+            text += f"📂 {row['key']} - {row['transactions_count']} шт., {row['amount']:.2f} руб.\n"
+    
+    if report['top_merchants']:
+        text += "\n**Продавцы:**\n"
+        for row in report['top_merchants']:
+            text += f"👤 @{row['username'] or row['key']} - {row['transactions_count']} шт., {row['amount']:.2f} руб.\n"
+    
+    for part in moderation.split_message('', text.splitlines()):
+        await update.message.reply_text(part, parse_mode='Markdown')
+
+@instrumented
+async def show_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Следующая страница истории транзакций"""
+    query = update.callback_query
+    await query.answer()
+    
+    # page_<вид>_<ключ последней строки>; кнопки старого вида открывают первую страницу
+    _, kind, cursor = query.data.split('_', 2)
+    cursor = parse_history_cursor(cursor)
+    
+    if kind == 'purchases':
+        await show_my_purchases(update, context, cursor)
+    elif kind == 'sales':
+        await show_my_sales(update, context, cursor)
+    elif kind == 'transactions':
+        await show_transactions(update, context, cursor)
+
+@STATS.cached('users')
+@db_sync_to_async
+@read_from_replica
+def get_users_stats():
+    """Получить статистику пользователей"""
+    from django.db.models import Count, Q
+    
+    # Один запрос вместо отдельного COUNT на каждую роль
+    return TelegramUser.objects.aggregate(
+        total=Count('id'),
+        clients=Count('id', filter=Q(role=UserRole.CLIENT)),
+        merchants=Count('id', filter=Q(role=UserRole.MERCHANT)),
+        admins=Count('id', filter=Q(role=UserRole.ADMIN))
+    )
+
+@instrumented
 async def show_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать пользователей (для админов)"""
     stats = await get_users_stats()
@@ -1070,25 +1445,39 @@ async def show_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(users_text, parse_mode='Markdown')
 
-@sync_to_async
+@STATS.cached('general')
+@db_sync_to_async
+@read_from_replica
 def get_general_stats():
     """Получить общую статистику"""
-    from django.db.models import Sum, Count
-    
-    total_items = Item.objects.filter(is_active=True).count()
-    approved_items = Item.objects.filter(is_approved=True, is_active=True).count()
-    pending_items = Item.objects.filter(is_approved=False, is_active=True).count()
+    from django.db.models import Sum, Count, Q
     
-    total_transactions = Transaction.objects.count()
-    completed_transactions = Transaction.objects.filter(status=TransactionStatus.COMPLETED).count()
-    
-    total_revenue = Transaction.objects.filter(status=TransactionStatus.COMPLETED).aggregate(
-        total=Sum('amount')
-    )['total'] or 0
-    
-    total_fees = Transaction.objects.filter(status=TransactionStatus.COMPLETED).aggregate(
-        total=Sum('fee_amount')
-    )['total'] or 0
+    items = Item.objects.filter(is_active=True).aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(is_approved=True)),
+        pending=Count('id', filter=Q(is_approved=False))
+    )
+    total_items = items['total']
+    approved_items = items['approved']
+    pending_items = items['pending']
+    
+    # Архивные транзакции учитываются наравне с основной таблицей
+    total_transactions = 0
+    completed_transactions = 0
+    total_revenue = 0
+    total_fees = 0
+    completed = Q(status=TransactionStatus.COMPLETED)
+    for model in (Transaction, ArchivedTransaction):
+        totals = model.objects.aggregate(
+            total=Count('id'),
+            count=Count('id', filter=completed),
+            revenue=Sum('amount', filter=completed),
+            fees=Sum('fee_amount', filter=completed)
+        )
+        total_transactions += totals['total']
+        completed_transactions += totals['count']
+        total_revenue += totals['revenue'] or 0
+        total_fees += totals['fees'] or 0
     
     return {
         'total_items': total_items,
@@ -1100,6 +1489,7 @@ def get_general_stats():
         'total_fees': total_fees
     }
 
+@instrumented
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать статистику (для админов)"""
     stats = await get_general_stats()
@@ -1124,6 +1514,7 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(stats_text, parse_mode='Markdown')
 
 # Обработчик текстовых сообщений
+@instrumented
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
     text = update.message.text
@@ -1167,6 +1558,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 # Обработчик callback запросов
+@instrumented
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик callback запросов"""
     query = update.callback_query
@@ -1184,8 +1576,15 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await admin_complete_transaction(update, context)
     elif data.startswith('approve_item_'):
         await admin_approve_item(update, context)
+    elif data.startswith(('reject_item_', 'approve_items_upto_', 'reject_items_upto_')):
+        await admin_bulk_moderate_items(update, context)
+    elif data.startswith(('reject_payment_', 'approve_payments_upto_', 'reject_payments_upto_')):
+        await admin_bulk_moderate_payments(update, context)
+    elif data.startswith('page_'):
+        await show_history_page(update, context)
 
 # Отмена операции
+@instrumented
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отмена текущей операции"""
     user, _ = await get_or_create_user(update.effective_user)
@@ -1194,41 +1593,3 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_main_keyboard(user.role)
     )
     return ConversationHandler.END
-
-# Главная функция запуска бота
-def main():
-    """Запуск бота"""
-    application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
-    
-    # ConversationHandler для добавления товара
-    add_item_conv = ConversationHandler(
-        entry_points=[MessageHandler(filters.Regex('^➕ Добавить товар$'), start_add_item)],
-        states={
-            ADDING_ITEM_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_item_title)],
-            ADDING_ITEM_DESC: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_item_description)],
-            ADDING_ITEM_PRICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_item_price)],
-            ADDING_ITEM_CATEGORY: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_item_category)],
-        },
-        fallbacks=[CommandHandler('cancel', cancel)],
-    )
-    
-    # Обработчики команд
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("profile", profile))
-    
-    # ConversationHandler
-    application.add_handler(add_item_conv)
-    
-    # Обработчики callback
-    application.add_handler(CallbackQueryHandler(handle_callback))
-    
-    # Обработчик текстовых сообщений
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
-    
-    # Запуск бота
-    logger.info("Бот запущен!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
-
-if __name__ == '__main__':
-    main()
@@ -0,0 +1,88 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from bot import analytics
+from bot.archive import archive_batch
+from bot.models import DailySalesRollup, Transaction, TransactionStatus, UserRole
+
+from .utils import make_item, make_transaction, make_user
+
+def rollup_rows():
+    return sorted(DailySalesRollup.objects.values_list(
+        'day', 'merchant__telegram_id', 'category', 'transactions_count', 'amount', 'fee_amount', 'merchant_amount',
+    ))
+
+class RollupTest(TestCase):
+    def setUp(self):
+        self.client_user = make_user(1)
+        self.merchant = make_user(2, UserRole.MERCHANT)
+        self.sword = make_item(self.merchant, price='100.00', category='Оружие')
+        self.diamonds = make_item(self.merchant, price='10.50', category='Ресурсы')
+        self.number = 0
+
+    def complete(self, item, day):
+        """Завершить сделку так же, как complete_transaction: статус и приращение сводки"""
+        self.number += 1
+        transaction = make_transaction(self.client_user, item, self.number)
+        transaction.status = TransactionStatus.COMPLETED
+        transaction.completed_at = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+        transaction.save()
+        analytics.record_sale(transaction)
+        return transaction
+
+    def test_record_sale_increments_day_row(self):
+        day = date(2024, 1, 10)
+        self.complete(self.sword, day)
+        self.complete(self.sword, day)
+        self.complete(self.diamonds, day)
+        self.assertEqual(rollup_rows(), [
+            (day, 2, 'Оружие', 2, Decimal('200.00'), Decimal('11.00'), Decimal('189.00')),
+            (day, 2, 'Ресурсы', 1, Decimal('10.50'), Decimal('0.58'), Decimal('9.92')),
+        ])
+
+    def test_rebuild_matches_incremental_rows(self):
+        for offset in range(3):
+            self.complete(self.sword, date(2024, 1, 10) + timedelta(days=offset))
+            self.complete(self.diamonds, date(2024, 1, 10))
+        # Незавершенные сделки в сводку не попадают
+        make_transaction(self.client_user, self.sword, 100)
+        incremental = rollup_rows()
+
+        self.assertEqual(analytics.rebuild(), 4)
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_category_is_taken_at_purchase(self):
+        day = date(2024, 1, 10)
+        self.complete(self.sword, day)
+        self.sword.category = 'Инструменты'
+        self.sword.save()
+        self.complete(self.sword, day)
+        incremental = rollup_rows()
+
+        analytics.rebuild()
+        self.assertEqual(rollup_rows(), incremental)
+        self.assertEqual([row[2] for row in incremental], ['Инструменты', 'Оружие'])
+
+    def test_rebuild_period_includes_archive(self):
+        first, second = date(2024, 1, 10), date(2024, 1, 11)
+        self.complete(self.sword, first)
+        self.complete(self.sword, second)
+        archive_batch(Transaction.objects.filter(completed_at__date=first), 10)
+        # Строка за второй день разошлась с транзакциями, но вне периода пересчета
+        DailySalesRollup.objects.filter(day=second).update(transactions_count=5)
+        DailySalesRollup.objects.filter(day=first).delete()
+
+        self.assertEqual(analytics.rebuild(first, first), 1)
+        self.assertEqual([(row[0], row[3]) for row in rollup_rows()], [(first, 1), (second, 5)])
+
+    def test_sales_report(self):
+        day = date(2024, 1, 10)
+        self.complete(self.sword, day)
+        self.complete(self.diamonds, day)
+        by_category = analytics.sales_report(day, day, 'category')
+        self.assertEqual([(row['key'], row['amount']) for row in by_category],
+                         [('Оружие', Decimal('100.00')), ('Ресурсы', Decimal('10.50'))])
+        self.assertEqual(analytics.totals(by_category)['transactions_count'], 2)
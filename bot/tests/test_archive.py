@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from bot.archive import (
+    archive_batch, get_archivable_transactions, history_cursor, history_key, paginate_history, parse_history_cursor,
+)
+from bot.models import ArchivedTransaction, Transaction, TransactionStatus, UserRole
+
+from .utils import make_item, make_transaction, make_user
+
+class HistoryPaginationTest(TestCase):
+    def setUp(self):
+        self.client_user = make_user(1)
+        item = make_item(make_user(2, UserRole.MERCHANT))
+        now = timezone.now()
+        for number in range(10):
+            make_transaction(self.client_user, item, number, status=TransactionStatus.COMPLETED)
+        # Пары сделок с одинаковой датой создания: порядок внутри пары задает id
+        for transaction in Transaction.objects.order_by('id'):
+            Transaction.objects.filter(id=transaction.id).update(
+                created_at=now - timedelta(minutes=transaction.id // 2),
+                updated_at=now - timedelta(days=60),
+            )
+
+    def page(self, cursor, limit=3):
+        return paginate_history(
+            Transaction.objects.filter(client=self.client_user),
+            ArchivedTransaction.objects.filter(client=self.client_user),
+            cursor, limit,
+        )
+
+    def expected_keys(self):
+        return sorted((history_key(row) for row in Transaction.objects.all()), reverse=True)
+
+    def test_cursor_round_trip(self):
+        row = Transaction.objects.first()
+        self.assertEqual(parse_history_cursor(history_cursor(row)), history_key(row))
+        self.assertIsNone(parse_history_cursor('30'))
+        self.assertIsNone(parse_history_cursor(None))
+
+    def test_pages_cover_history_once(self):
+        expected = self.expected_keys()
+        seen = []
+        cursor = None
+        while rows := self.page(cursor):
+            seen.extend(history_key(row) for row in rows)
+            cursor = parse_history_cursor(history_cursor(rows[-1]))
+        self.assertEqual(seen, expected)
+
+    def test_archiving_between_pages_does_not_skip_or_repeat(self):
+        expected = self.expected_keys()
+        archivable = get_archivable_transactions(older_than_days=30)
+        seen = []
+        cursor = None
+        while rows := self.page(cursor):
+            seen.extend(history_key(row) for row in rows)
+            cursor = parse_history_cursor(history_cursor(rows[-1]))
+            # Архиватор переносит самые старые сделки до следующей страницы
+            archive_batch(archivable, 4)
+        self.assertEqual(seen, expected)
+        self.assertEqual(ArchivedTransaction.objects.count(), 10)
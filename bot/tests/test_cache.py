@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from bot.cache import CATALOG, Namespace
+from bot.db import ORMExecutor
+from bot.models import UserRole
+
+from .utils import make_item, make_user
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+@override_settings(CACHES=LOCMEM, BOT_CACHE_CATALOG_TIMEOUT=300)
+class NamespaceTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.namespace = Namespace('test', 'BOT_CACHE_CATALOG_TIMEOUT')
+        self.computed = 0
+
+    async def compute(self):
+        self.computed += 1
+        return self.computed
+
+    async def test_value_is_computed_once(self):
+        self.assertEqual(await self.namespace.get_or_set('key', self.compute), 1)
+        self.assertEqual(await self.namespace.get_or_set('key', self.compute), 1)
+
+    async def test_invalidate_bumps_version(self):
+        await self.namespace.get_or_set('key', self.compute)
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertEqual(await self.namespace.get_or_set('key', self.compute), 2)
+        # Другие пространства не сбрасываются
+        other = Namespace('other', 'BOT_CACHE_CATALOG_TIMEOUT')
+        other.set('key', 'value')
+        self.namespace.invalidate()
+        self.assertEqual(other.get('key'), 'value')
+
+    async def test_value_computed_before_invalidate_is_stale(self):
+        async def compute_during_invalidate():
+            # Товар изменили, пока значение вычислялось
+            self.namespace.invalidate()
+            return 'old'
+
+        self.assertEqual(await self.namespace.get_or_set('key', compute_during_invalidate), 'old')
+        self.assertEqual(await self.namespace.get_or_set('key', self.compute), 1)
+
+    async def test_evicted_version_does_not_revive_entries(self):
+        # Запись без версии (до первого обращения) и запись, чью версию вытеснили
+        cache.set(self.namespace._key('old'), (None, 'stale'))
+        self.assertIsNone(self.namespace.get('old'))
+        self.assertEqual(await self.namespace.get_or_set('key', self.compute), 1)
+
+        cache.delete(self.namespace._version_key)
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertEqual(await self.namespace.get_or_set('key', self.compute), 2)
+        self.assertEqual(self.namespace.get('key'), 2)
+
+    async def test_cached_key_includes_arguments(self):
+        calls = []
+
+        @self.namespace.cached('page')
+        async def page(offset, limit=10):
+            calls.append((offset, limit))
+            return offset
+
+        await page(0), await page(0), await page(10), await page(0, limit=5)
+        self.assertEqual(calls, [(0, 10), (10, 10), (0, 5)])
+
+    async def test_waiters_do_not_occupy_orm_threads(self):
+        executor = ORMExecutor(1, timeout=1)
+
+        @self.namespace.cached('slow')
+        async def slow():
+            return await executor.run(lambda: time.sleep(0.1) or 'value')
+
+        results = await asyncio.gather(*(slow() for _ in range(10)))
+        self.assertEqual(results, ['value'] * 10)
+        # Ожидающие не ставят вызовы в очередь ORM: поток занят только вычислением
+        snapshot = executor.snapshot()
+        self.assertEqual((snapshot['submitted_total'], snapshot['wait_seconds_max'] < 0.05), (1, True))
+
+    @override_settings(BOT_CACHE_LOCK_WAIT=0.1)
+    async def test_computes_itself_when_lock_holder_is_gone(self):
+        cache.add(f"{self.namespace._key('key')}:lock", 1)
+        with self.assertLogs('bot.cache', 'WARNING'):
+            self.assertEqual(await self.namespace.get_or_set('key', self.compute), 1)
+
+@override_settings(CACHES=LOCMEM)
+class CatalogInvalidationTest(TestCase):
+    def test_item_change_invalidates_catalog(self):
+        cache.clear()
+        CATALOG.set('items', ['cached'])
+        with self.captureOnCommitCallbacks(execute=True):
+            make_item(make_user(1, UserRole.MERCHANT))
+        self.assertIsNone(CATALOG.get('items'))
@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from bot.db import ORMExecutor, ORMTimeout
+
+class ORMExecutorTimeoutTest(SimpleTestCase):
+    async def test_running_call_is_not_timed_out(self):
+        executor = ORMExecutor(1, timeout=0.05)
+        result = await executor.run(lambda: time.sleep(0.2) or 'done')
+        self.assertEqual(result, 'done')
+        self.assertEqual(executor.snapshot()['timeouts_total'], 0)
+
+    async def test_queue_wait_is_timed_out_and_call_dropped(self):
+        executor = ORMExecutor(1, timeout=0.05)
+        release = threading.Event()
+        ran = []
+        busy = asyncio.ensure_future(executor.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+
+        with self.assertRaises(ORMTimeout):
+            await executor.run(ran.append, 'queued')
+        release.set()
+        self.assertTrue(await busy)
+        # Снятый с очереди вызов не выполняется и после освобождения потока
+        await executor.run(lambda: None)
+        self.assertEqual(ran, [])
+        snapshot = executor.snapshot()
+        self.assertEqual((snapshot['timeouts_total'], snapshot['queued'], snapshot['running']), (1, 0, 0))
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from bot.models import Item, TelegramUser, Transaction
+from exchange import db_router
+from exchange.db_router import REPLICA_DB_ALIAS, ReplicaRouter, replica_reads, set_current_user
+
+@mock.patch('exchange.db_router.replica_configured', lambda: True)
+@override_settings(
+    DATABASE_REPLICA_STICKY_SECONDS=10,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        cache.clear()
+        db_router._sticky_until.clear()
+        set_current_user(None)
+
+    def test_unmarked_reads_use_primary(self):
+        set_current_user(1)
+        self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_marked_reads_use_replica(self):
+        set_current_user(1)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Item), REPLICA_DB_ALIAS)
+
+    def test_no_replica_configured(self):
+        with mock.patch('exchange.db_router.replica_configured', lambda: False), replica_reads():
+            self.assertIsNone(self.router.db_for_read(Item))
+
+    def test_write_pins_user_to_primary(self):
+        set_current_user(1)
+        self.assertEqual(self.router.db_for_write(Transaction), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Item), 'default')
+            # Другой пользователь по-прежнему читает с реплики
+            set_current_user(2)
+            self.assertEqual(self.router.db_for_read(Item), REPLICA_DB_ALIAS)
+
+    def test_write_to_other_models_does_not_pin(self):
+        set_current_user(1)
+        self.router.db_for_write(TelegramUser)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Item), REPLICA_DB_ALIAS)
+
+    def test_pin_is_shared_between_processes(self):
+        set_current_user(1)
+        self.router.db_for_write(Item)
+        # Другой процесс не видит локальных закреплений, только кеш
+        db_router._sticky_until.clear()
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Item), 'default')
+        cache.delete(db_router._sticky_key(1))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Item), REPLICA_DB_ALIAS)
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from bot import dedup
+from bot.dedup import CacheStore, DatabaseStore, UpdateDedup, UpdateRing
+from bot.models import ProcessedUpdate
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+class ExtractUpdateIdTest(SimpleTestCase):
+    def test_update_id(self):
+        body = b'{"message": {"text": "\\"update_id\\": 1"}, "update_id": 42}'
+        self.assertEqual(dedup.extract_update_id(body), 42)
+        self.assertIsNone(dedup.extract_update_id(b'{"message": {}}'))
+
+class UpdateRingTest(SimpleTestCase):
+    def test_claim_release_redelivery(self):
+        ring = UpdateRing(2)
+        self.assertTrue(ring.claim(1))
+        self.assertFalse(ring.claim(1))
+        ring.release(1)
+        self.assertTrue(ring.claim(1))
+
+    def test_window_is_bounded(self):
+        ring = UpdateRing(2)
+        for update_id in (1, 2, 3):
+            ring.claim(update_id)
+        self.assertTrue(ring.claim(1))
+
+class StoreTestMixin:
+    def new_dedup(self):
+        """Отдельный процесс: своё окно, общее хранилище"""
+        return UpdateDedup(UpdateRing(100), self.store)
+
+    def test_redelivery_to_another_worker_is_dropped(self):
+        self.assertTrue(self.new_dedup().claim(1))
+        self.assertFalse(self.new_dedup().claim(1))
+
+    def test_release_lets_redelivery_through(self):
+        first = self.new_dedup()
+        self.assertTrue(first.claim(1))
+        first.release(1)
+        self.assertTrue(self.new_dedup().claim(1))
+
+class DatabaseStoreTest(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.store = DatabaseStore(ttl=60)
+
+    def test_claim_inside_transaction(self):
+        self.assertTrue(self.store.claim(1))
+        # Повтор внутри транзакции не ломает ее (savepoint)
+        self.assertFalse(self.store.claim(1))
+        self.assertEqual(ProcessedUpdate.objects.count(), 1)
+
+@override_settings(CACHES=LOCMEM)
+class CacheStoreTest(StoreTestMixin, SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = CacheStore(ttl=60)
+
+class StoreFailureTest(SimpleTestCase):
+    def test_unavailable_store_does_not_stop_updates(self):
+        store = mock.Mock(spec=CacheStore, **{'claim.side_effect': ConnectionError})
+        store.name = 'cache'
+        with self.assertLogs('bot.dedup', 'ERROR'):
+            self.assertTrue(UpdateDedup(UpdateRing(10), store).claim(1))
+
+@mock.patch('bot.dedup._dedup', None)
+class GetDedupTest(SimpleTestCase):
+    @override_settings(BOT_UPDATE_DEDUP_BACKEND='cache', CACHES=LOCMEM)
+    def test_cache_store_requires_atomic_backend(self):
+        with self.assertRaisesMessage(ValueError, 'Redis или memcached'):
+            dedup.get_dedup()
+
+    @override_settings(BOT_UPDATE_DEDUP_BACKEND='cache', CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'}})
+    def test_cache_store_with_redis(self):
+        self.assertIsInstance(dedup.get_dedup().store, CacheStore)
+
+    @override_settings(BOT_UPDATE_DEDUP_BACKEND='memory')
+    def test_memory(self):
+        self.assertIsNone(dedup.get_dedup().store)
@@ -0,0 +1,31 @@
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from bot import telegram_bot
+
+class ExportCommandTest(SimpleTestCase):
+    async def export(self, *args):
+        update = mock.MagicMock()
+        update.message.reply_text = mock.AsyncMock()
+        update.message.reply_document = mock.AsyncMock()
+        context = mock.MagicMock(args=list(args))
+        with mock.patch('bot.telegram_bot.is_admin', mock.AsyncMock(return_value=True)), \
+                mock.patch('bot.telegram_bot.export_document', return_value=(mock.MagicMock(), 0, 0)) as export_document:
+            await telegram_bot.export_command(update, context)
+        return update.message.reply_text, export_document
+
+    async def test_from_after_to_is_rejected(self):
+        reply, export_document = await self.export('csv', '2024-02-01', '2024-01-01')
+        reply.assert_awaited_once_with("❌ Дата --from позже даты --to")
+        export_document.assert_not_called()
+
+    async def test_bad_date_shows_usage(self):
+        reply, export_document = await self.export('2024-13-01')
+        self.assertIn('Использование', reply.await_args.args[0])
+        export_document.assert_not_called()
+
+    async def test_period_is_passed_to_export(self):
+        _, export_document = await self.export('jsonl', '2024-01-01', '2024-01-01')
+        export_document.assert_called_once_with('jsonl', date(2024, 1, 1), date(2024, 1, 1))
@@ -0,0 +1,110 @@
+import io
+import json
+import threading
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from bot import item_import
+from bot.item_import import ItemImportError, import_items, validate
+from bot.models import Item, UserRole
+
+from .utils import make_item, make_user
+
+def document(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+def jsonl(*records):
+    return '\n'.join(json.dumps(record, ensure_ascii=False) for record in records)
+
+def record(title='Алмазы', price='10', **fields):
+    return {'title': title, 'description': 'Описание', 'price': price, 'category': 'Ресурсы', **fields}
+
+class ValidateTest(SimpleTestCase):
+    def test_price_bounds(self):
+        self.assertEqual(validate(record(price='0,5'))[0]['price'], item_import.Decimal('0.50'))
+        self.assertEqual(validate(record(price='99999999.99'))[0]['price'], item_import.Decimal('99999999.99'))
+        for price in ('0', '-1', '100000000', 'NaN', 'Infinity', 'дорого'):
+            fields, error = validate(record(price=price))
+            self.assertIsNone(fields, price)
+            self.assertIn('цен', error)
+
+    def test_fields(self):
+        self.assertIn('description', validate(record(description=' '))[1])
+        self.assertIn('название', validate(record(title='x' * 256))[1])
+        self.assertEqual(validate(['Алмазы'])[1], "не объект с полями товара")
+
+class ImportItemsTest(TestCase):
+    def setUp(self):
+        self.merchant = make_user(1, UserRole.MERCHANT, approved_items_count=5)
+
+    def test_csv_with_bom(self):
+        text = '\ufefftitle,description,price,category\nАлмазы,Описание,"10,50",Ресурсы\n'
+        result = import_items(1, document(text), 'csv')
+        self.assertEqual([(item['title'], item['price']) for item in result.created],
+                         [('Алмазы', item_import.Decimal('10.50'))])
+        self.assertFalse(Item.objects.get().is_approved)
+
+    def test_csv_without_columns(self):
+        with self.assertRaisesMessage(ItemImportError, 'description'):
+            import_items(1, document('title,price,category\nАлмазы,10,Ресурсы\n'), 'csv')
+
+    def test_json_array(self):
+        text = '  ' + json.dumps([record('Меч'), record('Лук')], ensure_ascii=False)
+        result = import_items(1, document(text), 'json')
+        self.assertEqual([item['title'] for item in result.created], ['Меч', 'Лук'])
+
+    def test_broken_json_array(self):
+        with self.assertRaises(ItemImportError):
+            import_items(1, document('[{"title": "Меч"'), 'json')
+
+    def test_jsonl_with_bad_lines(self):
+        text = jsonl(record('Меч')) + '\n{не json\n\n' + jsonl(record('Лук', price='0'), ['Кирка'], record('Кирка'))
+        result = import_items(1, document(text), 'jsonl', batch_size=1)
+        self.assertEqual([item['title'] for item in result.created], ['Меч', 'Кирка'])
+        self.assertEqual(result.invalid, 3)
+        self.assertEqual([error.split(':')[0] for error in result.errors], ['Строка 2', 'Строка 4', 'Строка 5'])
+
+    def test_over_limit(self):
+        make_item(self.merchant)
+        make_item(self.merchant, is_active=False)
+        result = import_items(1, document(jsonl(*(record(f'Товар {i}') for i in range(6)))), 'jsonl')
+        # Неактивные товары лимит не занимают
+        self.assertEqual((len(result.created), result.over_limit), (4, 2))
+        report = item_import.format_import_report(result, 5)
+        self.assertIn('сверх лимита активных товаров (5 шт.): 2', report)
+
+    def test_second_upload_counts_first(self):
+        import_items(1, document(jsonl(record(), record())), 'jsonl')
+        result = import_items(1, document(jsonl(*(record() for _ in range(4)))), 'jsonl')
+        self.assertEqual((len(result.created), result.over_limit), (3, 1))
+
+    def test_not_a_merchant(self):
+        make_user(2)
+        with self.assertRaisesMessage(ItemImportError, 'Продавец не найден'):
+            import_items(2, document(jsonl(record())), 'jsonl')
+
+class ConcurrentImportTest(TransactionTestCase):
+    """Блокировка продавца: одновременные загрузки не превышают лимит"""
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_uploads_respect_limit(self):
+        make_user(1, UserRole.MERCHANT, approved_items_count=5)
+        barrier = threading.Barrier(2)
+        results = []
+
+        def upload():
+            try:
+                barrier.wait()
+                results.append(import_items(1, document(jsonl(*(record() for _ in range(4)))), 'jsonl'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=upload) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted((len(result.created), result.over_limit) for result in results), [(1, 3), (4, 0)])
+        self.assertEqual(Item.objects.count(), 5)
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from bot import checks, levels
+from bot.models import MerchantLevel, TelegramUser, UserRole
+from bot.telegram_bot import help_command
+
+from .utils import make_user
+
+THRESHOLDS = {'SILVER': 1500, 'GOLD': 4000, 'PLATINUM': 8000}
+
+class LevelForTest(SimpleTestCase):
+    def test_thresholds(self):
+        for experience_points, level in ((0, MerchantLevel.BRONZE), (1999, MerchantLevel.BRONZE),
+                                         (2000, MerchantLevel.SILVER), (5000, MerchantLevel.GOLD),
+                                         (10000, MerchantLevel.PLATINUM)):
+            with self.subTest(experience_points=experience_points):
+                self.assertEqual(levels.level_for(experience_points), level)
+
+    def test_invalid(self):
+        for thresholds in ({'DIAMOND': 1}, {'BRONZE': 1}, {'GOLD': 0}, {'GOLD': '5000'},
+                           {'SILVER': 5000, 'GOLD': 2000}):
+            with self.subTest(thresholds=thresholds), override_settings(MERCHANT_LEVEL_THRESHOLDS=thresholds):
+                with self.assertRaises(ValueError):
+                    levels.level_thresholds()
+                self.assertEqual([error.id for error in checks.check_level_thresholds(None)], ['bot.E002'])
+
+    def test_valid_check(self):
+        self.assertEqual(checks.check_level_thresholds(None), [])
+
+class LevelExpressionTest(TestCase):
+    """Уровень, посчитанный базой CASE, совпадает с level_for"""
+
+    def test_record_sale_crosses_threshold(self):
+        merchant = make_user(100, UserRole.MERCHANT, experience_points=1900)
+        levels.record_sale(merchant.id, 250)
+        merchant.refresh_from_db()
+        self.assertEqual((merchant.experience_points, merchant.total_transactions), (2000, 1))
+        self.assertEqual(merchant.total_sales, 250)
+        self.assertEqual(merchant.merchant_level, MerchantLevel.SILVER)
+
+    def test_recompute_after_threshold_change(self):
+        for index, experience_points in enumerate((0, 1500, 3900, 4000, 8000, 12000)):
+            make_user(100 + index, UserRole.MERCHANT, experience_points=experience_points,
+                      merchant_level=levels.level_for(experience_points))
+        # У покупателя уровня нет и пересчет его не трогает
+        client = make_user(1, experience_points=9000, merchant_level=None)
+        self.assertEqual(levels.recompute_levels(), 0)
+
+        with override_settings(MERCHANT_LEVEL_THRESHOLDS=THRESHOLDS):
+            changed = levels.recompute_levels(dry_run=True)
+            self.assertEqual(changed, 3)
+            self.assertEqual(levels.recompute_levels(), changed)
+            for merchant in TelegramUser.objects.filter(role=UserRole.MERCHANT):
+                self.assertEqual(merchant.merchant_level, levels.level_for(merchant.experience_points))
+            self.assertEqual(levels.recompute_levels(dry_run=True), 0)
+
+        client.refresh_from_db()
+        self.assertIsNone(client.merchant_level)
+
+class HelpTest(SimpleTestCase):
+    async def help_text(self):
+        update = mock.MagicMock()
+        update.message.reply_text = mock.AsyncMock()
+        await help_command(update, mock.MagicMock())
+        return update.message.reply_text.call_args.args[0]
+
+    @override_settings(MERCHANT_LEVEL_THRESHOLDS=THRESHOLDS)
+    async def test_levels_from_settings(self):
+        text = await self.help_text()
+        self.assertIn("🥉 Бронза: 0-1499 XP\n🥈 Серебро: 1500-3999 XP\n🥇 Золото: 4000-7999 XP\n💎 Платина: 8000+ XP", text)
+        self.assertIn(f"За каждую продажу: +{levels.SALE_XP} XP", text)
@@ -0,0 +1,164 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from bot import moderation
+from bot.models import Item, Transaction, TransactionStatus, UserRole
+from bot.telegram_bot import admin_bulk_moderate_items, admin_bulk_moderate_payments
+
+from .utils import make_item, make_transaction, make_user
+
+make_user_async = sync_to_async(make_user)
+make_item_async = sync_to_async(make_item)
+make_transaction_async = sync_to_async(make_transaction)
+approved_ids = sync_to_async(lambda: list(Item.objects.filter(is_approved=True).values_list('id', flat=True)))
+cancelled_ids = sync_to_async(lambda: list(
+    Transaction.objects.filter(status=TransactionStatus.CANCELLED).values_list('id', flat=True)))
+
+def fake_bot():
+    return mock.MagicMock(send_message=mock.AsyncMock())
+
+class ModerateItemsTest(TestCase):
+    def setUp(self):
+        self.merchants = [make_user(100, UserRole.MERCHANT), make_user(101, UserRole.MERCHANT)]
+
+    def test_up_to_id_excludes_items_added_after_list(self):
+        shown = [make_item(merchant, is_approved=False) for merchant in self.merchants]
+        added = make_item(self.merchants[0], is_approved=False)
+
+        with mock.patch.object(moderation.CATALOG, 'invalidate') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            grouped = moderation.approve_items(up_to_id=shown[-1].id)
+        invalidate.assert_called_once_with()
+
+        self.assertEqual({key: [row['id'] for row in rows] for key, rows in grouped.items()},
+                         {100: [shown[0].id], 101: [shown[1].id]})
+        self.assertEqual(set(Item.objects.filter(is_approved=True).values_list('id', flat=True)),
+                         {item.id for item in shown})
+        self.assertFalse(Item.objects.get(id=added.id).is_approved)
+
+    def test_already_moderated_items_are_skipped(self):
+        approved = make_item(self.merchants[0])
+        inactive = make_item(self.merchants[0], is_approved=False, is_active=False)
+        pending = make_item(self.merchants[0], is_approved=False)
+
+        grouped = moderation.reject_items(item_ids=[approved.id, inactive.id, pending.id])
+        self.assertEqual([row['id'] for row in grouped[100]], [pending.id])
+        self.assertEqual(set(Item.objects.filter(is_active=False).values_list('id', flat=True)),
+                         {inactive.id, pending.id})
+        # Одобренный товар отклонение не снимает
+        self.assertTrue(Item.objects.get(id=approved.id).is_active)
+
+    def test_nothing_to_moderate(self):
+        with mock.patch.object(moderation.CATALOG, 'invalidate') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(moderation.approve_items(up_to_id=10), {})
+        invalidate.assert_not_called()
+
+class ModeratePaymentsTest(TestCase):
+    def setUp(self):
+        self.client_user = make_user(1)
+        self.merchant = make_user(100, UserRole.MERCHANT, total_sales=500, experience_points=300)
+        item = make_item(self.merchant)
+        self.paid = [make_transaction(self.client_user, item, number, TransactionStatus.PAYMENT_CONFIRMED)
+                     for number in (1, 2)]
+        self.unpaid = make_transaction(self.client_user, item, 3)
+        self.checked = make_transaction(self.client_user, item, 4, TransactionStatus.PAYMENT_CONFIRMED,
+                                        merchant_contact='@user100')
+        self.added = make_transaction(self.client_user, item, 5, TransactionStatus.PAYMENT_CONFIRMED)
+        self.up_to_id = self.checked.id
+
+    def test_approve_skips_other_statuses_and_later_payments(self):
+        transactions = moderation.approve_payments(up_to_id=self.up_to_id)
+        self.assertCountEqual([t.id for t in transactions], [t.id for t in self.paid])
+        self.assertEqual(set(Transaction.objects.filter(client_contact='@user1').values_list('id', flat=True)),
+                         {t.id for t in self.paid})
+        self.assertIsNone(Transaction.objects.get(id=self.added.id).merchant_contact)
+
+    def test_reject_cancels_without_touching_balances(self):
+        grouped = moderation.reject_payments(up_to_id=self.up_to_id)
+        self.assertCountEqual([row['id'] for row in grouped[1]], [t.id for t in self.paid])
+
+        statuses = dict(Transaction.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {
+            self.paid[0].id: TransactionStatus.CANCELLED,
+            self.paid[1].id: TransactionStatus.CANCELLED,
+            self.unpaid.id: TransactionStatus.PENDING_PAYMENT,
+            self.checked.id: TransactionStatus.PAYMENT_CONFIRMED,
+            self.added.id: TransactionStatus.PAYMENT_CONFIRMED,
+        })
+        self.merchant.refresh_from_db()
+        self.assertEqual((self.merchant.total_sales, self.merchant.experience_points, self.merchant.total_transactions),
+                         (500, 300, 0))
+
+class NotificationTest(SimpleTestCase):
+    async def test_one_notification_per_merchant_split_past_limit(self):
+        bot = fake_bot()
+        grouped = {
+            100: [{'id': 1, 'title': 'Алмазы', 'price': '10.00'}],
+            101: [{'id': i, 'title': f'Товар {i} ' + 'x' * 200, 'price': '10.00'} for i in range(50)],
+        }
+        sent = await moderation.notify_items_moderated(bot, grouped)
+
+        messages = {}
+        for call in bot.send_message.call_args_list:
+            messages.setdefault(call.kwargs['chat_id'], []).append(call.kwargs['text'])
+        self.assertEqual(sent, bot.send_message.call_count)
+        self.assertEqual(len(messages[100]), 1)
+        self.assertGreater(len(messages[101]), 1)
+        self.assertTrue(all(len(text) <= moderation.MESSAGE_LIMIT for text in messages[101]))
+        text = ''.join(messages[101])
+        for item in grouped[101]:
+            self.assertEqual(text.count(f"Товар {item['id']} "), 1)
+
+    async def test_failed_send_does_not_stop_others(self):
+        bot = fake_bot()
+        bot.send_message.side_effect = [Exception('blocked'), None]
+        grouped = {100: [{'title': 'Алмазы', 'price': '10.00'}], 101: [{'title': 'Алмазы', 'price': '10.00'}]}
+        with self.assertLogs('bot.moderation', 'ERROR'):
+            self.assertEqual(await moderation.notify_items_moderated(bot, grouped, approved=False), 1)
+        self.assertEqual(bot.send_message.call_args.kwargs['chat_id'], 101)
+
+@override_settings(BOT_ORM_WORKERS=0)
+@mock.patch('bot.db._executor', None)
+@mock.patch('bot.telegram_bot.is_admin', mock.AsyncMock(return_value=True))
+class BulkCallbackTest(TransactionTestCase):
+    """Кнопки "все до ID" из списка модерации"""
+
+    def callback(self, data):
+        update = mock.MagicMock()
+        update.callback_query.data = data
+        update.callback_query.answer = mock.AsyncMock()
+        update.callback_query.message.edit_text = mock.AsyncMock()
+        context = mock.MagicMock()
+        context.bot = fake_bot()
+        return update, context
+
+    async def test_approve_items_upto(self):
+        merchant = await make_user_async(100, UserRole.MERCHANT)
+        shown = await make_item_async(merchant, is_approved=False)
+        # Товар пришел после показа списка
+        await make_item_async(merchant, is_approved=False)
+
+        update, context = self.callback(f'approve_items_upto_{shown.id}')
+        await admin_bulk_moderate_items(update, context)
+
+        update.callback_query.message.edit_text.assert_awaited_once_with(
+            "✅ Одобрено товаров: 1. Уведомлено продавцов: 1.")
+        context.bot.send_message.assert_awaited_once()
+        self.assertEqual(context.bot.send_message.call_args.kwargs['chat_id'], 100)
+        self.assertEqual(await approved_ids(), [shown.id])
+
+    async def test_reject_payments_upto(self):
+        client = await make_user_async(1)
+        item = await make_item_async(await make_user_async(100, UserRole.MERCHANT))
+        shown = await make_transaction_async(client, item, 1, TransactionStatus.PAYMENT_CONFIRMED)
+        await make_transaction_async(client, item, 2, TransactionStatus.PAYMENT_CONFIRMED)
+
+        update, context = self.callback(f'reject_payments_upto_{shown.id}')
+        await admin_bulk_moderate_payments(update, context)
+
+        update.callback_query.message.edit_text.assert_awaited_once_with("❌ Отклонено платежей: 1.")
+        self.assertEqual(context.bot.send_message.call_args.kwargs['chat_id'], 1)
+        self.assertEqual(await cancelled_ids(), [shown.id])
@@ -0,0 +1,130 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from telegram import Update
+
+from bot import polling
+from bot.polling import ChatOrderedUpdateProcessor
+
+def message_update(update_id, chat_id):
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': 'text',
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+        },
+    }, None)
+
+class ChatOrderedUpdateProcessorTest(SimpleTestCase):
+    async def processor(self, concurrency=4):
+        processor = ChatOrderedUpdateProcessor(concurrency)
+        await processor.initialize()
+        return processor
+
+    async def test_one_chat_in_order_other_chats_in_parallel(self):
+        processor = await self.processor()
+        log = []
+        release = asyncio.Event()
+
+        async def handle(name, wait=False):
+            log.append(f'{name} start')
+            if wait:
+                await release.wait()
+            log.append(f'{name} end')
+
+        first = asyncio.ensure_future(processor.process_update(message_update(1, 10), handle('a1', wait=True)))
+        second = asyncio.ensure_future(processor.process_update(message_update(2, 10), handle('a2')))
+        other = asyncio.ensure_future(processor.process_update(message_update(3, 20), handle('b1')))
+        await other
+        # Другой чат обработан, пока первое обновление чата 10 еще ждет
+        self.assertEqual(log, ['a1 start', 'b1 start', 'b1 end'])
+        self.assertEqual(processor.in_flight, 2)
+
+        release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(log, ['a1 start', 'b1 start', 'b1 end', 'a1 end', 'a2 start', 'a2 end'])
+
+    async def test_chat_queues_are_cleaned_up(self):
+        processor = await self.processor()
+
+        async def handle():
+            await asyncio.sleep(0)
+
+        await asyncio.gather(*(processor.process_update(message_update(i, i % 3), handle()) for i in range(9)))
+        self.assertEqual(processor._chats, {})
+        self.assertEqual(processor.in_flight, 0)
+        await asyncio.wait_for(processor.wait_idle(), 1)
+
+    async def test_error_does_not_stall_chat(self):
+        processor = await self.processor()
+        processed = []
+
+        async def fail():
+            raise ValueError('boom')
+
+        async def handle(update_id):
+            processed.append(update_id)
+
+        results = await asyncio.gather(
+            processor.process_update(message_update(1, 10), fail()),
+            processor.process_update(message_update(2, 10), handle(2)),
+            processor.process_update(message_update(3, 10), handle(3)),
+            return_exceptions=True,
+        )
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(processed, [2, 3])
+        self.assertEqual(processor._chats, {})
+
+    async def test_concurrency_limit(self):
+        processor = await self.processor(concurrency=2)
+        running = []
+        peak = []
+
+        async def handle():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        await asyncio.gather(*(processor.process_update(message_update(i, i), handle()) for i in range(6)))
+        self.assertEqual(max(peak), 2)
+
+@override_settings(BOT_POLLING_DRAIN_TIMEOUT=0.2)
+class DrainTest(SimpleTestCase):
+    async def application(self):
+        processor = ChatOrderedUpdateProcessor(4)
+        await processor.initialize()
+        application = mock.MagicMock(update_processor=processor)
+        application.updater.stop = mock.AsyncMock()
+        application.stop = mock.AsyncMock()
+        return application
+
+    @mock.patch('bot.polling.metrics.dump')
+    async def test_waits_for_updates_in_flight(self, dump):
+        application = await self.application()
+        done = []
+
+        async def handle():
+            await asyncio.sleep(0.05)
+            done.append(True)
+
+        update = asyncio.ensure_future(application.update_processor.process_update(message_update(1, 10), handle()))
+        await asyncio.sleep(0)
+        await polling._drain(application)
+        self.assertEqual(done, [True])
+        application.updater.stop.assert_awaited_once()
+        application.stop.assert_awaited_once()
+        await update
+
+    @mock.patch('bot.polling.metrics.dump')
+    async def test_gives_up_after_timeout(self, dump):
+        application = await self.application()
+        update = asyncio.ensure_future(
+            application.update_processor.process_update(message_update(1, 10), asyncio.sleep(5)))
+        await asyncio.sleep(0)
+        with self.assertLogs('bot.polling', 'ERROR'):
+            await polling._drain(application)
+        application.stop.assert_awaited_once()
+        update.cancel()
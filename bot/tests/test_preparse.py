@@ -0,0 +1,99 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, MessageHandler, TypeHandler, filters
+
+from bot import preparse, ratelimit
+
+async def noop(update, context):
+    pass
+
+def message_body(text, user_id=7, **message):
+    return json.dumps({'update_id': 1, 'message': {
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+        **message,
+    }}).encode()
+
+def callback_body(data, user_id=7):
+    return json.dumps({'update_id': 2, 'callback_query': {
+        'id': '55', 'chat_instance': '1', 'data': data,
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+        'message': {'message_id': 1, 'date': 0, 'chat': {'id': -100, 'type': 'group'}},
+    }}).encode()
+
+class UpdateInfoTest(SimpleTestCase):
+    def test_callback_fields(self):
+        info = preparse.UpdateInfo(json.loads(callback_body('buy_5')))
+        self.assertEqual((info.update_id, info.type, info.user_id, info.chat_id), (2, 'callback_query', 7, -100))
+        self.assertEqual((info.callback_data, info.callback_query_id), ('buy_5', '55'))
+        self.assertEqual(info.action(), ratelimit.classify(callback_data='buy_5', is_callback=True))
+
+    def test_message_fields(self):
+        info = preparse.UpdateInfo(json.loads(message_body('/start')))
+        self.assertEqual((info.type, info.user_id, info.chat_id, info.text), ('message', 7, 7, '/start'))
+        self.assertIsNone(info.callback_query_id)
+
+# Обращение к базе в SimpleTestCase - ошибка теста: отброшенные обновления до ORM не доходят
+@override_settings(BOT_RATELIMIT_ENABLED=True)
+@mock.patch('bot.preparse.Update.de_json')
+@mock.patch('bot.preparse.ratelimit.check')
+class DispatchTest(SimpleTestCase):
+    def setUp(self):
+        self.application = mock.MagicMock(process_update=mock.AsyncMock())
+        self.application.handlers = {
+            -2: [TypeHandler(Update, noop)],
+            0: [CallbackQueryHandler(noop), MessageHandler(filters.TEXT, noop)],
+        }
+
+    async def test_unsubscribed_type_is_dropped(self, check, de_json):
+        body = json.dumps({'update_id': 3, 'edited_message': json.loads(message_body('hi'))['message']}).encode()
+        self.assertEqual(await preparse.dispatch(self.application, body), 'unsubscribed')
+        check.assert_not_called()
+        de_json.assert_not_called()
+        self.application.process_update.assert_not_called()
+
+    async def test_rate_limited_user_is_dropped(self, check, de_json):
+        check.return_value = False
+        self.assertEqual(await preparse.dispatch(self.application, callback_body('buy_5')), 'rate_limited')
+        check.assert_awaited_once_with(
+            self.application.bot, 7, ratelimit.classify(callback_data='buy_5', is_callback=True),
+            chat_id=-100, callback_query_id='55',
+        )
+        de_json.assert_not_called()
+        self.application.process_update.assert_not_called()
+
+    async def test_allowed_update_is_parsed_once(self, check, de_json):
+        check.return_value = True
+        self.assertEqual(await preparse.dispatch(self.application, message_body('/start')), 'processed')
+        de_json.assert_called_once_with(json.loads(message_body('/start')), self.application.bot)
+        self.application.process_update.assert_awaited_once_with(de_json.return_value)
+
+    @override_settings(BOT_RATELIMIT_ENABLED=False)
+    async def test_ratelimit_disabled(self, check, de_json):
+        self.assertEqual(await preparse.dispatch(self.application, message_body('hi')), 'processed')
+        check.assert_not_called()
+
+    async def test_malformed_payload_falls_back_to_full_parsing(self, check, de_json):
+        bodies = [
+            message_body('hi', **{'from': 'user'}),
+            message_body(['not', 'text']),
+            json.dumps({'update_id': 4, 'callback_query': {'id': '1', 'data': 5, 'from': {'id': 7}}}).encode(),
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                de_json.reset_mock()
+                with self.assertLogs('bot.preparse', 'WARNING'):
+                    self.assertEqual(await preparse.dispatch(self.application, body), 'processed')
+                de_json.assert_called_once_with(json.loads(body), self.application.bot)
+        # Лимит таких обновлений проверит обработчик rate_limit после разбора
+        check.assert_not_called()
+
+    async def test_non_dict_payload_is_processed_without_limit(self, check, de_json):
+        body = json.dumps({'update_id': 5, 'message': 5}).encode()
+        self.assertEqual(await preparse.dispatch(self.application, body), 'processed')
+        check.assert_not_called()
+        de_json.assert_called_once()
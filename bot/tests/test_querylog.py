@@ -0,0 +1,132 @@
+import itertools
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from bot import archive, instrumentation, querylog
+from bot.application import create_application
+from bot.db import db_sync_to_async
+from bot.models import Transaction, TransactionStatus, UserRole
+
+from .utils import make_item, make_transaction, make_user
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+_ids = itertools.count(1)
+
+@db_sync_to_async
+def run_queries(count):
+    with connection.cursor() as cursor:
+        for _ in range(count):
+            cursor.execute('SELECT 1')
+
+async def budget_probe(update, context):
+    await run_queries(update['queries'])
+
+@override_settings(TELEGRAM_FAKE_API=True, BOT_ORM_WORKERS=0, BOT_SQL_QUERY_BUDGETS={'budget_probe': 1})
+@mock.patch('bot.db._executor', None)
+class QueryBudgetTest(TransactionTestCase):
+    async def application(self):
+        builder = instrumentation.apply_to_builder(Application.builder().token('123:TEST'))
+        application = builder.build()
+        application.add_handler(TypeHandler(dict, budget_probe))
+        instrumentation.instrument_handlers(application)
+        await application.initialize()
+        return application
+
+    async def test_within_budget(self):
+        application = await self.application()
+        with querylog.strict():
+            await application.process_update({'queries': 1})
+
+    async def test_over_budget_raises_only_in_strict_mode(self):
+        application = await self.application()
+        with querylog.strict(), self.assertRaises(querylog.QueryBudgetExceeded) as raised:
+            await application.process_update({'queries': 2})
+        self.assertIn('budget_probe: 2 SQL', str(raised.exception))
+
+        # Без strict() нарушение только логируется
+        with self.assertLogs('bot.querylog', 'WARNING'):
+            await application.process_update({'queries': 2})
+
+def _user(telegram_id):
+    return {'id': telegram_id, 'is_bot': False, 'first_name': f'User{telegram_id}', 'username': f'user{telegram_id}'}
+
+def _message(telegram_id, text):
+    return {'message_id': next(_ids), 'date': int(time.time()), 'chat': {'id': telegram_id, 'type': 'private'},
+            'from': _user(telegram_id), 'text': text}
+
+@sync_to_async
+def seed_history():
+    """Покупатель с историей в основной таблице и в архиве, продавец и администратор"""
+    client = make_user(1)
+    merchant = make_user(100, UserRole.MERCHANT)
+    make_user(2, UserRole.ADMIN)
+    item = make_item(merchant)
+    for number in range(15):
+        make_transaction(client, item, number, TransactionStatus.COMPLETED)
+    archive.archive_transactions(older_than_days=-1)
+    for number in range(15, 30):
+        make_transaction(client, item, number, TransactionStatus.COMPLETED)
+    make_item(merchant, is_approved=False)
+    return make_transaction(client, item, 30, TransactionStatus.ITEM_DELIVERED)
+
+@sync_to_async
+def transaction_status(transaction_id):
+    return Transaction.objects.get(id=transaction_id).status
+
+@override_settings(TELEGRAM_FAKE_API=True, TELEGRAM_BOT_TOKEN='123:TEST', BOT_ORM_WORKERS=0, CACHES=LOCMEM,
+                   BOT_SQL_QUERY_BUDGETS={})
+@mock.patch('bot.db._executor', None)
+class HandlerBudgetTest(TransactionTestCase):
+    """Бюджеты QUERY_BUDGETS настоящих обработчиков с данными в основной таблице и архиве"""
+
+    async def process(self, application, payload):
+        checked = mock.patch('bot.querylog.check_budget', wraps=querylog.check_budget)
+        with checked as check_budget, querylog.strict():
+            await application.process_update(Update.de_json({'update_id': next(_ids), **payload}, application.bot))
+        return {call.args[0]: call.args[1] for call in check_budget.call_args_list}
+
+    async def text(self, application, telegram_id, text):
+        return await self.process(application, {'message': _message(telegram_id, text)})
+
+    async def callback(self, application, telegram_id, data):
+        return await self.process(application, {'callback_query': {
+            'id': str(next(_ids)), 'chat_instance': str(telegram_id), 'from': _user(telegram_id), 'data': data,
+            'message': _message(telegram_id, '...'),
+        }})
+
+    async def test_handlers_within_budget(self):
+        delivered = await seed_history()
+        application = create_application()
+        await application.initialize()
+
+        queries = await self.text(application, 1, "📦 Мои покупки")
+        self.assertEqual(queries['show_my_purchases'], querylog.get_budget('show_my_purchases'))
+        # Следующая страница: граница между основной таблицей и архивом
+        history = await sync_to_async(lambda: Transaction.objects.order_by('created_at', 'id').first())()
+        queries = await self.callback(application, 1, f"page_purchases_{archive.history_cursor(history)}")
+        self.assertIn('show_my_purchases', queries)
+
+        queries = await self.text(application, 100, "💰 Мои продажи")
+        self.assertIn('show_my_sales', queries)
+
+        queries = await self.text(application, 2, "✅ Одобрить товары")
+        self.assertIn('show_pending_items', queries)
+
+        queries = await self.callback(application, 2, f"complete_{delivered.id}")
+        self.assertIn('admin_complete_transaction', queries)
+        self.assertEqual(await transaction_status(delivered.id), TransactionStatus.COMPLETED)
+
+    async def test_history_over_budget_fails(self):
+        await seed_history()
+        application = create_application()
+        await application.initialize()
+        with override_settings(BOT_SQL_QUERY_BUDGETS={'show_my_purchases': 1}), \
+                self.assertRaises(querylog.QueryBudgetExceeded):
+            await self.text(application, 1, "📦 Мои покупки")
@@ -0,0 +1,50 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from bot import ratelimit
+from bot.models import UserRole
+from bot.ratelimit import MemoryBuckets
+
+from .utils import make_user
+
+class BucketTest(SimpleTestCase):
+    def test_burst_then_refill(self):
+        buckets = MemoryBuckets(rate=1, burst=3)
+        with mock.patch('bot.ratelimit.time.monotonic', return_value=100.0):
+            self.assertEqual([buckets.consume(1, 1)[0] for _ in range(4)], [True, True, True, False])
+            self.assertEqual(buckets.consume(1, 2), (False, 2.0))
+            # Ведра пользователей независимы
+            self.assertTrue(buckets.consume(2, 1)[0])
+        with mock.patch('bot.ratelimit.time.monotonic', return_value=102.0):
+            self.assertEqual(buckets.consume(1, 2), (True, 0.0))
+
+    def test_classify(self):
+        self.assertEqual(ratelimit.classify(text="🛍 Каталог товаров"), 'catalog')
+        self.assertEqual(ratelimit.classify(text='/export csv'), 'export')
+        self.assertEqual(ratelimit.classify(callback_data='buy_5', is_callback=True), 'buy')
+        self.assertEqual(ratelimit.classify(callback_data='approve_item_5', is_callback=True), 'callback')
+
+@override_settings(
+    BOT_ORM_WORKERS=0, BOT_RATELIMIT_BACKEND='memory', BOT_RATELIMIT_RATE=0.001, BOT_RATELIMIT_BURST=3,
+    BOT_RATELIMIT_ADMINS_REFRESH=60,
+)
+@mock.patch('bot.db._executor', None)
+@mock.patch('bot.ratelimit._limiter', None)
+@mock.patch('bot.ratelimit._admin_ids_loaded', None)
+class CheckTest(TransactionTestCase):
+    def setUp(self):
+        make_user(1, UserRole.ADMIN)
+        make_user(2)
+        self.bot = mock.AsyncMock()
+
+    async def checks(self, user_id, count):
+        return [await ratelimit.check(self.bot, user_id, 'callback', chat_id=user_id) for _ in range(count)]
+
+    async def test_client_is_limited_and_warned_once(self):
+        self.assertEqual(await self.checks(2, 5), [True, True, True, False, False])
+        self.bot.send_message.assert_awaited_once()
+
+    async def test_admin_is_not_limited(self):
+        self.assertEqual(await self.checks(1, 10), [True] * 10)
+        self.bot.send_message.assert_not_awaited()
@@ -0,0 +1,116 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from bot import checks, settlement
+from bot.models import MerchantLevel, Transaction, TransactionStatus, UserRole
+from bot.settlement import split_amount
+
+from .utils import make_item, make_transaction, make_user
+
+class SplitAmountTest(SimpleTestCase):
+    def test_half_kopeck_rounds_up(self):
+        self.assertEqual(split_amount('0.10', Decimal('5')), (Decimal('0.01'), Decimal('0.09')))
+        self.assertEqual(split_amount('0.30', Decimal('5')), (Decimal('0.02'), Decimal('0.28')))
+        self.assertEqual(split_amount('1.00', Decimal('5.5')), (Decimal('0.06'), Decimal('0.94')))
+        self.assertEqual(split_amount('0.09', Decimal('5')), (Decimal('0.00'), Decimal('0.09')))
+
+    def test_zero_and_full_rate(self):
+        self.assertEqual(split_amount('123.45', Decimal('0')), (Decimal('0.00'), Decimal('123.45')))
+        self.assertEqual(split_amount('123.45', Decimal('100')), (Decimal('123.45'), Decimal('0.00')))
+
+    @override_settings(TRANSACTION_FEE_PERCENT=5.5, TRANSACTION_FEE_SCHEDULE={'GOLD': '4.25'})
+    def test_schedule(self):
+        schedule = settlement.fee_schedule()
+        self.assertEqual(schedule[MerchantLevel.GOLD], Decimal('4.25'))
+        self.assertEqual(settlement.fee_percent(MerchantLevel.PLATINUM), Decimal('5.5'))
+        self.assertEqual(settlement.fee_percent(None), Decimal('5.5'))
+
+class ScheduleCheckTest(SimpleTestCase):
+    def test_valid(self):
+        self.assertEqual(checks.check_fee_schedule(None), [])
+
+    def test_invalid(self):
+        for schedule in ({'GOLD': '101'}, {'GOLD': '-1'}, {'DIAMOND': '1'}, {'GOLD': 'много'}):
+            with self.subTest(schedule=schedule), override_settings(TRANSACTION_FEE_SCHEDULE=schedule):
+                self.assertEqual([error.id for error in checks.check_fee_schedule(None)], ['bot.E001'])
+
+class SettleTransactionsTest(TestCase):
+    """Суммы, посчитанные базой, совпадают с split_amount"""
+
+    SCHEDULE = {'BRONZE': '0', 'SILVER': '5', 'GOLD': '4.25', 'PLATINUM': '100'}
+
+    def setUp(self):
+        client = make_user(1)
+        number = 0
+        for index, level in enumerate(MerchantLevel.values):
+            merchant = make_user(100 + index, UserRole.MERCHANT, merchant_level=level)
+            # Цены с половиной копейки комиссии и без
+            for price in ('0.10', '0.30', '1.00', '10.01', '99.99', '12345.67'):
+                number += 1
+                make_transaction(client, make_item(merchant, price=price), number)
+        completed = Transaction.objects.first()
+        completed.status = TransactionStatus.COMPLETED
+        completed.save()
+        self.completed_amounts = (completed.id, completed.fee_amount, completed.merchant_amount)
+
+    @override_settings(TRANSACTION_FEE_SCHEDULE=SCHEDULE)
+    def test_sql_matches_split_amount(self):
+        checked, changed = settlement.settle_transactions(batch_size=7)
+        self.assertEqual(checked, Transaction.objects.count() - 1)
+        self.assertGreater(changed, 0)
+
+        schedule = settlement.fee_schedule()
+        for transaction in settlement.open_transactions().select_related('merchant'):
+            percent = settlement.fee_percent(transaction.merchant.merchant_level, schedule)
+            expected = split_amount(transaction.amount, percent)
+            self.assertEqual((transaction.fee_amount, transaction.merchant_amount), expected, transaction.amount)
+
+        # Завершенные сделки не пересчитываются, повторный пересчет ничего не меняет
+        completed = Transaction.objects.get(id=self.completed_amounts[0])
+        self.assertEqual((completed.id, completed.fee_amount, completed.merchant_amount), self.completed_amounts)
+        self.assertEqual(settlement.settle_transactions(), (checked, 0))
+
+    @override_settings(TRANSACTION_FEE_SCHEDULE=SCHEDULE)
+    def test_dry_run(self):
+        checked, changed = settlement.settle_transactions(dry_run=True)
+        self.assertGreater(changed, 0)
+        self.assertEqual(settlement.settle_transactions(dry_run=True), (checked, changed))
+
+class LargeAmountTest(TestCase):
+    """Крупные суммы и ставки с тремя знаками: промежуточные значения больше 2^31"""
+
+    SCHEDULE = {'GOLD': '4.75', 'PLATINUM': '3.333'}
+    AMOUNTS = ('1952.00', '10000.01', '12345.67', '987654.35', '99999999.99')
+
+    @override_settings(TRANSACTION_FEE_PERCENT=5.5, TRANSACTION_FEE_SCHEDULE=SCHEDULE)
+    def test_sql_matches_decimal_half_up(self):
+        client = make_user(1)
+        number = 0
+        for index, level in enumerate((MerchantLevel.BRONZE, MerchantLevel.GOLD, MerchantLevel.PLATINUM)):
+            merchant = make_user(100 + index, UserRole.MERCHANT, merchant_level=level)
+            for amount in self.AMOUNTS:
+                number += 1
+                # Суммы записаны без комиссии: их посчитает база
+                make_transaction(client, make_item(merchant, price=amount), number,
+                                 fee_amount=Decimal('0'), merchant_amount=Decimal(amount))
+
+        self.assertEqual(settlement.settle_transactions(), (number, number))
+        percents = {MerchantLevel.BRONZE: Decimal('5.5'), MerchantLevel.GOLD: Decimal('4.75'),
+                    MerchantLevel.PLATINUM: Decimal('3.333')}
+        for transaction in Transaction.objects.select_related('merchant'):
+            percent = percents[transaction.merchant.merchant_level]
+            fee = (transaction.amount * percent / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            self.assertEqual((transaction.fee_amount, transaction.merchant_amount),
+                             (fee, transaction.amount - fee), (transaction.amount, percent))
+
+    @override_settings(TRANSACTION_FEE_SCHEDULE=SCHEDULE)
+    def test_postgres_arithmetic_is_bigint(self):
+        # SQLite считает в 64 битах всегда; в PostgreSQL ::integer переполнился бы
+        postgres = PostgresDatabaseWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'})
+        queryset = Transaction.objects.annotate(fee=settlement.fee_kopecks(settlement.fee_schedule()))
+        sql, _ = queryset.query.get_compiler(connection=postgres).as_sql()
+        self.assertIn('::bigint', sql)
+        self.assertNotIn('::integer', sql)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from bot import sharding
+from bot.sharding import HashRing, ShardClient, ShardError, ShardServer
+
+def message_body(update_id, chat_id, user_id=None):
+    return json.dumps({'update_id': update_id, 'message': {
+        'message_id': 1, 'date': 0, 'text': 'hi',
+        'from': {'id': user_id or abs(chat_id), 'is_bot': False, 'first_name': 'User'},
+        'chat': {'id': chat_id, 'type': 'private'},
+    }}).encode()
+
+class RoutingTest(SimpleTestCase):
+    def test_chat_key(self):
+        self.assertEqual(sharding.extract_chat_key(message_body(1, -100500, user_id=7)), -100500)
+        callback = json.dumps({'update_id': 1, 'callback_query': {'id': '1', 'from': {'id': 7}}}).encode()
+        self.assertEqual(sharding.extract_chat_key(callback), 7)
+        self.assertIsNone(sharding.extract_chat_key(b'{"update_id": 1}'))
+
+    def test_chat_updates_go_to_one_shard(self):
+        client = ShardClient(4)
+        shards = {client.shard_for(message_body(update_id, 42), update_id) for update_id in range(100)}
+        self.assertEqual(len(shards), 1)
+
+    def test_chats_spread_across_shards(self):
+        ring = HashRing(range(4))
+        counts = [0] * 4
+        for chat_id in range(4000):
+            counts[ring.node_for(chat_id)] += 1
+        self.assertTrue(all(700 < count < 1300 for count in counts), counts)
+
+    def test_adding_shard_moves_few_chats(self):
+        old, new = HashRing(range(4)), HashRing(range(5))
+        moved = sum(old.node_for(chat_id) != new.node_for(chat_id) for chat_id in range(4000))
+        # Переезжает около 1/5 чатов, и только на новый шард
+        self.assertLess(moved, 4000 * 0.3)
+        self.assertTrue(all(
+            new.node_for(chat_id) == 4 for chat_id in range(4000) if old.node_for(chat_id) != new.node_for(chat_id)
+        ))
+
+class ForwardTest(SimpleTestCase):
+    """Обновления доходят по Unix-сокету до шарда своего чата"""
+
+    SHARDS = 2
+
+    def setUp(self):
+        self.socket_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.socket_dir.cleanup)
+        settings_override = override_settings(BOT_SHARD_SOCKET_DIR=self.socket_dir.name, BOT_SHARD_TIMEOUT=5)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Приложение шарда - его номер: dispatch записывает, какой шард получил обновление
+        dispatch = mock.patch('bot.preparse.dispatch', self.dispatch)
+        dispatch.start()
+        self.addCleanup(dispatch.stop)
+
+        self.received = {shard: [] for shard in range(self.SHARDS)}
+        self.events = []
+        self.delays = {}
+        self.first_started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.servers = [
+            asyncio.run_coroutine_threadsafe(self.start_shard(shard), self.loop).result(5)
+            for shard in range(self.SHARDS)
+        ]
+        self.client = ShardClient(self.SHARDS)
+
+    def tearDown(self):
+        for shard in range(self.SHARDS):
+            self.client._close(shard)
+        asyncio.run_coroutine_threadsafe(self.stop_shards(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    async def start_shard(self, shard):
+        server = ShardServer(application=shard)
+        return await asyncio.start_unix_server(server.handle_connection, sharding.socket_path(shard))
+
+    async def stop_shards(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+
+    async def dispatch(self, application, body):
+        if b'"fail"' in body:
+            raise RuntimeError('ошибка обработчика')
+        update_id = json.loads(body)['update_id']
+        self.events.append(f'{update_id} start')
+        if update_id == 1:
+            self.first_started.set()
+        await asyncio.sleep(self.delays.get(update_id, 0))
+        self.events.append(f'{update_id} end')
+        self.received[application].append(update_id)
+
+    def test_forward_to_chat_shard(self):
+        expected = {shard: [] for shard in range(self.SHARDS)}
+        for update_id in range(1, 21):
+            body = message_body(update_id, chat_id=update_id % 7)
+            self.client.forward(body, update_id)
+            expected[self.client.shard_for(body, update_id)].append(update_id)
+        self.assertEqual(self.received, expected)
+        self.assertTrue(all(self.received.values()))
+        self.assertTrue(self.client.ping(0))
+
+    def test_chat_updates_from_separate_connections_in_order(self):
+        chat_id = 42
+        other_chat_id = next(
+            chat for chat in range(43, 100)
+            if self.client.shard_for(message_body(3, chat), 3) == self.client.shard_for(message_body(1, chat_id), 1)
+        )
+        self.delays[1] = 0.2
+
+        def forward_first():
+            # Свое соединение: ShardClient держит соединения на поток
+            self.client.forward(message_body(1, chat_id), 1)
+            self.client._close(self.client.shard_for(message_body(1, chat_id), 1))
+
+        first = threading.Thread(target=forward_first)
+        first.start()
+        self.assertTrue(self.first_started.wait(5))
+        # Другой чат того же шарда не ждет
+        self.client.forward(message_body(3, other_chat_id), 3)
+        self.client.forward(message_body(2, chat_id), 2)
+        first.join()
+        self.assertEqual(self.events, ['1 start', '3 start', '3 end', '1 end', '2 start', '2 end'])
+
+    def test_handler_error_is_reported(self):
+        body = json.dumps({'update_id': 1, 'fail': True}).encode()
+        with self.assertRaises(ShardError), self.assertLogs('bot.sharding', 'ERROR'):
+            self.client.forward(body, 1)
+
+    def test_unavailable_shard(self):
+        with override_settings(BOT_SHARD_SOCKET_DIR=self.socket_dir.name + '-missing'):
+            with self.assertRaises(ShardError):
+                ShardClient(self.SHARDS).forward(message_body(1, 1), 1)
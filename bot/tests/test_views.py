@@ -0,0 +1,17 @@
+from django.test import SimpleTestCase, override_settings
+
+class MetricsViewTest(SimpleTestCase):
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_refused_without_token_in_production(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_without_token_in_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
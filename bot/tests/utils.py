@@ -0,0 +1,17 @@
+"""Общие данные для тестов бота"""
+
+from decimal import Decimal
+
+from bot.models import Item, TelegramUser, Transaction, TransactionStatus, UserRole
+
+def make_user(telegram_id, role=UserRole.CLIENT, **fields):
+    return TelegramUser.objects.create(telegram_id=telegram_id, username=f'user{telegram_id}', role=role, **fields)
+
+def make_item(merchant, price='100.00', category='Ресурсы', **fields):
+    fields.setdefault('is_approved', True)
+    return Item.objects.create(merchant=merchant, title='Алмазы', description='Описание',
+                               price=Decimal(price), category=category, **fields)
+
+def make_transaction(client, item, number, status=TransactionStatus.PENDING_PAYMENT, **fields):
+    return Transaction.objects.create(transaction_id=f'TX{number:06d}', client=client, merchant=item.merchant,
+                                      item=item, amount=item.price, status=status, **fields)
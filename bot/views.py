@@ -1,15 +1,26 @@
 from django.shortcuts import render
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
-import json
+import hmac
 import logging
 import asyncio
-from telegram import Update, Bot
+import time
+from telegram import Bot
 from .telegram_webhook import get_application
+from .polling import allowed_updates
+from . import dedup, metrics, preparse, profiling, sharding
 
 logger = logging.getLogger(__name__)
 
+WEBHOOK_REQUESTS = metrics.counter(
+    'bot_webhook_requests_total', 'Запросы к webhook по HTTP-статусу ответа', ['status'])
+WEBHOOK_SECONDS = metrics.histogram(
+    'bot_webhook_request_seconds', 'Время обработки запроса к webhook')
+WEBHOOK_REJECTED = metrics.counter(
+    'bot_webhook_rejected_total', 'Отклоненные запросы к webhook по причине', ['reason'])
+
 def run_async(coro):
     """Запустить async функцию в синхронном контексте"""
     try:
@@ -24,26 +35,56 @@ def run_async(coro):
 def telegram_webhook(request):
     """Обработка webhook от Telegram"""
     if request.method == 'POST':
-        try:
-            # Получаем данные от Telegram
-            update_data = json.loads(request.body.decode('utf-8'))
-            
-            # Получаем application
-            app = get_application()
-            
-            # Создаем объект Update
-            update = Update.de_json(update_data, app.bot)
-            
-            # Обрабатываем update асинхронно
-            run_async(app.process_update(update))
-            
-            return JsonResponse({'ok': True})
-        except Exception as e:
-            logger.error(f"Ошибка обработки webhook: {e}", exc_info=True)
-            return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+        started = time.perf_counter()
+        response = _process_webhook(request)
+        WEBHOOK_SECONDS.observe(time.perf_counter() - started)
+        WEBHOOK_REQUESTS.inc(status=response.status_code)
+        return response
     
     return HttpResponse('Bot webhook endpoint', status=200)
 
+def _secret_token_valid(request):
+    """Заголовок X-Telegram-Bot-Api-Secret-Token совпадает с TELEGRAM_WEBHOOK_SECRET"""
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if not secret:
+        return True
+    provided = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    return hmac.compare_digest(provided.encode(), secret.encode())
+
+def _process_webhook(request):
+    """Обработать обновление из тела запроса"""
+    # Быстрые отказы: до чтения и разбора тела
+    if not _secret_token_valid(request):
+        WEBHOOK_REJECTED.inc(reason='secret_token')
+        return HttpResponse('Forbidden', status=403)
+    
+    update_id = dedup.extract_update_id(request.body)
+    if update_id is None:
+        WEBHOOK_REJECTED.inc(reason='malformed')
+        return JsonResponse({'ok': False, 'error': 'update_id not found'}, status=400)
+    
+    # Повторная доставка: Telegram получает 200 и больше не повторяет
+    updates = dedup.get_dedup()
+    if not updates.claim(update_id):
+        WEBHOOK_REJECTED.inc(reason='duplicate')
+        return JsonResponse({'ok': True})
+    
+    try:
+        if settings.BOT_SHARDS:
+            # Обновление обрабатывает процесс-шард его чата
+            sharding.get_client().forward(request.body, update_id)
+            return JsonResponse({'ok': True})
+        
+        # Update строится, только если обновление дойдет до обработчиков
+        app = get_application()
+        run_async(preparse.dispatch(app, request.body))
+        
+        return JsonResponse({'ok': True})
+    except Exception as e:
+        updates.release(update_id)
+        logger.error(f"Ошибка обработки webhook: {e}", exc_info=True)
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
 @csrf_exempt
 def set_webhook(request):
     """Установить webhook URL"""
@@ -51,7 +92,12 @@ def set_webhook(request):
         webhook_url = f"https://{request.get_host()}/bot/webhook/"
         
         app = get_application()
-        run_async(app.bot.set_webhook(webhook_url))
+        run_async(app.bot.set_webhook(
+            webhook_url,
+            secret_token=settings.TELEGRAM_WEBHOOK_SECRET or None,
+            # Telegram не присылает типы обновлений, на которые нет обработчиков
+            allowed_updates=allowed_updates(app),
+        ))
         
         return JsonResponse({
             'ok': True,
@@ -95,3 +141,73 @@ def webhook_info(request):
     except Exception as e:
         logger.error(f"Ошибка получения информации webhook: {e}", exc_info=True)
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+def metrics_view(request):
+    """Метрики в формате Prometheus (всех процессов gunicorn)
+
+    Без METRICS_TOKEN метрики открыты только при DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(provided.encode(), token.encode()):
+            return HttpResponse('Unauthorized', status=401)
+    elif not settings.DEBUG:
+        return HttpResponse('Forbidden: METRICS_TOKEN is not set', status=403)
+
+    body = metrics.render(metrics.collect_all())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def profiling_view(request):
+    """Состояние выборочного профилировщика; POST action=enable|disable|clear"""
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action in ('enable', 'disable'):
+            profiling.set_enabled(action == 'enable')
+        elif action == 'clear':
+            profiling.clear_profiles()
+        else:
+            return JsonResponse({'ok': False, 'error': 'action: enable, disable или clear'}, status=400)
+
+    if request.GET.get('format') == 'folded':
+        response = HttpResponse(profiling.merged_profile(), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="bot-profile.folded"'
+        return response
+
+    return JsonResponse({
+        'ok': True,
+        'enabled': profiling.is_enabled(),
+        'sample_rate': settings.BOT_PROFILING_SAMPLE_RATE,
+        'interval': settings.BOT_PROFILING_INTERVAL,
+        'directory': str(settings.BOT_PROFILING_DIR),
+    })
+
+@staff_member_required
+def sales_analytics_view(request):
+    """Продажи по сводке для графиков: ?from=&to=&group=day|month|category|merchant&merchant="""
+    from . import analytics
+    from .export import parse_date
+
+    group = request.GET.get('group', 'day')
+    if group not in analytics.GROUPINGS:
+        return JsonResponse({'ok': False, 'error': f"group: {', '.join(analytics.GROUPINGS)}"}, status=400)
+    try:
+        default_from, default_to = analytics.period(30)
+        date_from = parse_date(request.GET['from']) if request.GET.get('from') else default_from
+        date_to = parse_date(request.GET['to']) if request.GET.get('to') else default_to
+        merchant_id = int(request.GET['merchant']) if request.GET.get('merchant') else None
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'from/to: ГГГГ-ММ-ДД, merchant: Telegram ID'}, status=400)
+    if not 0 <= (date_to - date_from).days < analytics.MAX_REPORT_DAYS:
+        return JsonResponse({'ok': False, 'error': f'Период до {analytics.MAX_REPORT_DAYS} дней'}, status=400)
+
+    rows = analytics.sales_report(date_from, date_to, group, merchant_id)
+    return JsonResponse({
+        'ok': True,
+        'from': date_from,
+        'to': date_to,
+        'group': group,
+        'rows': rows,
+        'total': analytics.totals(rows),
+    })
@@ -0,0 +1,122 @@
+"""
+Маршрутизация чтения на реплику базы данных
+
+Реплика подключается переменной окружения DATABASE_REPLICA_URL. На реплику
+уходят только явно помеченные чтения (отчеты, каталог, списки в админ-панели):
+обычные обработчики бота продолжают читать с основной базы, чтобы не получить
+устаревшее состояние транзакции перед её изменением.
+
+После того как пользователь изменил транзакцию или товар, его чтения
+несколько секунд идут на основную базу (read-your-writes), пока реплика
+догоняет основную. Срок закрепления хранится в общем кеше (settings.CACHES),
+поэтому действует во всех процессах: вебхук и воркеры могут обслуживать
+одного пользователя по очереди. Если кеш недоступен, чтения пользователя
+идут на основную базу.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Изменения этих моделей закрепляют пользователя за основной базой
+STICKY_MODELS = ('bot.transaction', 'bot.item')
+
+# Таблица DatabaseCache читается сразу после записи - реплика может не успеть
+PRIMARY_ONLY_APPS = ('django_cache',)
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_current_user = ContextVar('current_user', default=None)
+
+STICKY_KEY_PREFIX = 'db:sticky:'
+
+# Закрепления, сделанные этим процессом: не ходить в кеш за своими записями
+_sticky_until = {}
+_sticky_lock = threading.Lock()
+
+def replica_configured():
+    """Настроена ли реплика"""
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+def set_current_user(telegram_id):
+    """Запомнить пользователя, от имени которого выполняются запросы"""
+    _current_user.set(telegram_id)
+
+def _sticky_key(telegram_id):
+    return f'{STICKY_KEY_PREFIX}{telegram_id}'
+
+def mark_sticky(telegram_id):
+    """Закрепить чтения пользователя за основной базой во всех процессах"""
+    seconds = settings.DATABASE_REPLICA_STICKY_SECONDS
+    now = time.monotonic()
+    with _sticky_lock:
+        _sticky_until[telegram_id] = now + seconds
+        if len(_sticky_until) > 10000:
+            for user_id, until in list(_sticky_until.items()):
+                if until < now:
+                    del _sticky_until[user_id]
+    try:
+        cache.set(_sticky_key(telegram_id), True, timeout=seconds)
+    except Exception as e:
+        logger.warning(f"Не удалось закрепить пользователя {telegram_id} за основной базой в кеше: {e}")
+
+def is_sticky(telegram_id):
+    """Читает ли пользователь сейчас только с основной базы"""
+    if _sticky_until.get(telegram_id, 0) > time.monotonic():
+        return True
+    try:
+        return cache.get(_sticky_key(telegram_id)) is not None
+    except Exception as e:
+        logger.warning(f"Кеш недоступен, чтения пользователя {telegram_id} идут на основную базу: {e}")
+        return True
+
+@contextmanager
+def replica_reads():
+    """Направить чтения внутри блока на реплику"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+def read_from_replica(func):
+    """Декоратор для функций, которые только читают данные"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return func(*args, **kwargs)
+    return wrapper
+
+class ReplicaRouter:
+    """Роутер: помеченные чтения - на реплику, всё остальное - на основную базу"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or not replica_configured():
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        user = _current_user.get()
+        if user is not None and is_sticky(user):
+            return 'default'
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        user = _current_user.get()
+        if user is not None and model._meta.label_lower in STICKY_MODELS:
+            mark_sticky(user)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
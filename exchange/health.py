@@ -0,0 +1,99 @@
+"""
+Проверки готовности приложения для /health/ready/
+
+Каждая проверка возвращает (ok, подробности). Результат кешируется в памяти
+процесса на HEALTH_CACHE_SECONDS, поэтому частые запросы балансировщика не
+создают нагрузку на Postgres. Успешная проверка миграций кешируется навсегда:
+применённые миграции не откатываются, пока процесс работает.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+logger = logging.getLogger(__name__)
+
+def check_database():
+    """Основная база отвечает на SELECT 1"""
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return True, 'ok'
+
+def check_migrations():
+    """Все миграции применены"""
+    connection = connections[DEFAULT_DB_ALIAS]
+    executor = MigrationExecutor(connection)
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        pending = ', '.join(f'{migration.app_label}.{migration.name}' for migration, _ in plan)
+        return False, f'не применены миграции: {pending}'
+    return True, 'ok'
+
+def check_bot():
+    """Telegram application инициализирован (при необходимости инициализирует)
+
+    С BOT_SHARDS обновления обрабатывают шарды - проверяется, что все они отвечают.
+    """
+    if settings.BOT_SHARDS:
+        from bot import sharding
+
+        client = sharding.get_client()
+        for shard in range(client.shards):
+            client.ping(shard)
+        return True, f'шардов: {client.shards}'
+
+    from bot.telegram_webhook import get_application, is_initialized
+
+    if not is_initialized():
+        get_application()
+    return True, 'ok'
+
+CHECKS = {
+    'database': check_database,
+    'migrations': check_migrations,
+    'bot': check_bot,
+}
+
+# Проверки, успешный результат которых не устаревает
+PERMANENT_CHECKS = ('migrations',)
+
+_results = {}
+_lock = threading.Lock()
+
+def run_check(name):
+    """Результат проверки с учётом кеша: {'ok', 'detail', 'seconds'}"""
+    now = time.monotonic()
+    with _lock:
+        cached = _results.get(name)
+    if cached and (now < cached['expires'] or (cached['ok'] and name in PERMANENT_CHECKS)):
+        return cached
+
+    started = time.perf_counter()
+    try:
+        ok, detail = CHECKS[name]()
+    except Exception as e:
+        logger.warning(f"Проверка готовности {name} не пройдена: {e}")
+        ok, detail = False, str(e)
+
+    result = {
+        'ok': ok,
+        'detail': detail,
+        'seconds': round(time.perf_counter() - started, 4),
+        'expires': time.monotonic() + settings.HEALTH_CACHE_SECONDS,
+    }
+    with _lock:
+        _results[name] = result
+    return result
+
+def readiness():
+    """Все проверки: (ok, {имя: результат})"""
+    results = {}
+    for name in CHECKS:
+        result = run_check(name)
+        results[name] = {key: value for key, value in result.items() if key != 'expires'}
+    return all(result['ok'] for result in results.values()), results
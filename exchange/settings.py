@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -29,7 +31,145 @@ SECRET_KEY = 'django-insecure-hb#tn8+hw6j4o(dh#nze9%b$^!ii*k9nhhqps1x+mpis7ps*u)
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 PAYMENT_CARD_NUMBER = '4177490191941220'
-TRANSACTION_FEE_PERCENT = 5.5
+
+# Service fee (bot/settlement.py): TRANSACTION_FEE_PERCENT of the amount,
+# overridden per merchant level by TRANSACTION_FEE_SCHEDULE (JSON, e.g.
+# {"GOLD": "4.5", "PLATINUM": "3.5"}). The fee is rounded half up to a kopeck,
+# the merchant gets the rest. Open transactions are re-settled in SQL,
+# TRANSACTION_SETTLEMENT_BATCH_SIZE ids per UPDATE.
+TRANSACTION_FEE_PERCENT = float(os.getenv('TRANSACTION_FEE_PERCENT', 5.5))
+TRANSACTION_FEE_SCHEDULE = json.loads(os.getenv('TRANSACTION_FEE_SCHEDULE', '{}'))
+TRANSACTION_SETTLEMENT_BATCH_SIZE = int(os.getenv('TRANSACTION_SETTLEMENT_BATCH_SIZE', 5000))
+
+# Merchant levels (bot/levels.py): experience needed for each level above
+# BRONZE, JSON. Levels follow completed sales; after changing the thresholds
+# run manage.py recompute_merchant_levels.
+MERCHANT_LEVEL_THRESHOLDS = json.loads(os.getenv(
+    'MERCHANT_LEVEL_THRESHOLDS', '{"SILVER": 2000, "GOLD": 5000, "PLATINUM": 10000}'
+))
+
+# Secret token registered with setWebhook; the webhook rejects requests
+# without a matching X-Telegram-Bot-Api-Secret-Token header (1-256 chars:
+# A-Z, a-z, 0-9, _ and -). Empty = no check.
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+
+# Redelivered updates are dropped by update_id (bot/dedup.py): a per-process
+# window of BOT_UPDATE_DEDUP_SIZE ids plus a store shared by all workers:
+# 'db' (ProcessedUpdate table, one INSERT per update), 'cache' (requires
+# CACHE_BACKEND=redis or memcached) or 'memory' (none). Shared entries are
+# kept for BOT_UPDATE_DEDUP_TTL seconds.
+BOT_UPDATE_DEDUP_SIZE = int(os.getenv('BOT_UPDATE_DEDUP_SIZE', 10000))
+BOT_UPDATE_DEDUP_BACKEND = os.getenv('BOT_UPDATE_DEDUP_BACKEND', 'db')
+BOT_UPDATE_DEDUP_TTL = int(os.getenv('BOT_UPDATE_DEDUP_TTL', 24 * 60 * 60))
+
+# Shared cache for bot/cache.py, rate limits and update dedup. The default
+# file cache needs no external services and is shared by every process on the
+# host (docker-compose mounts the project into both web and bot). 'db' keeps
+# entries in the bot_cache table (python manage.py createcachetable) and is
+# shared by all services using the database; REDIS_URL switches to Redis.
+# 'locmem' is per-process and 'dummy' disables caching.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if REDIS_URL else 'file')
+CACHE_DIR = os.getenv('CACHE_DIR', str(BASE_DIR / '.cache'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+
+CACHE_BACKENDS = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'bot_cache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'dummy': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': 'exchange',
+        'TIMEOUT': 300,
+    },
+}
+
+# Lifetime in seconds of cached bot data (bot/cache.py): the catalog is also
+# invalidated when items change, statistics and the leaderboard only expire.
+# A worker that lost the race to recompute an entry waits up to
+# BOT_CACHE_LOCK_WAIT seconds for the winner before computing it itself.
+BOT_CACHE_CATALOG_TIMEOUT = int(os.getenv('BOT_CACHE_CATALOG_TIMEOUT', 300))
+BOT_CACHE_STATS_TIMEOUT = int(os.getenv('BOT_CACHE_STATS_TIMEOUT', 60))
+BOT_CACHE_LOCK_WAIT = float(os.getenv('BOT_CACHE_LOCK_WAIT', 5))
+
+# Webhook sharding (bot/sharding.py): with BOT_SHARDS > 0 gunicorn workers only
+# check, dedup and forward updates over Unix sockets in BOT_SHARD_SOCKET_DIR
+# to `manage.py run_bot_shards` processes, picked by consistent hashing of the
+# chat id. A forwarded update fails after BOT_SHARD_TIMEOUT seconds; on SIGTERM
+# a shard finishes started updates for up to BOT_SHARD_DRAIN_TIMEOUT seconds.
+BOT_SHARDS = int(os.getenv('BOT_SHARDS', 0))
+BOT_SHARD_SOCKET_DIR = os.getenv('BOT_SHARD_SOCKET_DIR', os.path.join(tempfile.gettempdir(), 'bot-shards'))
+BOT_SHARD_TIMEOUT = float(os.getenv('BOT_SHARD_TIMEOUT', 60))
+BOT_SHARD_DRAIN_TIMEOUT = float(os.getenv('BOT_SHARD_DRAIN_TIMEOUT', 20))
+
+# Polling runner for manage.py run_bot (bot/polling.py): updates of different
+# chats are processed concurrently (BOT_POLLING_CONCURRENCY at a time), a
+# getUpdates long poll lasts BOT_POLLING_TIMEOUT seconds, and on SIGTERM the
+# bot waits up to BOT_POLLING_DRAIN_TIMEOUT seconds for fetched updates.
+BOT_POLLING_CONCURRENCY = int(os.getenv('BOT_POLLING_CONCURRENCY', 32))
+BOT_POLLING_TIMEOUT = int(os.getenv('BOT_POLLING_TIMEOUT', 30))
+BOT_POLLING_INTERVAL = float(os.getenv('BOT_POLLING_INTERVAL', 0))
+BOT_POLLING_DRAIN_TIMEOUT = float(os.getenv('BOT_POLLING_DRAIN_TIMEOUT', 20))
+BOT_POLLING_DROP_PENDING = os.getenv('BOT_POLLING_DROP_PENDING', 'False') == 'True'
+
+# Per-user token bucket (bot/ratelimit.py): BOT_RATELIMIT_BURST tokens refilled
+# at BOT_RATELIMIT_RATE tokens/second; each update costs its action's price
+# (BOT_RATELIMIT_COSTS JSON, e.g. {"catalog": 5}). 'memory' keeps buckets per
+# process, 'cache' shares them between workers through the Django cache.
+# Admins are not limited; each process rereads the admin list every
+# BOT_RATELIMIT_ADMINS_REFRESH seconds.
+BOT_RATELIMIT_ENABLED = os.getenv('BOT_RATELIMIT_ENABLED', 'True') == 'True'
+BOT_RATELIMIT_RATE = float(os.getenv('BOT_RATELIMIT_RATE', 1))
+BOT_RATELIMIT_BURST = float(os.getenv('BOT_RATELIMIT_BURST', 10))
+BOT_RATELIMIT_BACKEND = os.getenv('BOT_RATELIMIT_BACKEND', 'memory')
+BOT_RATELIMIT_COSTS = json.loads(os.getenv('BOT_RATELIMIT_COSTS', '{}'))
+BOT_RATELIMIT_ADMINS_REFRESH = float(os.getenv('BOT_RATELIMIT_ADMINS_REFRESH', 60))
+
+# In-process fake Bot API (bot/fake_api.py) for offline runs and benchmarks:
+# no requests go to api.telegram.org, every call is recorded
+TELEGRAM_FAKE_API = os.getenv('TELEGRAM_FAKE_API', 'False') == 'True'
+TELEGRAM_FAKE_API_LATENCY = float(os.getenv('TELEGRAM_FAKE_API_LATENCY', 0))
+TELEGRAM_FAKE_API_ERROR_RATE = float(os.getenv('TELEGRAM_FAKE_API_ERROR_RATE', 0))
+TELEGRAM_FAKE_API_RETRY_AFTER_RATE = float(os.getenv('TELEGRAM_FAKE_API_RETRY_AFTER_RATE', 0))
+TELEGRAM_FAKE_API_RETRY_AFTER = int(os.getenv('TELEGRAM_FAKE_API_RETRY_AFTER', 1))
+
+if TELEGRAM_FAKE_API and not TELEGRAM_BOT_TOKEN:
+    TELEGRAM_BOT_TOKEN = '123456:fake-api-token'
+
+# Transaction archival: COMPLETED/CANCELLED transactions older than
+# TRANSACTION_ARCHIVE_AFTER_DAYS are moved to the archive table in batches
+TRANSACTION_ARCHIVE_AFTER_DAYS = int(os.getenv('TRANSACTION_ARCHIVE_AFTER_DAYS', 90))
+TRANSACTION_ARCHIVE_BATCH_SIZE = int(os.getenv('TRANSACTION_ARCHIVE_BATCH_SIZE', 500))
+
+# Transaction export (bot/export.py, manage.py export_transactions, /export):
+# rows are streamed from a cursor BOT_EXPORT_CHUNK_SIZE at a time
+BOT_EXPORT_CHUNK_SIZE = int(os.getenv('BOT_EXPORT_CHUNK_SIZE', 2000))
+
+# Bulk item upload by merchants (bot/item_import.py): documents up to
+# BOT_IMPORT_MAX_FILE_SIZE bytes, items inserted BOT_IMPORT_BATCH_SIZE at a time
+BOT_IMPORT_MAX_FILE_SIZE = int(os.getenv('BOT_IMPORT_MAX_FILE_SIZE', 1024 * 1024))
+BOT_IMPORT_BATCH_SIZE = int(os.getenv('BOT_IMPORT_BATCH_SIZE', 500))
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
@@ -105,9 +245,16 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600
+            conn_max_age=600,
+            conn_health_checks=True
         )
     }
+    # Let Postgres (14+) close sessions left idle by bot worker threads
+    DB_IDLE_SESSION_TIMEOUT_MS = int(os.getenv('DB_IDLE_SESSION_TIMEOUT_MS', 0))
+    if DB_IDLE_SESSION_TIMEOUT_MS:
+        DATABASES['default'].setdefault('OPTIONS', {})['options'] = (
+            f'-c idle_session_timeout={DB_IDLE_SESSION_TIMEOUT_MS}'
+        )
 else:
     # Fallback to SQLite for local development
     DATABASES = {
@@ -117,6 +264,76 @@ else:
         }
     }
 
+# Optional read replica for reports, catalog and admin lists.
+# Locally a second SQLite file works, e.g.
+# DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 - in tests it mirrors 'default'
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=600,
+        conn_health_checks=True
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['exchange.db_router.ReplicaRouter']
+
+# Seconds a user keeps reading from the primary after changing a transaction
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+# Thread pool for bot ORM calls (0 = run all of them on one thread, the
+# sync_to_async default) and how long a call may wait for a free worker, in
+# seconds (0 = no timeout). A running call can't be interrupted from Python;
+# BOT_DB_STATEMENT_TIMEOUT (seconds, 0 = off) sets Postgres statement_timeout
+# on the bot's pooled connections to bound the queries themselves.
+BOT_ORM_WORKERS = int(os.getenv('BOT_ORM_WORKERS', 4))
+BOT_ORM_TIMEOUT = float(os.getenv('BOT_ORM_TIMEOUT', 30))
+BOT_DB_STATEMENT_TIMEOUT = float(os.getenv('BOT_DB_STATEMENT_TIMEOUT', 30))
+
+# Connection slots for bot ORM calls; bounds the connections a process
+# holds from the bot path (see bot/db.py). Sized to the ORM executor.
+BOT_DB_POOL_SIZE = int(os.getenv('BOT_DB_POOL_SIZE', BOT_ORM_WORKERS or 1))
+BOT_DB_POOL_TIMEOUT = float(os.getenv('BOT_DB_POOL_TIMEOUT', 30))
+BOT_DB_POOL_WAIT_WARNING = float(os.getenv('BOT_DB_POOL_WAIT_WARNING', 1))
+
+# Updates slower than this (seconds) are logged with a DB/SQL/Bot API
+# breakdown; per-update and per-handler histograms are in bot/metrics.py
+BOT_SLOW_UPDATE_WARNING = float(os.getenv('BOT_SLOW_UPDATE_WARNING', 2))
+
+# SQL checks for bot handlers (bot/querylog.py): queries slower than
+# BOT_SQL_SLOW_MS are logged; with BOT_SQL_LOG every statement is recorded
+# per update and shapes repeated BOT_SQL_REPEAT_THRESHOLD times are reported
+# as N+1. BOT_SQL_QUERY_BUDGETS (JSON, e.g. {"show_catalog": 2}) overrides
+# per-handler query budgets. Violations are only logged and counted;
+# tests turn them into errors with bot.querylog.strict().
+BOT_SQL_LOG = os.getenv('BOT_SQL_LOG', 'False') == 'True'
+BOT_SQL_SLOW_MS = float(os.getenv('BOT_SQL_SLOW_MS', 200))
+BOT_SQL_REPEAT_THRESHOLD = int(os.getenv('BOT_SQL_REPEAT_THRESHOLD', 5))
+BOT_SQL_QUERY_BUDGETS = json.loads(os.getenv('BOT_SQL_QUERY_BUDGETS', '{}'))
+
+# /metrics (Prometheus text format). With several gunicorn workers set
+# METRICS_MULTIPROCESS_DIR to a directory shared by them: each worker dumps
+# its metrics there at most every METRICS_DUMP_INTERVAL seconds and /metrics
+# sums all files. METRICS_TOKEN is required as a Bearer token; without it
+# /metrics is served only with DEBUG and refused (403) otherwise.
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR', '')
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Sampling profiler for update processing (bot/profiling.py). Enabled by
+# BOT_PROFILING=True or the flag file toggled at /bot/profiling/; profiles
+# BOT_PROFILING_SAMPLE_RATE of updates, one stack sample per
+# BOT_PROFILING_INTERVAL seconds, folded stacks written to BOT_PROFILING_DIR
+BOT_PROFILING = os.getenv('BOT_PROFILING', 'False') == 'True'
+BOT_PROFILING_SAMPLE_RATE = float(os.getenv('BOT_PROFILING_SAMPLE_RATE', 0.01))
+BOT_PROFILING_INTERVAL = float(os.getenv('BOT_PROFILING_INTERVAL', 0.005))
+BOT_PROFILING_FLUSH_INTERVAL = float(os.getenv('BOT_PROFILING_FLUSH_INTERVAL', 60))
+BOT_PROFILING_DIR = os.getenv('BOT_PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'bot-profiles'))
+
+# Seconds a /health/ready/ probe result is reused before checking again
+HEALTH_CACHE_SECONDS = float(os.getenv('HEALTH_CACHE_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
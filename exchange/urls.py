@@ -23,6 +23,9 @@ urlpatterns = [
     # Home & Health Check
     path('', views.home, name='home'),
     path('health/', views.health, name='health'),
+    path('health/live/', views.health, name='health_live'),
+    path('health/ready/', views.health_ready, name='health_ready'),
+    path('metrics', bot_views.metrics_view, name='metrics'),
     
     # Admin
     path('admin/', admin.site.urls),
@@ -32,4 +35,6 @@ urlpatterns = [
     path('bot/set-webhook/', bot_views.set_webhook, name='set_webhook'),
     path('bot/delete-webhook/', bot_views.delete_webhook, name='delete_webhook'),
     path('bot/webhook-info/', bot_views.webhook_info, name='webhook_info'),
+    path('bot/profiling/', bot_views.profiling_view, name='bot_profiling'),
+    path('bot/analytics/sales/', bot_views.sales_analytics_view, name='bot_sales_analytics'),
 ]
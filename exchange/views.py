@@ -1,5 +1,7 @@
 from django.http import JsonResponse, HttpResponse
 
+from . import health as health_checks
+
 def home(request):
     """Home page / health check"""
     return JsonResponse({
@@ -10,10 +12,18 @@ def home(request):
             'webhook': '/bot/webhook/',
             'set_webhook': '/bot/set-webhook/',
             'webhook_info': '/bot/webhook-info/',
-            'delete_webhook': '/bot/delete-webhook/'
+            'delete_webhook': '/bot/delete-webhook/',
+            'metrics': '/metrics',
+            'health_live': '/health/live/',
+            'health_ready': '/health/ready/'
         }
     })
 
 def health(request):
-    """Health check for Railway"""
+    """Liveness: the process is up and serving requests (no DB access)"""
     return HttpResponse('OK', status=200)
+
+def health_ready(request):
+    """Readiness: DB reachable, migrations applied, bot initialized"""
+    ok, checks = health_checks.readiness()
+    return JsonResponse({'status': 'ok' if ok else 'fail', 'checks': checks}, status=200 if ok else 503)
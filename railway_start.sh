@@ -3,8 +3,27 @@
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+echo "Creating cache table (CACHE_BACKEND=db)..."
+python manage.py createcachetable
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+if [ -n "$METRICS_MULTIPROCESS_DIR" ]; then
+    echo "Clearing metrics directory..."
+    rm -rf "$METRICS_MULTIPROCESS_DIR"
+    mkdir -p "$METRICS_MULTIPROCESS_DIR"
+fi
+
+if [ "${BOT_SHARDS:-0}" -gt 0 ]; then
+    # Воркеры gunicorn только пересылают обновления шардам и ждут ответа -
+    # нужны потоки, а не процессы
+    echo "Starting $BOT_SHARDS bot shards..."
+    python manage.py run_bot_shards &
+    echo "Starting Gunicorn web server..."
+    exec gunicorn exchange.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 2 \
+        --worker-class gthread --threads ${GUNICORN_THREADS:-16} --log-file -
+fi
+
 echo "Starting Gunicorn web server..."
 exec gunicorn exchange.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 2 --log-file -